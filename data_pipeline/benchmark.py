@@ -0,0 +1,160 @@
+# Offline benchmark suite of the pipeline (no download, no PostgreSQL)
+# Times the preprocessing and the dimension builder (`dimensions`) on synthetic surveys (see `synthetic_data`)
+# and the whole `load` against a local SQLite DB / Parquet output directory, at several scales.
+# Usage:
+#   python benchmark.py [--rows 10000,100000,1000000] [--repeat N] [--compare PREVIOUS.json] [--tolerance 1.25]
+# Results are written to `data/benchmarks/bench-<timestamp>.json` / `.csv`, one row per (benchmark, rows):
+#   - seconds (best of `--repeat`), rows_per_sec, us_per_row
+#   - scaling: log(time ratio) / log(rows ratio) vs the previous size (1.0 == linear, ~2.0 == quadratic)
+# `--compare` prints the time ratio of every benchmark vs a previous result and exits with 1
+# when one of them is slower than `--tolerance`.
+
+# 3rd parties
+import contextlib
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+import pandas as pd
+
+# Data pipeline internals
+from sys import argv
+import helpers
+import preprocess_data
+import load_data
+import dimensions
+import parquet_target
+import synthetic_data
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+BENCHMARK_DIR = "data/benchmarks"
+
+_MODERN_YEAR = 2023
+_LEGACY_YEAR = 2017
+
+def _timed(func, setup, repeat):
+    """Best wall time of `func(setup())` (setup is not timed, the pipeline prints are muted)"""
+    best = math.inf
+    for _ in range(repeat):
+        args = setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func(*args)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+def _benchmarks(rows, db_dir):
+    """(name, func, setup) of every benchmark at the given scale"""
+    legacy = synthetic_data.generate(rows, _LEGACY_YEAR)
+    modern = synthetic_data.generate(rows, _MODERN_YEAR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        processed = preprocess_data.process(modern.copy(), _MODERN_YEAR)
+    processed["survey_year"] = _MODERN_YEAR
+    processed["ResponseId"] = processed["ResponseId"].astype("int64")
+    # Builders run on the snake_cased columns, like inside `load`
+    olap = load_data.refactor_column_names_to_snake_case(processed.copy())
+
+    def _load(df):
+        # Fresh DB (and load state) per run
+        db_path = os.path.join(db_dir, f"bench-{rows}.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        load_data.load(df, f"sqlite:///{db_path}")
+
+    def _load_parquet(df):
+        # Fresh output directory per run
+        out_dir = os.path.join(db_dir, f"bench-{rows}")
+        shutil.rmtree(out_dir, ignore_errors=True)
+        load_data.load(df, parquet_target.url(out_dir))
+
+    return [
+        ("preprocess_legacy", lambda df: preprocess_data.process(df, _LEGACY_YEAR), lambda: (legacy.copy(),)),
+        ("preprocess_modern", lambda df: preprocess_data.process(df, _MODERN_YEAR), lambda: (modern.copy(),)),
+        # One dimension of every kind: multi select, have/want pair, several sources, normalized answers
+        *[(f"dimension_{spec.name}", dimensions.build, lambda spec=spec: (olap.copy(), spec))
+          for spec in dimensions.SPECS
+          if spec.name in ("learn_code", "language", "operating_system", "professional_tech", "dev_type")],
+        ("load_sqlite", _load, lambda: (processed.copy(),)),
+        ("load_parquet", _load_parquet, lambda: (processed.copy(),)),
+    ]
+
+def run(sizes=DEFAULT_ROWS, repeat=1) -> pd.DataFrame:
+    """
+    Runs every benchmark at every size.
+
+    Parameters:
+    - sizes (list): # of synthetic responses of every run.
+    - repeat (int): Runs per benchmark, the best time is kept.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as db_dir:
+        for rows in sizes:
+            print(f"{40 * '*'}\nBenchmarking {rows} rows\n{40 * '*'}")
+            for name, func, setup in _benchmarks(rows, db_dir):
+                seconds = _timed(func, setup, repeat)
+                print(f"{name:<36} {seconds:>10.3f}s  {rows / seconds:>14,.0f} rows/s")
+                results.append({
+                    "benchmark": name,
+                    "rows": rows,
+                    "seconds": seconds,
+                    "rows_per_sec": rows / seconds,
+                    "us_per_row": seconds / rows * 1e6,
+                })
+
+    results = pd.DataFrame(results).sort_values(["benchmark", "rows"], kind="stable").reset_index(drop=True)
+    # Scaling exponent vs the previous size of the same benchmark
+    previous = results.groupby("benchmark")[["rows", "seconds"]].shift()
+    results["scaling"] = (results["seconds"] / previous["seconds"]).apply(math.log) / \
+        (results["rows"] / previous["rows"]).apply(math.log)
+    return results
+
+def write(results, output_dir=BENCHMARK_DIR):
+    """Writes the results as JSON + CSV, returns the JSON path"""
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, datetime.now().strftime("bench-%Y%m%dT%H%M%S"))
+    results.to_csv(f"{base}.csv", index=False)
+    with open(f"{base}.json", "w") as f:
+        json.dump({
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "pandas": pd.__version__,
+            "results": json.loads(results.to_json(orient="records")),
+        }, f, indent=2)
+    print(f"benchmark results written to {base}.json / {base}.csv")
+    return f"{base}.json"
+
+def compare(results, previous_path, tolerance=1.25) -> bool:
+    """Prints the time ratio vs a previous result file, False when a benchmark got slower than `tolerance`"""
+    with open(previous_path) as f:
+        previous = pd.DataFrame(json.load(f)["results"])
+
+    merged = results.merge(previous, on=["benchmark", "rows"], suffixes=("", "_previous"))
+    merged["ratio"] = merged["seconds"] / merged["seconds_previous"]
+    merged["regression"] = merged["ratio"] > tolerance
+    print(merged[["benchmark", "rows", "seconds_previous", "seconds", "ratio", "scaling", "regression"]].to_string(index=False))
+
+    regressions = merged[merged["regression"]]
+    if not regressions.empty:
+        print(f"!! {len(regressions)} benchmark(s) slower than x{tolerance} vs {previous_path}")
+    return regressions.empty
+
+def main(args):
+    args = list(args)
+    sizes = helpers.pop_option(args, "--rows", cast=lambda v: [int(r) for r in v.split(",")], default=DEFAULT_ROWS)
+    repeat = helpers.pop_option(args, "--repeat", default=1)
+    previous_path = helpers.pop_option(args, "--compare", cast=str)
+    tolerance = helpers.pop_option(args, "--tolerance", cast=float, default=1.25)
+    if args:
+        raise Exception(f"unknown arguments: {args}")
+
+    results = run(sizes, repeat)
+    print(results.to_string(index=False))
+    write(results)
+    if previous_path and not compare(results, previous_path, tolerance):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main(argv[1:])
@@ -0,0 +1,71 @@
+# Bulk write paths for `load_data.upload_to_db`
+# pandas `to_sql` accepts a `method` callable which gets every chunk of rows,
+# so the dialect specific fast path plugs in right there:
+#   - PostgreSQL: stream each chunk through `COPY ... FROM STDIN` from an in-memory CSV buffer
+#   - Anything else (e.g. SQLite for local runs): chunked `executemany` (pandas default method)
+
+# 3rd parties
+import csv
+import io
+import time
+
+DEFAULT_BATCH_SIZE = 50_000
+# Missing value of the COPY CSV rows (written unquoted as `nan`)
+_NULL = float("nan")
+
+def copy_writer(table, conn, keys, data_iter):
+    """
+    `to_sql` method streaming one chunk of rows with PostgreSQL COPY.
+    Works with both psycopg2 (`copy_expert`) and psycopg 3 (`cursor.copy`).
+    """
+    buf = io.StringIO()
+    # Every non numeric value is quoted and a quoted value never matches the NULL marker, so empty strings
+    # stay empty strings (like with the executemany path). Missing values (None after pandas conversion)
+    # are written as an unquoted NaN float, the NULL marker.
+    writer = csv.writer(buf, quoting=csv.QUOTE_NONNUMERIC)
+    writer.writerows([_NULL if value is None else value for value in row] for row in data_iter)
+    buf.seek(0)
+
+    columns = ", ".join(f'"{k}"' for k in keys)
+    table_name = f'"{table.schema}"."{table.name}"' if table.schema else f'"{table.name}"'
+    sql = f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT CSV, NULL '{_NULL}')"
+
+    dbapi_conn = conn.connection
+    with dbapi_conn.cursor() as cur:
+        if hasattr(cur, "copy_expert"):
+            cur.copy_expert(sql, buf)
+        else:
+            with cur.copy(sql) as copy:
+                copy.write(buf.read())
+
+# Dialect name -> `to_sql` method, dialects not listed use the executemany fallback
+_WRITERS = {
+    "postgresql": copy_writer,
+}
+
+def register_writer(dialect_name, method):
+    """Plug a `to_sql` method for the given SQLAlchemy dialect (None restores the fallback)"""
+    _WRITERS[dialect_name] = method
+
+def get_writer(engine):
+    return _WRITERS.get(engine.dialect.name)
+
+def write(df, table_name, engine, if_exists='replace', batch_size=None):
+    """
+    Write a DataFrame in fixed-size batches with the fastest method the dialect has.
+
+    Returns a dict with the write stats of the table (rows, seconds, rows_per_sec).
+    """
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    method = get_writer(engine)
+
+    start = time.perf_counter()
+    df.to_sql(table_name, engine, if_exists=if_exists, index=False, chunksize=batch_size, method=method)
+    elapsed = time.perf_counter() - start
+
+    rows = len(df)
+    rows_per_sec = rows / elapsed if elapsed > 0 else float("inf")
+    print(f">  wrote {rows} rows to {table_name} in {elapsed:.2f}s ({rows_per_sec:,.0f} rows/s, "
+          f"{method.__name__ if method else 'executemany'}, batch={batch_size})")
+
+    return {"table": table_name, "rows": rows, "seconds": elapsed, "rows_per_sec": rows_per_sec}
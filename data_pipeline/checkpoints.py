@@ -0,0 +1,112 @@
+# Checkpoints of a run, for `--resume`
+# What a run already did is kept under `data/checkpoints/<run key>/`. The run key is the sha256 of everything
+# the output depends on (years + their source sha256, id offsets, options, output target, schema version):
+#   - processed-<year>.parquet: the preprocessed year (deduplicated, global ResponseIds) + its fingerprints
+#   - journal.json: the committed upload jobs, keyed by table, `load` call and content hash of the rows
+# `--resume` picks up the checkpoint of the same run key: the checkpointed years are read back instead of
+# fetched and preprocessed, the dim/link/fact frames are rebuilt in memory (the dims registry and the rollups
+# need them anyway) and only the uploads missing from the journal are sent to the DB.
+# Without `--resume` a run starts over, a successful run removes its checkpoint.
+
+# 3rd parties
+import hashlib
+import json
+import os
+import shutil
+import threading
+import pandas as pd
+
+CHECKPOINT_DIR = "data/checkpoints"
+_JOURNAL_NAME = "journal.json"
+
+def run_key(**inputs) -> str:
+    """sha256 of the run inputs (JSON serializable values)"""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+def frame_digest(df) -> str:
+    """Content hash of a frame (column names + values in row order, the index is left out)"""
+    digest = hashlib.sha256("\x1f".join(map(str, df.columns)).encode())
+    if len(df.columns) > 0:
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+class Checkpoint:
+    """Checkpoint directory of a run key"""
+
+    def __init__(self, key, resume=False, root=CHECKPOINT_DIR):
+        self.key = key
+        self.path = os.path.join(root, key[:16])
+        self._lock = threading.Lock()
+        self._journal = {"key": key, "years": [], "uploads": {}}
+
+        journal_path = os.path.join(self.path, _JOURNAL_NAME)
+        if resume and os.path.exists(journal_path):
+            with open(journal_path) as f:
+                self._journal = json.load(f)
+            print(f"[checkpoint] resuming {self.path}: {len(self._journal['years'])} preprocessed years, "
+                  f"{len(self._journal['uploads'])} uploaded tables")
+        else:
+            if resume:
+                print("[checkpoint] no checkpoint of a previous attempt with the same inputs, starting over")
+            shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+
+    def _write_journal(self):
+        journal_path = os.path.join(self.path, _JOURNAL_NAME)
+        tmp_path = f"{journal_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._journal, f, indent=2)
+        os.replace(tmp_path, journal_path)
+
+    # ----------------------------------------------------------------------------
+    #                           Preprocessed years
+    # ----------------------------------------------------------------------------
+    def _year_paths(self, year):
+        return (os.path.join(self.path, f"processed-{year}.parquet"),
+                os.path.join(self.path, f"fingerprints-{year}.parquet"))
+
+    def save_year(self, year, processed, row_fingerprints=None):
+        """Persists a preprocessed year (and the fingerprints of its rows, see `fingerprints.FingerprintStore`)"""
+        processed_path, fingerprints_path = self._year_paths(year)
+        processed.to_parquet(processed_path)
+        if row_fingerprints is not None:
+            pd.DataFrame({"fingerprint": row_fingerprints}).to_parquet(fingerprints_path, index=False)
+        with self._lock:
+            if year not in self._journal["years"]:
+                self._journal["years"].append(year)
+            self._write_journal()
+
+    def has_year(self, year):
+        return year in self._journal["years"]
+
+    def load_year(self, year):
+        """(preprocessed year, its fingerprints) of a previous attempt, (None, None) when it has to be processed"""
+        if not self.has_year(year):
+            return None, None
+        processed_path, fingerprints_path = self._year_paths(year)
+        processed = pd.read_parquet(processed_path)
+        row_fingerprints = None
+        if os.path.exists(fingerprints_path):
+            row_fingerprints = pd.read_parquet(fingerprints_path)["fingerprint"].to_numpy()
+        print(f"[checkpoint] {year}: {len(processed)} preprocessed rows from the previous attempt")
+        return processed, row_fingerprints
+
+    # ----------------------------------------------------------------------------
+    #                               Uploads
+    # ----------------------------------------------------------------------------
+    def upload_key(self, table_name, if_exists, load_call, df) -> str:
+        """Key of an upload job, the same rows of the same table in the same `load` call give the same key"""
+        return f"{load_call}:{table_name}:{if_exists}:{frame_digest(df)[:24]}"
+
+    def is_uploaded(self, job_key):
+        return job_key in self._journal["uploads"]
+
+    def mark_uploaded(self, job_key, result):
+        """Records a committed upload (called from the upload threads)"""
+        with self._lock:
+            self._journal["uploads"][job_key] = {"table": result["table"], "rows": result["rows"]}
+            self._write_journal()
+
+    def complete(self):
+        """The run succeeded, nothing to resume"""
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,119 @@
+# Per year registry of the raw survey columns
+# Every column the pipeline knows is registered with:
+#   - raw: the name in the survey CSV
+#   - name: the snake_case name in the warehouse
+#   - role: what the pipeline does with it (see the roles below)
+#   - dtype: the dtype `read_csv` parses it with (no type inference, same dtypes in every chunk)
+# `read_options(year)` turns the registry into the `usecols` / `dtype` of `pd.read_csv`,
+# so the dropped columns are never parsed. Columns missing from the registry are read as facts.
+
+# 3rd parties
+from typing import NamedTuple
+
+# Roles
+ID = "id"                   # respondent id, made globally unique by main._prepare_year
+FACT = "fact"               # kept as a column of survey_facts
+SINGLE_DIM = "single_dim"   # single answer column with its own dimension table (e.g. remote_work)
+MULTI_DIM = "multi_dim"     # ';' separated answers, exploded to a dimension + link table
+DROP = "drop"               # never parsed
+
+class Column(NamedTuple):
+    raw: str
+    name: str
+    role: str
+    dtype: str = "str"
+    since: int = 2013
+    until: int = 9999
+
+# have/want pairs, built by `dimensions.build` (see `dimensions.SPECS`)
+_PAIRS = [
+    ("Language", "language"),
+    ("Database", "database"),
+    ("Platform", "platform"),
+    ("Webframe", "webframe"),
+    ("MiscTech", "misc_tech"),
+    ("ToolsTech", "tools_tech"),
+    ("NEWCollabTools", "new_collab_tools"),
+    ("OfficeStackAsync", "office_stack_async"),
+    ("OfficeStackSync", "office_stack_sync"),
+    ("AISearch", "ai_search"),
+    ("AIDev", "ai_dev"),
+]
+
+_COLUMNS = [
+    Column("Country", "country", FACT),
+
+    # 2013 - 2017
+    Column("Respondent", "respondent", ID, "int64", until=2020),
+    Column("EmploymentStatus", "employment_status", MULTI_DIM, until=2017),
+    Column("Professional", "professional", FACT, until=2017),
+    Column("ProgramHobby", "program_hobby", FACT, until=2017),
+    Column("University", "university", FACT, until=2017),
+    Column("FormalEducation", "formal_education", FACT, until=2017),
+    Column("CompanySize", "company_size", FACT, until=2017),
+    Column("HomeRemote", "home_remote", FACT, until=2017),
+    Column("Salary", "salary", FACT, "float64", until=2017),
+    Column("ExpectedSalary", "expected_salary", FACT, "float64", until=2017),
+    Column("CareerSatisfaction", "career_satisfaction", FACT, "float64", until=2017),
+    Column("JobSatisfaction", "job_satisfaction", FACT, "float64", until=2017),
+
+    # 2018 and on
+    Column("ResponseId", "response_id", ID, "int64", since=2021),
+    Column("Q120", "q120", DROP, since=2018),
+    Column("MainBranch", "main_branch", FACT, since=2018),
+    Column("Age", "age", FACT, since=2018),
+    Column("EdLevel", "ed_level", FACT, since=2018),
+    Column("OrgSize", "org_size", FACT, since=2018),
+    Column("Currency", "currency", FACT, since=2018),
+    Column("Hobbyist", "hobbyist", FACT, since=2018),
+    Column("Student", "student", FACT, since=2018),
+    Column("YearsCode", "years_code", FACT, since=2018),
+    Column("YearsCodePro", "years_code_pro", FACT, since=2018),
+    Column("WorkExp", "work_exp", FACT, "float64", since=2018),
+    Column("ConvertedSalary", "converted_salary", FACT, "float64", since=2018),
+    Column("ConvertedComp", "converted_comp", FACT, "float64", since=2018),
+    Column("ConvertedCompYearly", "converted_comp_yearly", FACT, "float64", since=2018),
+    Column("RemoteWork", "remote_work", SINGLE_DIM, since=2018),
+    Column("Employment", "employment", MULTI_DIM, since=2018),
+    Column("DevType", "dev_type", MULTI_DIM, since=2018),
+    Column("ProfessionalTech", "professional_tech", MULTI_DIM, since=2018),
+    Column("OpSysPersonal use", "op_sys_personal_use", MULTI_DIM, since=2018),
+    Column("OpSysProfessional use", "op_sys_professional_use", MULTI_DIM, since=2018),
+    Column("CodingActivities", "coding_activities", MULTI_DIM, since=2018),
+    Column("LearnCode", "learn_code", MULTI_DIM, since=2018),
+    Column("LearnCodeOnline", "learn_code_online", MULTI_DIM, since=2018),
+    Column("BuyNewTool", "buy_new_tool", MULTI_DIM, since=2018),
+    Column("NEWSOSites", "newso_sites", MULTI_DIM, since=2018),
+] + [
+    Column(f"{raw}{raw_suffix}", f"{name}{suffix}", MULTI_DIM, since=2018)
+    for raw, name in _PAIRS
+    for raw_suffix, suffix in (("HaveWorkedWith", "_have_worked_with"), ("WantToWorkWith", "_want_to_work_with"))
+]
+
+# raw name -> snake_case name (the same for every year)
+SNAKE_NAMES = {column.raw: column.name for column in _COLUMNS}
+
+def registry(year) -> dict:
+    """raw name -> Column of the columns registered for the given survey year"""
+    return {column.raw: column for column in _COLUMNS if column.since <= year <= column.until}
+
+def columns_with_role(year, role) -> list:
+    return [column.raw for column in registry(year).values() if column.role == role]
+
+def read_options(year, numeric_dtypes=True) -> dict:
+    """
+    `pd.read_csv` keyword arguments of the given survey year:
+    - usecols: every column but the dropped ones (a callable, so the header isn't needed upfront)
+    - dtype: the explicit dtypes of the registered columns (missing columns are ignored by pandas)
+
+    Parameters:
+    - year (int): The survey year.
+    - numeric_dtypes (bool): Also pass the numeric dtypes (False parses them with pandas inference).
+    """
+    columns = registry(year)
+    dropped = {raw for raw, column in columns.items() if column.role == DROP}
+    dtype = {
+        raw: column.dtype for raw, column in columns.items()
+        if column.role != DROP and (numeric_dtypes or column.dtype == "str")
+    }
+    return {"usecols": lambda col: col not in dropped, "dtype": dtype}
@@ -0,0 +1,200 @@
+# Sparse multi-hot matrices + co-occurrence engine of the have/want pair columns
+# Every pair column (language, database, webframe, ...) of a survey year becomes two CSR matrices
+# (respondents x members): `have` (have worked with) and `want` (want to work with). Then:
+#   - co-occurrence = have.T @ have   (respondents who have worked with both members)
+#   - transition    = have.T @ want   (respondents who have worked with i and want to work with j)
+#   - lift          = P(i, j) / (P(i) P(j)) of both, on their non zero entries
+# Matrices are saved per column and year to `data/analytics/{column}-{year}.npz` for reuse.
+# Usage:
+#   python cooccurrence.py [YEARS] [--columns language,database]   # reads the DB of DATABASE_URL
+
+# 3rd parties
+import os
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sqlalchemy import create_engine
+
+# Data pipeline internals
+from sys import argv
+import helpers
+import load_manifest
+import dim_registry
+
+ANALYTICS_DIR = "data/analytics"
+PAIR_COLUMNS = [
+    'language',
+    'database',
+    'platform',
+    'webframe',
+    'misc_tech',
+    'tools_tech',
+    'new_collab_tools',
+    'office_stack_async',
+    'office_stack_sync',
+    'ai_search',
+    'ai_dev',
+]
+_HAVE_SUFFIX = "_have_worked_with_link"
+_WANT_SUFFIX = "_want_to_work_with_link"
+_MATRICES = ("have", "want", "cooccurrence", "transition", "cooccurrence_lift", "transition_lift")
+
+class PairMatrices(NamedTuple):
+    """Multi-hot matrices of a pair column in a survey year (rows: the year respondents, columns: members)"""
+    column: str
+    year: int
+    member_ids: np.ndarray
+    members: np.ndarray
+    have: sparse.csr_matrix
+    want: sparse.csr_matrix
+
+def _multi_hot(facts, member_ids, row_ids, all_member_ids):
+    """CSR of the (fact id, member id) pairs, rows ordered like `row_ids`, columns like `all_member_ids`"""
+    rows = np.searchsorted(row_ids, facts)
+    cols = np.searchsorted(all_member_ids, member_ids)
+    # Pairs of other years / unknown members are ignored
+    valid = (rows < len(row_ids)) & (cols < len(all_member_ids))
+    valid[valid] = (row_ids[rows[valid]] == facts[valid]) & (all_member_ids[cols[valid]] == member_ids[valid])
+
+    matrix = sparse.csr_matrix(
+        (np.ones(valid.sum(), dtype=np.int32), (rows[valid], cols[valid])),
+        shape=(len(row_ids), len(all_member_ids)),
+    )
+    # Multi-hot: a member counts once per respondent
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+def from_links(column, have_link, want_link, dim_df, fact_years) -> dict:
+    """
+    Year -> PairMatrices of a pair column, from its link frames.
+
+    Parameters:
+    - column (str): The pair column (e.g. "language").
+    - have_link / want_link (pd.DataFrame): The `fact_id` + member id link frames.
+    - dim_df (pd.DataFrame): The dimension of the column (member names).
+    - fact_years (pd.Series): survey_year of the facts, indexed by fact id (all the respondents, also the ones without answers).
+    """
+    name_col, id_col = dim_registry._split_columns(dim_df)
+    dim_df = dim_df.sort_values(id_col)
+    member_ids = dim_df[id_col].to_numpy(dtype=np.int64)
+    members = dim_df[name_col].astype(str).to_numpy(dtype=str)
+
+    result = {}
+    for year, facts in fact_years.groupby(fact_years).groups.items():
+        row_ids = np.sort(np.asarray(facts, dtype=np.int64))
+        matrices = [
+            _multi_hot(link["fact_id"].to_numpy(dtype=np.int64), link[id_col].to_numpy(dtype=np.int64), row_ids, member_ids)
+            for link in (have_link, want_link)
+        ]
+        result[int(year)] = PairMatrices(column, int(year), member_ids, members, *matrices)
+    return result
+
+def from_db(engine, column, years=None) -> dict:
+    """
+    Year -> PairMatrices of a pair column, read from the warehouse.
+    The respondents of a year are its fact id range in the `load_manifest`.
+    """
+    manifest = load_manifest.read(engine)
+    if manifest.empty:
+        raise Exception(f"'{load_manifest.TABLE_NAME}' is empty, the fact ids of the survey years are unknown")
+    if years is not None:
+        manifest = manifest[manifest.index.isin(years)]
+
+    fact_years = pd.concat([
+        pd.Series(int(year), index=pd.RangeIndex(int(row.fact_id_min), int(row.fact_id_max) + 1))
+        for year, row in manifest.iterrows()
+    ])
+    dim_df = pd.read_sql(f"SELECT * FROM {column}_dim", engine)
+    have_link = pd.read_sql(f"SELECT * FROM {column}{_HAVE_SUFFIX}", engine)
+    want_link = pd.read_sql(f"SELECT * FROM {column}{_WANT_SUFFIX}", engine)
+    return from_links(column, have_link, want_link, dim_df, fact_years)
+
+def lift(counts, left_totals, right_totals, respondents):
+    """P(i, j) / (P(i) P(j)) of the non zero counts (sparse, same pattern as `counts`)"""
+    counts = counts.tocoo()
+    denominator = left_totals[counts.row].astype(np.float64) * right_totals[counts.col]
+    values = counts.data * float(respondents) / np.where(denominator > 0, denominator, np.inf)
+    return sparse.csr_matrix((values.astype(np.float32), (counts.row, counts.col)), shape=counts.shape)
+
+def analyze(matrices: PairMatrices) -> dict:
+    """The co-occurrence / transition counts (members x members) and their lift"""
+    have, want = matrices.have, matrices.want
+    respondents = have.shape[0]
+    have_totals = np.asarray(have.sum(axis=0)).ravel()
+    want_totals = np.asarray(want.sum(axis=0)).ravel()
+
+    cooccurrence = (have.T @ have).tocsr()
+    transition = (have.T @ want).tocsr()
+    return {
+        "have": have,
+        "want": want,
+        "cooccurrence": cooccurrence,
+        "transition": transition,
+        "cooccurrence_lift": lift(cooccurrence, have_totals, have_totals, respondents),
+        "transition_lift": lift(transition, have_totals, want_totals, respondents),
+    }
+
+def top_transitions(matrices: PairMatrices, results, member, k=10, by="transition_lift") -> pd.DataFrame:
+    """What the respondents who have worked with `member` want to work with (e.g. "Rust" users), top `k` by `by`"""
+    position = np.flatnonzero(matrices.members == member)
+    if len(position) == 0:
+        raise Exception(f"'{member}' is not a member of {matrices.column} in {matrices.year}")
+    row = position[0]
+    frame = pd.DataFrame({
+        "member": matrices.members,
+        "respondents": results["transition"][row].toarray().ravel(),
+        "lift": results["transition_lift"][row].toarray().ravel(),
+    })
+    sort_col = "lift" if by == "transition_lift" else "respondents"
+    return frame[frame["respondents"] > 0].sort_values(sort_col, ascending=False).head(k).reset_index(drop=True)
+
+# ----------------------------------------------------------------------------
+#                               .npz files
+# ----------------------------------------------------------------------------
+def _path(column, year, output_dir=ANALYTICS_DIR):
+    return os.path.join(output_dir, f"{column}-{year}.npz")
+
+def save(matrices: PairMatrices, results, output_dir=ANALYTICS_DIR):
+    """Saves all the matrices of a column/year in one compressed `.npz` (CSR components, no pickle)"""
+    os.makedirs(output_dir, exist_ok=True)
+    arrays = {"member_ids": matrices.member_ids, "members": matrices.members}
+    for name in _MATRICES:
+        matrix = results[name].tocsr()
+        arrays.update({
+            f"{name}_data": matrix.data,
+            f"{name}_indices": matrix.indices,
+            f"{name}_indptr": matrix.indptr,
+            f"{name}_shape": np.asarray(matrix.shape),
+        })
+    path = _path(matrices.column, matrices.year, output_dir)
+    np.savez_compressed(path, **arrays)
+    return path
+
+def load(column, year, output_dir=ANALYTICS_DIR):
+    """(PairMatrices, results) saved by `save`"""
+    with np.load(_path(column, year, output_dir), allow_pickle=False) as f:
+        results = {
+            name: sparse.csr_matrix((f[f"{name}_data"], f[f"{name}_indices"], f[f"{name}_indptr"]),
+                                    shape=tuple(f[f"{name}_shape"]))
+            for name in _MATRICES
+        }
+        matrices = PairMatrices(column, year, f["member_ids"], f["members"], results["have"], results["want"])
+    return matrices, results
+
+def main(args):
+    args = list(args)
+    columns = helpers.pop_option(args, "--columns", cast=lambda value: value.split(","), default=PAIR_COLUMNS)
+    years = [int(y) for y in args] or None
+
+    engine = create_engine(helpers.setup())
+    for column in columns:
+        for year, matrices in from_db(engine, column, years).items():
+            results = analyze(matrices)
+            path = save(matrices, results)
+            print(f"{column} {year}: {matrices.have.shape[0]} respondents x {len(matrices.members)} members, "
+                  f"{results['transition'].nnz} have->want pairs -> {path}")
+
+if __name__ == '__main__':
+    main(argv[1:])
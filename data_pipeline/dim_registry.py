@@ -0,0 +1,168 @@
+# In-process registry of the `*_dim` tables
+# All the dimension tables are read once per run (one batched query, or a local snapshot),
+# the category -> id maps are kept in memory and only the newly added dimension rows
+# are written back, instead of reading and replacing every dim table per column.
+
+# 3rd parties
+import os
+import pandas as pd
+from sqlalchemy import inspect, select, union_all, literal, cast, String, table, column
+
+_DIM_SUFFIX = "_dim"
+
+def _split_columns(frame):
+    """(category column, id column) of a dim frame"""
+    id_col = next(c for c in frame.columns if c.endswith("_id"))
+    category_col = next(c for c in frame.columns if c != id_col)
+    return category_col, id_col
+
+class DimensionRegistry:
+    """
+    Dimension tables of the warehouse, by table name (e.g. "language_dim").
+
+    Every dim table has a category column and an id column (the one ending with `_id`).
+    Without an engine (e.g. the Parquet output target) it starts empty, see `seed`.
+    """
+
+    def __init__(self, engine, snapshot_path=None):
+        self.engine = engine
+        self.snapshot_path = snapshot_path
+        self._frames = {}
+        # Tables that already exist in the DB, new rows are appended to them
+        self._persisted = set()
+
+        if snapshot_path is not None and os.path.exists(snapshot_path):
+            self._load_snapshot(snapshot_path)
+        elif engine is not None:
+            self._load_db()
+
+    # ----------------------------------------------------------------------------
+    #                               Reading
+    # ----------------------------------------------------------------------------
+    def _dim_columns(self, inspector):
+        """Table name -> (columns, category column, id column) of every dim table in the DB"""
+        dim_tables = [t for t in inspector.get_table_names() if t.endswith(_DIM_SUFFIX)]
+        if not dim_tables:
+            return {}
+
+        if hasattr(inspector, "get_multi_columns"):
+            # SQLAlchemy 2.x, all the tables in one catalog query
+            multi = inspector.get_multi_columns(filter_names=dim_tables)
+            columns = {name: cols for (_, name), cols in multi.items()}
+        else:
+            columns = {t: inspector.get_columns(t) for t in dim_tables}
+
+        dims = {}
+        for table_name, cols in columns.items():
+            names = [c["name"] for c in cols]
+            id_cols = [n for n in names if n.endswith("_id")]
+            category_cols = [n for n in names if not n.endswith("_id")]
+            if len(id_cols) == 1 and len(category_cols) == 1:
+                dims[table_name] = (names, category_cols[0], id_cols[0])
+        return dims
+
+    def _load_db(self):
+        dims = self._dim_columns(inspect(self.engine))
+        if not dims:
+            print("[dims] no dimension tables in the DB yet")
+            return
+
+        # A single UNION ALL round trip for all the dimension tables
+        query = union_all(*[
+            select(
+                literal(table_name).label("dim_table"),
+                cast(column(category_col), String).label("category"),
+                column(id_col).label("dim_id"),
+            ).select_from(table(table_name))
+            for table_name, (_, category_col, id_col) in dims.items()
+        ])
+        with self.engine.connect() as conn:
+            rows = pd.read_sql(query, conn)
+
+        for table_name, (names, category_col, id_col) in dims.items():
+            part = rows[rows["dim_table"] == table_name]
+            self._frames[table_name] = pd.DataFrame({
+                category_col: part["category"].to_numpy(dtype=object),
+                id_col: part["dim_id"].to_numpy(dtype="int64"),
+            })[names]
+            self._persisted.add(table_name)
+        print(f"[dims] loaded {len(dims)} dimension tables ({len(rows)} rows) in one query")
+
+    def _load_snapshot(self, path):
+        snapshot = pd.read_parquet(path)
+        for (table_name, category_col, id_col, id_first), part in snapshot.groupby(
+                ["dim_table", "category_col", "id_col", "id_first"], sort=False):
+            frame = pd.DataFrame({
+                category_col: part["category"].to_numpy(dtype=object),
+                id_col: part["dim_id"].to_numpy(dtype="int64"),
+            })
+            self._frames[table_name] = frame[[id_col, category_col]] if id_first else frame
+            self._persisted.add(table_name)
+        print(f"[dims] loaded {len(self._frames)} dimension tables from snapshot {path}")
+
+    def save_snapshot(self, path=None):
+        """Saves the current dimensions so the next run can skip reading them from the DB"""
+        path = path or self.snapshot_path
+        parts = []
+        for table_name, frame in self._frames.items():
+            category_col, id_col = _split_columns(frame)
+            parts.append(pd.DataFrame({
+                "dim_table": table_name,
+                "category_col": category_col,
+                "id_col": id_col,
+                "id_first": frame.columns[0] == id_col,
+                "category": frame[category_col].astype(str).to_numpy(dtype=object),
+                "dim_id": frame[id_col].to_numpy(dtype="int64"),
+            }))
+        if not parts:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        pd.concat(parts, ignore_index=True).to_parquet(path, index=False)
+        print(f"[dims] saved snapshot of {len(parts)} dimension tables to {path}")
+
+    def seed(self, frames):
+        """Dimensions already in the output target (table name -> frame), new rows are appended to them"""
+        for table_name, frame in frames.items():
+            self._frames[table_name] = frame
+            self._persisted.add(table_name)
+        if frames:
+            print(f"[dims] loaded {len(frames)} dimension tables from the output target")
+
+    # ----------------------------------------------------------------------------
+    #                               Lookups
+    # ----------------------------------------------------------------------------
+    def get(self, table_name):
+        """The known dimension table, None if it's still empty"""
+        frame = self._frames.get(table_name)
+        return None if frame is None or frame.empty else frame
+
+    def category_to_id(self, table_name):
+        frame = self._frames.get(table_name)
+        if frame is None:
+            return {}
+        category_col, id_col = _split_columns(frame)
+        return dict(zip(frame[category_col], frame[id_col]))
+
+    # ----------------------------------------------------------------------------
+    #                               Updates
+    # ----------------------------------------------------------------------------
+    def register(self, table_name, dim_df):
+        """
+        Registers the dimension built by `dimensions.build` (existing rows + new ones).
+
+        Returns the rows to write and how:
+        - (new rows only, 'append') when the table already exists in the DB
+        - (the whole table, 'replace') the first time the table is written
+        """
+        known = self._frames.get(table_name)
+        self._frames[table_name] = dim_df
+
+        if table_name not in self._persisted:
+            self._persisted.add(table_name)
+            return dim_df, 'replace'
+
+        if known is None or known.empty:
+            return dim_df, 'append'
+        _, id_col = _split_columns(dim_df)
+        new_rows = dim_df[~dim_df[id_col].isin(known[id_col])]
+        return new_rows, 'append'
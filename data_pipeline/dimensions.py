@@ -0,0 +1,152 @@
+# Declarative dimension builder of the star schema
+# Every dimension is described by a `DimSpec`: its source column(s), how a cell is split and normalized,
+# the dim table and the link table of every source. `build` handles all of them the same way:
+#   - every source column is scanned once (`multi_select.explode` factorizes the cells and splits only the
+#     distinct ones), the normalizer runs once per distinct item
+#   - members already in the dimension keep their id, the new ones are numbered after the current max id
+#     in sorted order, so the ids don't depend on the row / year order of a load and a partial reload
+#     never renumbers a dimension
+#   - a link table holds (fact key, member id) rows, several sources can share the same link table
+# Single answer columns (no separator) get the member id as a fact column (`<name>_id`) instead of a link table.
+# The fact key / first id of every link / dim table are the ones of the existing warehouse tables.
+
+# 3rd parties
+from typing import Callable, NamedTuple
+import pandas as pd
+
+# Data pipeline internals
+import multi_select
+import metrics
+
+# Link fact key -> offset from the fact index (response_id is the fact index + 1)
+FACT_KEYS = {"fact_id": 0, "response_id": 1}
+
+class DimSpec(NamedTuple):
+    """
+    A dimension and its link tables.
+
+    - name: Member column of the dim table, its id column is `<name>_id`.
+    - sources: The (snake_case) source columns, dropped from the facts once built.
+    - links: The link table of every source, None for a single answer column (the id stays in the facts).
+    - dim_table: Defaults to `<name>_dim`.
+    - sep: Separator of the answers in a cell, None for a single answer column.
+    - strip: Strip whitespace around every answer.
+    - normalize: Applied to every distinct answer (e.g. `_normalize_dev_type`).
+    - fact_key: Fact key column of the links (see `FACT_KEYS`).
+    - id_start: First id of a new dimension.
+    """
+    name: str
+    sources: tuple
+    links: tuple = None
+    dim_table: str = None
+    sep: str = ";"
+    strip: bool = True
+    normalize: Callable = None
+    fact_key: str = "fact_id"
+    id_start: int = 1
+
+    @property
+    def table(self):
+        return self.dim_table or f"{self.name}_dim"
+
+    @property
+    def id_col(self):
+        return f"{self.name}_id"
+
+    def __str__(self):
+        # Label of the spec in the metrics report
+        return self.name
+
+def _normalize_dev_type(profession):
+    """Part before the first semicolon, lowercased, without '-' and '_' and stripped"""
+    return profession.split(';', 1)[0].lower().replace('-', '').replace('_', '').strip()
+
+def _multi(name):
+    return DimSpec(name, (name,), links=(f"{name}_link",))
+
+def _pair(name):
+    sources = (f"{name}_have_worked_with", f"{name}_want_to_work_with")
+    return DimSpec(name, sources, links=tuple(f"{source}_link" for source in sources))
+
+# Every dimension of the warehouse, in build (and upload) order
+SPECS = [
+    DimSpec("remote_work", ("remote_work",), sep=None),
+    DimSpec("professional_tech", ("professional_tech",), links=("professional_tech_link",),
+            strip=False, fact_key="response_id", id_start=0),
+    DimSpec("dev_type", ("dev_type",), links=("dev_type_link",),
+            sep=",", strip=False, normalize=_normalize_dev_type, fact_key="response_id", id_start=0),
+    DimSpec("operating_system", ("op_sys_personal_use", "op_sys_professional_use"),
+            links=("op_sys_link", "op_sys_link"), dim_table="op_sys_dim"),
+    _multi("employment"),
+    _multi("coding_activities"),
+    _multi("learn_code"),
+    _multi("learn_code_online"),
+    _multi("buy_new_tool"),
+    _multi("newso_sites"),
+    _pair("language"),
+    _pair("database"),
+    _pair("platform"),
+    _pair("webframe"),
+    _pair("misc_tech"),
+    _pair("tools_tech"),
+    _pair("new_collab_tools"),
+    _pair("office_stack_async"),
+    _pair("office_stack_sync"),
+    _pair("ai_search"),
+    _pair("ai_dev"),
+]
+
+def _scan(series, spec) -> multi_select.Exploded:
+    """The answers of a source column (a single pass over the cells)"""
+    if spec.sep is None:
+        exploded = multi_select.encode(series)
+    else:
+        exploded = multi_select.explode(series, sep=spec.sep, strip=spec.strip)
+    if spec.normalize is not None:
+        exploded = multi_select.normalize(exploded, spec.normalize)
+    return exploded
+
+@metrics.instrument("load.build_dimension", key="spec", rows_out=metrics.link_rows)
+def build(df, spec, existing_dim_df=None):
+    """
+    Builds a dimension and its links out of the facts.
+
+    Returns (dim_df, {link table: link_df}, df), the source columns are dropped from `df`
+    (single answer columns are kept, next to their id column). (None, {}, df) when a source is missing.
+
+    Parameters:
+    - df (pd.DataFrame): The snake_cased facts, the index is the fact id.
+    - spec (DimSpec): The dimension to build.
+    - existing_dim_df (pd.DataFrame): The dimension known so far (registry), its ids are kept.
+    """
+    print(f":: {spec.name}")
+    missing = [source for source in spec.sources if source not in df.columns]
+    if missing:
+        print(f"!! Warning: Column(s) {missing} not found in DataFrame.")
+        return None, {}, df
+
+    exploded = [_scan(df[source], spec) for source in spec.sources]
+
+    # New members are numbered in sorted order (existing members keep their id)
+    categories = multi_select.union_categories(*exploded).sort_values()
+    dim_df, _ = multi_select.build_dim(categories, spec.name, existing_dim_df=existing_dim_df, start=spec.id_start)
+
+    if spec.links is None:
+        # Single answer: the member id is added to the facts
+        positions = pd.Index(dim_df[spec.name]).get_indexer(exploded[0].categories)
+        ids = dim_df[spec.id_col].to_numpy()[positions][exploded[0].codes]
+        df[spec.id_col] = pd.Series(ids, index=exploded[0].index, dtype="float64").reindex(df.index)
+        return dim_df, {}, df
+
+    link_dfs = {}
+    offset = FACT_KEYS[spec.fact_key]
+    for source_exploded, link_table in zip(exploded, spec.links):
+        link_df = multi_select.build_link(source_exploded, dim_df, spec.name, fact_col=spec.fact_key)
+        if offset:
+            link_df[spec.fact_key] = link_df[spec.fact_key] + offset
+        link_dfs[link_table] = pd.concat([link_dfs[link_table], link_df], ignore_index=True) \
+            if link_table in link_dfs else link_df
+
+    for source in spec.sources:
+        del df[source]
+    return dim_df, link_dfs, df
@@ -0,0 +1,129 @@
+# Concurrent downloader of the survey archives
+# All the requested years are downloaded in parallel (thread pool + one pooled `requests.Session`),
+# so a cold fetch of the whole history takes about as long as the slowest archive:
+#   - failed transfers (connection errors, 5xx/429, truncated downloads) are retried with exponential backoff,
+#     every retry resumes the `.part` file (see `fetch_data._download_file`)
+#   - an archive already in `data/` is kept when its size / ETag still match the server
+#   - the download state of every year is recorded in `data/download_manifest.json`
+
+# 3rd parties
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import requests
+from requests.adapters import HTTPAdapter
+
+# Internals
+import fetch_data
+import helpers
+
+MANIFEST_PATH = "data/download_manifest.json"
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 4
+_BACKOFF_BASE = 1.0
+_BACKOFF_MAX = 30.0
+
+_manifest_lock = threading.Lock()
+
+def _read_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+def _record(year, entry):
+    """Updates the manifest entry of the year (atomic write, shared by the download threads)"""
+    with _manifest_lock:
+        manifest = _read_manifest()
+        manifest[str(year)] = {**manifest.get(str(year), {}), **entry,
+                               "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+        tmp_path = f"{MANIFEST_PATH}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, MANIFEST_PATH)
+
+def _new_session(workers):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _is_up_to_date(year, session, entry):
+    """The local archive matches the server (ETag, else size), a server we can't reach keeps the local file"""
+    zip_path = fetch_data._get_archive_path(year)
+    if not os.path.exists(zip_path):
+        return False
+
+    try:
+        response = session.head(helpers.get_url(year), allow_redirects=True, timeout=fetch_data._DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"!! Warning: could not check the archive of {year} ({e}), keeping the local one")
+        return True
+
+    etag = response.headers.get("ETag")
+    if etag and entry.get("etag"):
+        return etag == entry["etag"]
+    size = response.headers.get("Content-Length")
+    return size is not None and int(size) == os.path.getsize(zip_path)
+
+def _download_year(year, session, retries, force):
+    entry = _read_manifest().get(str(year), {})
+    if not force and _is_up_to_date(year, session, entry):
+        print(f"[download] {year} is up to date, skipping")
+        _record(year, {"status": "skipped", "path": fetch_data._get_archive_path(year)})
+        return year, "skipped"
+
+    for attempt in range(1, retries + 1):
+        try:
+            meta = fetch_data._download_file(year, session=session)
+            _record(year, {**meta, "status": "downloaded", "attempts": attempt,
+                           "path": fetch_data._get_archive_path(year), "error": None})
+            return year, "downloaded"
+        except (requests.RequestException, fetch_data.RetryableDownloadError) as e:
+            if attempt == retries:
+                _record(year, {"status": "failed", "attempts": attempt, "error": str(e)})
+                raise Exception(f"Failed to download the survey data for the year {year} after {attempt} attempts: {e}")
+            delay = min(_BACKOFF_MAX, _BACKOFF_BASE * 2 ** (attempt - 1)) * (1 + random.random() / 2)
+            print(f"[download] {year} attempt {attempt} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+        except Exception as e:
+            # Not retryable (e.g. 404, checksum mismatch)
+            _record(year, {"status": "failed", "attempts": attempt, "error": str(e)})
+            raise
+
+def download_years(years, workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, force=False):
+    """
+    Downloads the archives of all the years in parallel, returns year -> "downloaded" / "skipped".
+
+    Parameters:
+    - years (list): The survey years.
+    - workers (int): # of parallel downloads.
+    - retries (int): Attempts per archive.
+    - force (bool): Download again also the archives that are up to date.
+    """
+    workers = max(1, min(workers or DEFAULT_WORKERS, len(years)))
+    start = time.perf_counter()
+    session = _new_session(workers)
+
+    with session, ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download") as executor:
+        futures = [executor.submit(_download_year, year, session, retries, force) for year in years]
+        results, errors = {}, []
+        for future in futures:
+            try:
+                year, status = future.result()
+                results[year] = status
+            except Exception as e:
+                errors.append(str(e))
+
+    if errors:
+        raise Exception("\n".join(errors))
+    print(f"[download] {len(years)} years ready in {time.perf_counter() - start:.1f}s "
+          f"({sum(s == 'downloaded' for s in results.values())} downloaded)")
+    return results
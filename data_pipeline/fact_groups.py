@@ -0,0 +1,160 @@
+# Vertical partitioning of survey_facts (hot / cold column groups)
+# The facts keep every leftover survey column, most of them sparse or free text and rarely queried.
+# They are split into tables keyed by (response_id, survey_year):
+#   - survey_facts: the hot columns (ids, survey_year, remote_work_id, age, compensation, country and
+#     years of coding), the narrow table the dashboards scan
+#   - survey_facts_attrs: the other dense answers (multiple choice, numbers)
+#   - survey_facts_text: the text columns with too many distinct values for a choice list (free text)
+#   - survey_facts_sparse: the columns missing from most of the responses
+# The cold group of a column is derived from its null ratio / cardinality, counted per survey_year over the years
+# that have the column (an era specific column isn't sparse because the other eras don't ask it). The stats come
+# from all the rows of the run in both modes (`FactGroups.observe`, a first pass over the chunks in streaming
+# mode), so the table layout doesn't depend on the ingestion mode. Columns already in the DB keep their table
+# (`--incremental`), the plan is kept for the rest of the run.
+# Cold tables only hold the responses with a value in them, join them with a LEFT JOIN, e.g.:
+#   SELECT f.age, t.* FROM survey_facts f LEFT JOIN survey_facts_text t USING (response_id, survey_year)
+
+# 3rd parties
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect
+
+HOT_TABLE = "survey_facts"
+KEY_COLUMNS = ("response_id", "survey_year")
+# The most queried columns, always in the hot table (compensation / experience columns of every survey era)
+HOT_COLUMNS = (
+    "remote_work_id",
+    "age",
+    "country",
+    "salary",
+    "converted_salary",
+    "converted_comp",
+    "converted_comp_yearly",
+    "years_code",
+)
+
+# Cold groups (table suffixes)
+ATTRS = "attrs"
+TEXT = "text"
+SPARSE = "sparse"
+COLD_GROUPS = (ATTRS, TEXT, SPARSE)
+
+# Columns missing from more than this share of the responses are sparse
+SPARSE_NULL_RATIO = 0.5
+# More distinct values than any multiple choice question of the survey has: free text
+MAX_CHOICES = 256
+
+def table_name(group=None):
+    """The table of a cold group (the hot table for None)"""
+    return HOT_TABLE if group is None else f"{HOT_TABLE}_{group}"
+
+def is_facts_table(name) -> bool:
+    return name == HOT_TABLE or name in {table_name(group) for group in COLD_GROUPS}
+
+class FactGroups:
+    """Column -> facts table plan of a run, extended with the new columns of every `load` call"""
+
+    def __init__(self, hot_columns=HOT_COLUMNS, sparse_null_ratio=SPARSE_NULL_RATIO, max_choices=MAX_CHOICES):
+        self.hot_columns = set(hot_columns)
+        self.sparse_null_ratio = sparse_null_ratio
+        self.max_choices = max_choices
+        self.plan = {}
+        # column -> per year row / value counts, distinct values (up to `max_choices` + 1), text flag
+        self._stats = {}
+
+    def seed(self, engine):
+        """Keeps the columns of the facts tables already in the DB where they are (`--incremental`)"""
+        inspector = inspect(engine)
+        for name in inspector.get_table_names():
+            if not is_facts_table(name):
+                continue
+            for column in inspector.get_columns(name):
+                if column["name"] not in KEY_COLUMNS:
+                    self.plan.setdefault(column["name"], name)
+
+    def observe(self, df, columns=None):
+        """
+        Adds the rows of `df` (a year, a chunk or several years) to the stats of its cold column candidates,
+        counted per `survey_year`.
+
+        Parameters:
+        - df (pd.DataFrame): The snake_cased facts.
+        - columns (list): The columns to count, all the columns of `df` by default.
+        """
+        columns = [col for col in (df.columns if columns is None else columns)
+                   if col not in KEY_COLUMNS and col not in self.hot_columns]
+        if not columns:
+            return
+        years = df["survey_year"].to_numpy() if "survey_year" in df.columns else np.zeros(len(df), dtype=int)
+        rows = pd.Series(years).value_counts()
+        values = df[columns].notna().groupby(years).sum()
+        for col in columns:
+            stats = self._stats.setdefault(col, {"rows": {}, "values": {}, "distinct": set(), "is_text": False})
+            for year, count in values[col].items():
+                stats["rows"][year] = stats["rows"].get(year, 0) + int(rows[year])
+                stats["values"][year] = stats["values"].get(year, 0) + int(count)
+            present = df[col].dropna()
+            if len(present) and not pd.api.types.is_numeric_dtype(df[col]):
+                stats["is_text"] = True
+            # Past `max_choices` distinct values the exact count doesn't matter anymore
+            if len(stats["distinct"]) <= self.max_choices:
+                stats["distinct"].update(present.unique())
+
+    def column_stats(self, columns) -> pd.DataFrame:
+        """
+        null_ratio (over the rows of the years with any value in the column), cardinality (# distinct values,
+        capped past `max_choices`) and text flag of observed columns, indexed by column
+        """
+        records = []
+        for col in columns:
+            stats = self._stats[col]
+            years = [year for year, count in stats["values"].items() if count]
+            rows = sum(stats["rows"][year] for year in years)
+            values = sum(stats["values"][year] for year in years)
+            records.append((1 - values / rows if rows else 1.0, len(stats["distinct"]), stats["is_text"]))
+        return pd.DataFrame(records, columns=["null_ratio", "cardinality", "is_text"],
+                            index=pd.Index(list(columns), name="column"))
+
+    def _group(self, stats):
+        if stats["null_ratio"] > self.sparse_null_ratio:
+            return SPARSE
+        if stats["is_text"] and stats["cardinality"] > self.max_choices:
+            return TEXT
+        return ATTRS
+
+    def assign(self, df):
+        """
+        Plans the columns of `df` seen for the first time (hot ones, the others by their stats).
+        The columns not observed yet are counted on `df`.
+        """
+        new = [col for col in df.columns if col not in KEY_COLUMNS and col not in self.plan]
+        if not new:
+            return
+        cold = [col for col in new if col not in self.hot_columns]
+        self.observe(df, [col for col in cold if col not in self._stats])
+        stats = self.column_stats(cold)
+        for col in new:
+            if col in self.hot_columns:
+                self.plan[col] = HOT_TABLE
+        for col, row in stats.iterrows():
+            self.plan[col] = table_name(self._group(row))
+
+        for name in [HOT_TABLE, *(table_name(group) for group in COLD_GROUPS)]:
+            cols = [col for col in new if self.plan[col] == name]
+            if cols:
+                print(f"[facts] {name}: {len(cols)} columns ({', '.join(cols)})")
+
+    def split(self, df) -> dict:
+        """
+        The facts tables of `df`: table name -> frame of the keys + the columns of the table,
+        the hot table first. Cold frames leave out the responses without any value in them.
+        """
+        self.assign(df)
+        keys = [col for col in KEY_COLUMNS if col in df.columns]
+        frames = {HOT_TABLE: df[[col for col in df.columns if col in KEY_COLUMNS or self.plan[col] == HOT_TABLE]]}
+        for group in COLD_GROUPS:
+            name = table_name(group)
+            cols = [col for col in df.columns if col not in KEY_COLUMNS and self.plan[col] == name]
+            if cols:
+                frames[name] = df.loc[df[cols].notna().any(axis=1).to_numpy(), keys + cols]
+        return frames
@@ -1,58 +1,309 @@
 # 3rd parties
+import hashlib
+import json
+import os
 import requests
 import zipfile
 import pandas as pd
 
 # Internals
 import helpers
+import parquet_cache
+import metrics
+import columns as column_registry
 
 _SO_SURVEY_PREFIX = "stack-overflow-developer-survey"
+_CSV_NAME = "survey_results_public.csv"
+_DOWNLOAD_CHUNK_SIZE = 1 << 20
+_DOWNLOAD_TIMEOUT = 60
+_HASH_BLOCK_SIZE = 1 << 20
+_SCAN_CHUNKSIZE = 100_000
+_KINDS = ("int", "float", "text")
 
-def _unpack(zip_path, year):
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        extract_path = f"data/{_SO_SURVEY_PREFIX}-{year}"
-        zip_ref.extractall(extract_path)
-        print(f"Successfully extracted the ZIP file to {extract_path}")
-
-def _write(file_path, content, year):
-    with open(file_path, 'wb') as f:
-        f.write(content)
-    print(f"Successfully downloaded the survey data for the year {year}.")
-
-def fetch(year, use_cache) -> pd.DataFrame:
+@metrics.instrument("fetch", key="year")
+def fetch(year, use_cache, columns=None, **read_kwargs) -> pd.DataFrame:
     """
     The 'Data Ingestion' stage
     
     Parameters:
     - year (int): The year for which you want to download the Stack Overflow developer survey data.
+    - use_cache (bool): Use the already downloaded data (if exists).
+    - columns (list): Return only these columns (read straight from the Parquet cache when it is valid).
+    - read_kwargs: Passed to `pd.read_csv`, e.g. `chunksize=N` returns an iterator of DataFrames
+      (streaming mode) and `nrows=N` reads only the first rows.
     """
     if use_cache:
-        return _read_file(year, use_cache)
+        return _read_file(year, use_cache, columns, **read_kwargs)
     else:
-        _download_file_and_unpack(year)
-        return _read_file(year, use_cache)
+        _download_file(year)
+        return _read_file(year, use_cache, columns, **read_kwargs)
 
-def _download_file_and_unpack(year):
-    base_url = f"{helpers.get_base_url(year)}"
+class RetryableDownloadError(Exception):
+    """A download failure worth retrying (server error, throttling, truncated transfer)"""
 
-    url = f"{base_url}/{_SO_SURVEY_PREFIX}-{year}.zip"
+def _download_file(year, session=None):
+    """
+    Streams the survey .zip to disk in chunks (never held in memory as a whole).
+    An interrupted download is kept as `.part` and resumed with an HTTP `Range` request.
+    Once complete the archive size and sha256 are verified (see `helpers.get_checksum`).
 
-    response = requests.get(url)
+    Returns the archive metadata (url, size, etag, last_modified, sha256).
+    """
+    url = helpers.get_url(year)
+    zip_path = _get_archive_path(year)
+    part_path = f"{zip_path}.part"
+    os.makedirs(os.path.dirname(zip_path), exist_ok=True)
 
-    if response.status_code == 200:
-        file_path = f"data/{_SO_SURVEY_PREFIX}-{year}.zip"
-        
-        _write(file_path, response.content, year)
-        _unpack(file_path, year)
-    else:
-        raise Exception(f"Failed to download the survey data for the year {year}. Status code: {response.status_code}")
-    
-def _read_file(year, cache):
-    csv_path = _get_zip_path(year)
-    # Read the CSV file into a Pandas DataFrame.
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    with (session or requests).get(url, headers=headers, stream=True, timeout=_DOWNLOAD_TIMEOUT) as response:
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code == 206:
+            mode = 'ab'
+            print(f"Resuming the download of {year} from byte {offset}")
+        elif response.status_code == 200:
+            # Fresh download (or the server ignored the Range header)
+            mode = 'wb'
+            offset = 0
+        elif response.status_code == 416 and offset:
+            # Nothing left to download, the .part file is already complete
+            mode = None
+        elif response.status_code == 429 or response.status_code >= 500:
+            raise RetryableDownloadError(f"Failed to download the survey data for the year {year}. Status code: {response.status_code}")
+        else:
+            raise Exception(f"Failed to download the survey data for the year {year}. Status code: {response.status_code}")
+
+        if mode is not None:
+            expected_size = _expected_size(response, offset)
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=_DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+
+            if expected_size is not None and os.path.getsize(part_path) != expected_size:
+                raise RetryableDownloadError(
+                    f"Incomplete download of the survey data for the year {year} "
+                    f"({os.path.getsize(part_path)}/{expected_size} bytes), re-run to resume it."
+                )
+
+    sha256 = _verify_checksum(year, part_path)
+    os.replace(part_path, zip_path)
+    print(f"Successfully downloaded the survey data for the year {year}.")
+    return {
+        "url": url,
+        "size": os.path.getsize(zip_path),
+        "etag": etag,
+        "last_modified": last_modified,
+        "sha256": sha256,
+    }
+
+def _expected_size(response, offset):
+    """Full archive size from `Content-Range` (resumed) or `Content-Length` (fresh download)"""
+    content_range = response.headers.get("Content-Range")
+    if content_range and "/" in content_range and not content_range.endswith("*"):
+        return int(content_range.rsplit("/", 1)[1])
+    content_length = response.headers.get("Content-Length")
+    if content_length is not None:
+        return offset + int(content_length)
+    return None
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def source_checksum(year, use_cache):
+    """
+    sha256 of the year source file (downloaded first when not cached).
+    Reuses the `.sha256` written next to the file, as long as it's not older than the file.
+    """
+    source_path = _get_source_path(year)
+    if not use_cache or not os.path.exists(source_path):
+        _download_file(year)
+        source_path = _get_source_path(year)
+
+    checksum_path = f"{source_path}.sha256"
+    if os.path.exists(checksum_path) and os.path.getmtime(checksum_path) >= os.path.getmtime(source_path):
+        with open(checksum_path) as f:
+            return f.read().split()[0]
+
+    sha256 = _sha256(source_path)
+    _write_checksum(source_path, sha256)
+    return sha256
+
+def _write_checksum(path, sha256):
+    with open(f"{path}.sha256", 'w') as f:
+        f.write(f"{sha256}  {os.path.basename(path)}\n")
+
+def _verify_checksum(year, path):
+    """Checks the archive against the pinned sha256 (if known) and records it next to the archive"""
+    sha256 = _sha256(path)
+    expected = helpers.get_checksum(year)
+    if expected is not None and sha256 != expected:
+        os.remove(path)
+        raise Exception(f"Checksum mismatch for the survey data of the year {year}: {sha256} != {expected}")
+
+    _write_checksum(_get_archive_path(year), sha256)
+    if expected is None:
+        print(f"No pinned checksum for {year}, downloaded archive sha256: {sha256}")
+    return sha256
+
+def _find_csv_member(zip_ref):
+    for name in zip_ref.namelist():
+        if os.path.basename(name) == _CSV_NAME:
+            return name
+    raise FileNotFoundError(f"{_CSV_NAME} is missing from {zip_ref.filename}")
+
+def _iter_archive_chunks(zip_ref, member, **read_kwargs):
+    # Keeps the archive open while the chunks are consumed
+    with zip_ref, zip_ref.open(member) as f:
+        yield from pd.read_csv(f, **read_kwargs)
+
+def _read_csv(source_path, **read_kwargs):
+    """`pd.read_csv` of an extracted CSV, or of the CSV member straight from the .zip (no extraction)"""
+    if not source_path.endswith(".zip"):
+        return pd.read_csv(source_path, **read_kwargs)
+
+    # Raises FileNotFoundError right away, also in the chunked mode
+    zip_ref = zipfile.ZipFile(source_path, 'r')
+    member = _find_csv_member(zip_ref)
+    if read_kwargs.get("chunksize"):
+        return _iter_archive_chunks(zip_ref, member, **read_kwargs)
+
+    # zipfile validates the member CRC once it's read to the end
+    with zip_ref, zip_ref.open(member) as f:
+        return pd.read_csv(f, **read_kwargs)
+
+def _read_registered_csv(year, source_path, **read_kwargs):
+    """
+    `_read_csv` with the dropped columns never parsed, and every read of the year (full, chunks, first rows)
+    parsed with the same dtypes: the ones of the whole year (see `_year_dtypes`).
+    """
+    full_read = len(read_kwargs) == 0
+    dtypes = _load_dtypes(source_path)
+    if dtypes is None and full_read:
+        # The whole year is parsed anyway, its dtypes are recorded for the next partial reads
+        df = _read_inferred_csv(year, source_path)
+        dtypes = _year_dtypes(year, _column_kinds(df, {}))
+        _store_dtypes(source_path, dtypes)
+        return _cast(df, dtypes)
+    if dtypes is None:
+        dtypes = _scan_dtypes(year, source_path)
+    usecols = column_registry.read_options(year)["usecols"]
+    return _read_csv(source_path, usecols=usecols, dtype=dtypes, **read_kwargs)
+
+def _read_inferred_csv(year, source_path):
+    """`_read_csv` with the registered dtypes, the registered numeric dtypes are inferred when the year doesn't match them"""
+    try:
+        return _read_csv(source_path, **column_registry.read_options(year))
+    except ValueError:
+        return _read_csv(source_path, **column_registry.read_options(year, numeric_dtypes=False))
+
+def _scan_dtypes(year, source_path):
+    """A first pass over the chunks of the year (only done once per source file) for the dtypes of the whole year"""
+    print(f"Scanning the column dtypes of the survey data for the year {year}.")
+    kinds = {}
+    # The registered numeric dtypes are inferred too, `_year_dtypes` checks the answers against them
+    read_options = column_registry.read_options(year, numeric_dtypes=False)
+    for chunk in _read_csv(source_path, chunksize=_SCAN_CHUNKSIZE, **read_options):
+        _column_kinds(chunk, kinds)
+    dtypes = _year_dtypes(year, kinds)
+    _store_dtypes(source_path, dtypes)
+    return dtypes
+
+def _column_kinds(df, kinds):
+    """
+    Merges the parsed values of the frame into `kinds`: column -> (kind, has missing values),
+    kind being "int" < "float" < "text" (None while the column has only missing values)
+    """
+    for col in df.columns:
+        values = df[col]
+        missing = values.isna()
+        if missing.all():
+            kind = None
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            kind = "int"
+        elif pd.api.types.is_float_dtype(values.dtype):
+            kind = "float"
+        else:
+            kind = "text"
+        known_kind, known_missing = kinds.get(col, (None, False))
+        if known_kind is not None and (kind is None or _KINDS.index(known_kind) > _KINDS.index(kind)):
+            kind = known_kind
+        kinds[col] = (kind, known_missing or bool(missing.any()))
+    return kinds
+
+def _year_dtypes(year, kinds):
+    """
+    The dtypes of the year's columns, those pandas infers on the whole year:
+    - "str": the registered text columns, and the columns with any text answer
+    - "float64": the registered float columns, and the numeric ones with missing or fractional values
+    - "int64": the other numeric columns
+    A registered numeric column with text answers in this year is read as text (with a warning).
+    """
+    registered = column_registry.registry(year)
+    dtypes = {}
+    for col, (kind, missing) in kinds.items():
+        column = registered.get(col)
+        if kind == "text" or (column is not None and column.dtype == "str"):
+            if column is not None and column.dtype != "str":
+                print(f"!! Warning: {year} has text answers in the registered {column.dtype} column '{col}', read as text")
+            dtypes[col] = "str"
+        elif kind == "float" or missing or (column is not None and column.dtype == "float64"):
+            dtypes[col] = "float64"
+        else:
+            dtypes[col] = "int64"
+    return dtypes
+
+def _cast(df, dtypes):
+    """Casts the columns parsed with another dtype (e.g. mixed answers of the low-memory parser) to the year's dtypes"""
+    for col, dtype in dtypes.items():
+        if df[col].dtype != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def _dtypes_path(source_path):
+    return f"{source_path}.dtypes.json"
+
+def _source_meta(source_path):
+    stat = os.stat(source_path)
+    return {"schema_version": parquet_cache.SCHEMA_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def _load_dtypes(source_path):
+    """The recorded dtypes of the source file, None if not recorded (or recorded for another file / parsing)"""
+    path = _dtypes_path(source_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        recorded = json.load(f)
+    if recorded.get("source") != _source_meta(source_path):
+        return None
+    return recorded["dtypes"]
+
+def _store_dtypes(source_path, dtypes):
+    with open(_dtypes_path(source_path), 'w') as f:
+        json.dump({"source": _source_meta(source_path), "dtypes": dtypes}, f, indent=2)
+
+def _read_file(year, cache, columns=None, **read_kwargs):
+    source_path = _get_source_path(year)
+    # Partial reads (chunksize/nrows) always go to the CSV, full reads go through the Parquet cache
+    full_read = len(read_kwargs) == 0
+    if full_read:
+        df = parquet_cache.load(year, source_path, columns)
+        if df is not None:
+            return df
+
+    # Read the CSV into a Pandas DataFrame (or a chunks iterator when `chunksize` is passed).
     try:
-        df = pd.read_csv(csv_path)
+        df = _read_registered_csv(year, source_path, **read_kwargs)
         print(f"Successfully loaded the survey data for the year {year}.")
+        if full_read:
+            parquet_cache.store(year, source_path, df)
+            if columns is not None:
+                df = df[columns]
         return df
 
     except FileNotFoundError:
@@ -60,8 +311,16 @@ def _read_file(year, cache):
         if cache is False:
             return None
         else:
-            _download_file_and_unpack(year)
-            return _read_file(year, cache)
-    
-def _get_zip_path(year):
-    return f"data/{_SO_SURVEY_PREFIX}-{year}/survey_results_public.csv"
\ No newline at end of file
+            _download_file(year)
+            return _read_file(year, cache, columns, **read_kwargs)
+
+def _get_archive_path(year):
+    return f"data/{_SO_SURVEY_PREFIX}-{year}.zip"
+
+def _get_csv_path(year):
+    """Where older runs of the pipeline extracted the CSV to"""
+    return f"data/{_SO_SURVEY_PREFIX}-{year}/{_CSV_NAME}"
+
+def _get_source_path(year):
+    csv_path = _get_csv_path(year)
+    return csv_path if os.path.exists(csv_path) else _get_archive_path(year)
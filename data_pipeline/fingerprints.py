@@ -0,0 +1,163 @@
+# Row fingerprints of the survey responses (deduplication)
+# Every response gets a 64-bit fingerprint (`pd.util.hash_pandas_object`, vectorized over the columns)
+# of its answers, the synthetic ResponseId / survey_year are left out. Duplicates are found on
+# that single uint64 column instead of comparing the whole wide frame:
+#   - within a year (or a chunk) and across the years of a run
+#   - across runs: the fingerprints of the loaded responses are kept in `data/fingerprints.parquet`,
+#     so `--incremental` rejects the already loaded responses without re-reading the earlier years
+# The fingerprints are taken in `preprocess_data.remove_duplicates` on the frames as read, over every column
+# read from the CSV by default (see `answer_columns`). They depend on the parsed dtypes, so the store is
+# started over when the parsing changes (`parquet_cache.SCHEMA_VERSION`).
+
+# 3rd parties
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Data pipeline internals
+import parquet_cache
+
+STORE_PATH = "data/fingerprints.parquet"
+# Never part of a fingerprint (unique per row, or the same for the whole year)
+EXCLUDED_COLUMNS = ("ResponseId", "Respondent", "survey_year")
+
+def answer_columns(df) -> list:
+    """
+    The columns that define a duplicate response by default: every column read from the CSV (all the answers
+    of the year, registered or not, only the dropped columns are never read) but the `EXCLUDED_COLUMNS`.
+    Two responses are duplicates when they have the same answer in every one of them.
+    """
+    return [col for col in df.columns if col not in EXCLUDED_COLUMNS]
+
+def compute(df, columns) -> np.ndarray:
+    """
+    The uint64 fingerprint of every row of `df`.
+
+    Parameters:
+    - df (pd.DataFrame): The survey responses.
+    - columns (list): The columns to fingerprint (the ones missing from `df` and the `EXCLUDED_COLUMNS`
+      are skipped), e.g. `answer_columns(df)`.
+    """
+    columns = [col for col in columns if col in df.columns and col not in EXCLUDED_COLUMNS]
+    if not columns:
+        raise Exception("no column left to fingerprint the responses with")
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+def first_occurrences(row_fingerprints) -> np.ndarray:
+    """Mask of the rows whose fingerprint was not seen in an earlier row"""
+    _, first = np.unique(row_fingerprints, return_index=True)
+    keep = np.zeros(len(row_fingerprints), dtype=bool)
+    keep[first] = True
+    return keep
+
+class FingerprintStore:
+    """
+    Fingerprints of the loaded responses by survey year: the ones of the previous runs (read from `path`)
+    and the ones accepted during this run (written back by `save`, once the load succeeded).
+    """
+
+    def __init__(self, path=STORE_PATH, columns=None, reset=False):
+        self.path = path
+        self.columns = list(columns) if columns is not None else None
+        self._years = {}
+        self._added = {}
+        if not reset and os.path.exists(path):
+            self._read()
+        # The known fingerprints: sorted runs of decreasing size, merged only with a run of a similar size
+        # (every fingerprint is sorted again O(log n) times, not once per year / chunk)
+        self._runs = []
+        self._add(self._all())
+
+    def _meta_path(self):
+        return f"{os.path.splitext(self.path)[0]}.json"
+
+    def _read(self):
+        meta_path = self._meta_path()
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        if meta.get("columns") != self.columns:
+            print(f"!! Warning: {self.path} was fingerprinted on other columns, starting a new fingerprint store")
+            return
+        if meta.get("schema_version") != parquet_cache.SCHEMA_VERSION:
+            print(f"!! Warning: {self.path} was fingerprinted on another parsing of the CSV, starting a new fingerprint store")
+            return
+
+        stored = pd.read_parquet(self.path)
+        for year, part in stored.groupby("survey_year"):
+            self._years[int(year)] = part["fingerprint"].to_numpy(dtype=np.uint64)
+        print(f"[fingerprints] {len(stored)} loaded responses in {self.path} ({', '.join(map(str, self._years))})")
+
+    def _all(self):
+        arrays = [*self._years.values(), *(a for parts in self._added.values() for a in parts)]
+        return np.unique(np.concatenate(arrays)) if arrays else np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        return sum(len(run) for run in self._runs)
+
+    def _add(self, new):
+        # `new` holds unique fingerprints not in the store yet, so the runs stay disjoint and merging two
+        # of them is a stable sort of their concatenation (a linear merge of the two sorted halves)
+        run = np.sort(new)
+        while self._runs and len(self._runs[-1]) <= len(run):
+            run = np.sort(np.concatenate([self._runs.pop(), run]), kind="stable")
+        if len(run):
+            self._runs.append(run)
+
+    def _contains(self, row_fingerprints) -> np.ndarray:
+        found = np.zeros(len(row_fingerprints), dtype=bool)
+        for run in self._runs:
+            positions = np.minimum(np.searchsorted(run, row_fingerprints), len(run) - 1)
+            found |= run[positions] == row_fingerprints
+        return found
+
+    def drop_years(self, years):
+        """Forgets the responses of the years that are reloaded"""
+        for year in years:
+            self._years.pop(year, None)
+            self._added.pop(year, None)
+        self._runs = []
+        self._add(self._all())
+
+    def filter(self, year, row_fingerprints) -> np.ndarray:
+        """
+        Mask of the new responses of a year: first occurrence in `row_fingerprints` and not loaded already
+        (previous runs, earlier years / chunks of this run). The kept fingerprints are added to the store.
+        """
+        keep = first_occurrences(row_fingerprints)
+        keep &= ~self._contains(row_fingerprints)
+        added = row_fingerprints[keep]
+        self._added.setdefault(year, []).append(added)
+        self._add(added)
+        return keep
+
+    def restore(self, year, row_fingerprints):
+        """Adds the fingerprints of rows accepted earlier (a year read back from a checkpoint), without filtering"""
+        row_fingerprints = np.asarray(row_fingerprints, dtype=np.uint64)
+        self._added.setdefault(year, []).append(row_fingerprints)
+        self._add(np.unique(row_fingerprints[~self._contains(row_fingerprints)]))
+
+    def added(self, year) -> np.ndarray:
+        """The fingerprints accepted for `year` in this run (in row order)"""
+        parts = self._added.get(year, [])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.uint64)
+
+    def save(self):
+        """Writes the store with the responses of this run (atomic replace of the previous one)"""
+        years = dict(self._years)
+        for year in self._added:
+            years[year] = np.concatenate([years.get(year, np.empty(0, dtype=np.uint64)), self.added(year)])
+        frame = pd.DataFrame({
+            "survey_year": np.concatenate([np.full(len(fps), year, dtype=np.int16) for year, fps in years.items()])
+                if years else np.empty(0, dtype=np.int16),
+            "fingerprint": np.concatenate(list(years.values())) if years else np.empty(0, dtype=np.uint64),
+        })
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+        with open(self._meta_path(), "w") as f:
+            json.dump({"columns": self.columns, "schema_version": parquet_cache.SCHEMA_VERSION, "rows": len(frame)}, f, indent=2)
+        print(f"[fingerprints] {len(frame)} loaded responses saved to {self.path}")
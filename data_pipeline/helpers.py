@@ -15,6 +15,36 @@ def setup():
     
     return database_url
 
+def pop_option(args, flag, cast=int, default=None):
+    """Pops `flag VALUE` out of the args list (if exists) and returns the casted value (CLI of the pipeline scripts)"""
+    if flag not in args:
+        return default
+    idx = args.index(flag)
+    if idx + 1 >= len(args):
+        raise Exception(f"missing value for '{flag}'")
+    value = cast(args[idx + 1])
+    del args[idx:idx + 2]
+    return value
+
+# Pinned sha256 of the survey archives (year -> hex digest), downloads of the listed years are verified against it.
+# The digest of every download is printed and written next to the archive (`.zip.sha256`) so it can be pinned here.
+_SURVEY_SHA256 = {}
+
+def get_checksum(year):
+    return _SURVEY_SHA256.get(year)
+
+def get_url(year):
+    # Mirror (or local stand-in server) of the survey archives, named like the original ones
+    mirror_url = os.getenv('SURVEY_MIRROR_URL')
+    if mirror_url:
+        return f"{mirror_url.rstrip('/')}/stack-overflow-developer-survey-{year}.zip"
+
+    base_url = get_base_url(year)
+    # The 2023 route is already the full archive url
+    if base_url.endswith(".zip"):
+        return base_url
+    return f"{base_url}/stack-overflow-developer-survey-{year}.zip"
+
 def get_base_url(year):
     """Some workaround to the fact that the 2023 raw data is in different route then older data points"""
 
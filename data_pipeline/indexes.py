@@ -0,0 +1,110 @@
+# Post-load keys, indexes and statistics of the star schema
+# The DDL plan is derived from the table naming convention of `load_data.load`:
+#   - `*_dim`: primary key on the `*_id` column (a unique index on SQLite, which can't add one to a table)
+#   - `*_link`: (fact, member) and (member, fact) composite indexes, for the joins in both directions
+#   - survey_facts and its cold tables (see `fact_groups`): (response_id, survey_year)
+# The indexes are dropped before the load (bulk inserts don't maintain them), rebuilt afterwards
+# and followed by ANALYZE. Both steps are idempotent, every build is timed.
+
+# 3rd parties
+import hashlib
+import time
+from typing import NamedTuple
+from sqlalchemy import inspect, text
+
+# Internals
+import metrics
+import fact_groups
+
+_MAX_NAME_LENGTH = 63  # PostgreSQL identifiers
+_FACT_COLUMNS = ("fact_id", "response_id", "survey_response_id")
+_FACTS_INDEX_COLUMNS = ("response_id", "survey_year")
+
+class IndexSpec(NamedTuple):
+    name: str
+    table: str
+    columns: tuple
+    primary: bool = False
+
+def _index_name(prefix, table_name, columns):
+    name = f"{prefix}_{table_name}__{'__'.join(columns)}"
+    if len(name) <= _MAX_NAME_LENGTH:
+        return name
+    digest = hashlib.sha1(name.encode()).hexdigest()[:8]
+    return f"{name[:_MAX_NAME_LENGTH - 9]}_{digest}"
+
+def plan(engine) -> list:
+    """The keys / indexes of the tables currently in the DB"""
+    inspector = inspect(engine)
+    specs = []
+    for table_name in sorted(inspector.get_table_names()):
+        names = [c["name"] for c in inspector.get_columns(table_name)]
+        if table_name.endswith("_dim"):
+            id_cols = [n for n in names if n.endswith("_id")]
+            if len(id_cols) == 1:
+                specs.append(IndexSpec(f"{table_name}_pkey", table_name, (id_cols[0],), primary=True))
+        elif table_name.endswith("_link"):
+            fact_col = next((c for c in _FACT_COLUMNS if c in names), None)
+            member_cols = [n for n in names if n != fact_col]
+            if fact_col is None or len(member_cols) != 1:
+                continue
+            for columns in ((fact_col, member_cols[0]), (member_cols[0], fact_col)):
+                specs.append(IndexSpec(_index_name("ix", table_name, columns), table_name, columns))
+        elif fact_groups.is_facts_table(table_name) and all(c in names for c in _FACTS_INDEX_COLUMNS):
+            specs.append(IndexSpec(_index_name("ix", table_name, _FACTS_INDEX_COLUMNS), table_name, _FACTS_INDEX_COLUMNS))
+    return specs
+
+def _quote(names):
+    return ", ".join(f'"{n}"' for n in names)
+
+def _is_postgres(engine):
+    return engine.dialect.name == "postgresql"
+
+def _has_primary_key(engine, table_name):
+    return bool(inspect(engine).get_pk_constraint(table_name).get("constrained_columns"))
+
+def drop(engine):
+    """Drops the planned keys / indexes before a bulk load (missing ones are skipped)"""
+    specs = plan(engine)
+    with engine.begin() as conn:
+        for spec in specs:
+            if spec.primary and _is_postgres(engine):
+                conn.execute(text(f'ALTER TABLE "{spec.table}" DROP CONSTRAINT IF EXISTS "{spec.name}"'))
+            else:
+                conn.execute(text(f'DROP INDEX IF EXISTS "{spec.name}"'))
+    if specs:
+        print(f"[indexes] dropped {len(specs)} keys/indexes before the load")
+
+@metrics.instrument("post_load.index", key="name", rows_out=None)
+def _build_index(engine, name, spec):
+    with engine.begin() as conn:
+        if spec.primary and _is_postgres(engine):
+            if not _has_primary_key(engine, spec.table):
+                conn.execute(text(f'ALTER TABLE "{spec.table}" ADD CONSTRAINT "{spec.name}" PRIMARY KEY ({_quote(spec.columns)})'))
+        else:
+            unique = "UNIQUE " if spec.primary else ""
+            conn.execute(text(f'CREATE {unique}INDEX IF NOT EXISTS "{spec.name}" ON "{spec.table}" ({_quote(spec.columns)})'))
+
+def build(engine):
+    """
+    Creates the planned keys / indexes (existing ones are kept) and refreshes the planner statistics.
+    Returns (index name, seconds) of every build.
+    """
+    specs = plan(engine)
+    timings = []
+    for spec in specs:
+        start = time.perf_counter()
+        _build_index(engine, spec.name, spec)
+        timings.append((spec.name, time.perf_counter() - start))
+        print(f"[indexes] {spec.name} on {spec.table}({', '.join(spec.columns)}): {timings[-1][1]:.3f}s")
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        if _is_postgres(engine):
+            for table_name in sorted({spec.table for spec in specs}):
+                conn.execute(text(f'ANALYZE "{table_name}"'))
+        else:
+            conn.execute(text("ANALYZE"))
+    print(f"[indexes] built {len(timings)} keys/indexes in {sum(t for _, t in timings):.2f}s, "
+          f"ANALYZE: {time.perf_counter() - start:.2f}s")
+    return timings
@@ -1,13 +1,30 @@
 import pandas as pd
-import numpy as np
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text, make_url, BigInteger, Float, Text
 import re
 
+# Data pipeline internals
+import bulk_write
+import dim_registry
+import transforms
+import metrics
+import columns
+import upload_scheduler
+import rollups
+import parquet_target
+import fact_groups
+import dimensions
+
 def refactor_column_names_to_snake_case(df):
-    new_columns = {col: title_case_to_snake_case(col) for col in df.columns}
+    # Registered columns keep their registry name, the others are converted
+    new_columns = {col: columns.SNAKE_NAMES.get(col) or _snake_case(col) for col in df.columns}
     df.rename(columns=new_columns, inplace=True)
     return df
 
+def observe_facts(processed, state):
+    """Counts a processed chunk in the column stats of the survey_facts split (see `fact_groups.FactGroups.observe`)"""
+    if state["facts"] is not None:
+        state["facts"].observe(refactor_column_names_to_snake_case(processed))
+
 def title_case_to_snake_case(s):
     # Convert TitleCase to snake_case
     s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', s)
@@ -18,338 +35,220 @@ def title_case_to_snake_case(s):
     
     return snake_case
 
-def upload_to_db(df: pd.DataFrame, table_name, engine, if_exists='replace'):
+# Same column names come back for every year/chunk, compute them once
+_snake_case = transforms.memoize(title_case_to_snake_case)
+
+@metrics.instrument("load.upload", key="table_name", rows_out=lambda stats: stats["rows"],
+                    bytes_written=metrics.written_bytes)
+def upload_to_db(df: pd.DataFrame, table_name, engine, if_exists='replace', batch_size=None):
     print(f">  uploading: {table_name}")
     
-    # Upload table
+    # Upload table (COPY on PostgreSQL, batched executemany elsewhere, files for the Parquet target)
     print(f">  new rows: {df.shape[0]}")
-    df.to_sql(table_name, engine, if_exists=if_exists, index=False)
-
-def process_categorical_for_olap(df, col_name, existing_dim_df=None):
-    print(f":: {col_name}")
-    # Drop NaNs and get unique categories
-    unique_categories = set()
-    for item_list in df[col_name].dropna():
-        for item in item_list.split(';'):
-            unique_categories.add(item.strip())
-
-    # If existing_dim_df is provided, filter only new unique categories
-    if existing_dim_df is not None:
-        # existing_dim_df = refactor_column_names_to_title_case(existing_dim_df)
-        existing_categories = set(existing_dim_df[col_name])
-        new_categories = unique_categories - existing_categories
-    else:
-        new_categories = unique_categories
-
-    # Create or update the DataFrame for the dimension table
-    if existing_dim_df is not None and len(new_categories) > 0:
-        next_id = existing_dim_df[f"{col_name}_id"].max() + 1
-        new_dim_df = pd.DataFrame(list(new_categories), columns=[col_name])
-        new_dim_df[f"{col_name}_id"] = range(next_id, next_id + len(new_dim_df))
-        dim_df = new_dim_df
-    else:
-        dim_df = existing_dim_df if existing_dim_df is not None else pd.DataFrame(list(unique_categories), columns=[col_name])
-        if existing_dim_df is None:
-            dim_df[f"{col_name}_id"] = range(1, len(dim_df) + 1)
-
-    # Create a mapping from category to ID
-    category_to_id = dim_df.set_index(col_name).to_dict()[f"{col_name}_id"]
-    # Create link table
-    link_list = []
-    for idx, row in df.iterrows():
-        if pd.notna(row[col_name]):
-            for item in row[col_name].split(';'):
-                item_id = category_to_id[item.strip()]
-                link_list.append({'fact_id': idx, f"{col_name}_id": item_id})
-
-    link_df = pd.DataFrame(link_list)
-
-    # Drop the original column from the main DataFrame
-    df = df.drop(columns=[col_name])
-
-    return dim_df, link_df, df
-
-def process_professional_tech(df) -> (pd.DataFrame, pd.DataFrame):
-    column_name = "professional_tech"
-    stacked_df = (df[column_name]
-        .str.split(';', expand=True)
-        .stack()
-        .reset_index(level=1, drop=True)
-        .rename(column_name))
-    
-    unique_techs = pd.DataFrame(stacked_df.drop_duplicates().reset_index(drop=True), columns=[column_name])
-    unique_techs['professional_tech_id'] = unique_techs.index
-    
-    dim_table = unique_techs[['professional_tech_id', column_name]]
-    
-    stacked_df = stacked_df.reset_index()
-    link_table = pd.merge(stacked_df, dim_table, on=column_name, how='left')
-    link_table.rename(columns={'index': 'response_id'}, inplace=True)
-    
-    # Adjust response_id to align with real IDs
-    link_table['response_id'] = link_table['response_id'] + 1
-    
-    link_table = link_table.drop(columns=[column_name])
-    df = df.drop(columns=[column_name])
-
-    return dim_table, link_table, df
-
-def process_dev_type(df) -> (pd.DataFrame, pd.DataFrame):
-    column_name = "dev_type"
-    # First, split by commas to get separate professions
-    stacked_df = (df[column_name]
-        .str.split(',', expand=True)
-        .stack()
-        .reset_index(level=1, drop=True)
-        .rename(column_name))
-
-    # Then, take the part before the first semicolon in each string
-    stacked_df = stacked_df.str.split(';', n=1).str[0]
-    
-    # Normalize text: convert to lowercase, replace '-' and '_' with '', and strip leading/trailing whitespace
-    stacked_df = (stacked_df.str.lower()
-                  .str.replace('-', '')
-                  .str.replace('_', '')
-                  .str.strip())
-    
-    unique_techs = pd.DataFrame(stacked_df.drop_duplicates().reset_index(drop=True), columns=[column_name])
-    
-    unique_techs['dev_type_id'] = unique_techs.index
-    
-    dim_table = unique_techs[['dev_type_id', column_name]]
-    
-    stacked_df = stacked_df.reset_index()
-    link_table = pd.merge(stacked_df, dim_table, on=column_name, how='left')
-    link_table.rename(columns={'index': 'response_id'}, inplace=True)
-    
-    # Adjust response_id to align with real IDs
-    link_table['response_id'] = link_table['response_id'] + 1
-
-    link_table = link_table.drop(columns=[column_name])
-    df = df.drop(columns=[column_name])
-
-    return dim_table, link_table, df
-
-def process_work_mode(df) -> (pd.DataFrame, pd.DataFrame):
-    # Create dimension table
-    work_modes = df['remote_work'].dropna().unique()
-    work_mode_df = pd.DataFrame(work_modes, columns=['remote_work'])
-    work_mode_df['remote_work_id'] = range(1, len(work_mode_df) + 1)
-    
-    # Create a dictionary for mapping work mode to IDs
-    work_mode_to_id = work_mode_df.set_index('remote_work').to_dict()['remote_work_id']
-    
-    # Map the main DataFrame to use remote_work_id
-    df['remote_work_id'] = df['remote_work'].map(work_mode_to_id)
-    
-    return work_mode_df, df
-
-def process_employment(df) -> (pd.DataFrame, pd.DataFrame):
-    # Extract unique employment statuses
-    employment_statuses = set()
-    for status_list in df['employment'].str.split(';'):
-        if status_list is not np.nan:
-            for status in status_list:
-                employment_statuses.add(status)
-
-    # Create dimension table
-    employment_df = pd.DataFrame(list(employment_statuses), columns=['employment_status'])
-    employment_df['employment_status_id'] = range(1, len(employment_df) + 1)
-
-    # Create link table
-    link_list = []
-    for idx, row in df.iterrows():
-        if row['employment'] is not np.nan:
-            for status in row['employment'].split(';'):
-                status_id = employment_df.loc[employment_df['employment_status'] == status, 'employment_status_id'].iloc[0]
-                link_list.append({'survey_response_id': idx, 'Employment_status_id': status_id})
-
-    link_df = pd.DataFrame(link_list)
+    if isinstance(engine, parquet_target.Transaction):
+        return engine.write(df, table_name, if_exists=if_exists, batch_size=batch_size)
+    return bulk_write.write(df, table_name, engine, if_exists=if_exists, batch_size=batch_size)
 
-    return employment_df, link_df
+# Seconds a SQLite writer waits for the DB lock held by another upload thread
+_SQLITE_LOCK_TIMEOUT = 600
 
-def process_pair_of_columns_for_olap(df, col_name_base, existing_dim_df=None):
-    print(f":: {col_name_base}")
-    # Collect unique categories across both columns
-    unique_categories = set()
-    suffixes = ["_have_worked_with", "_want_to_work_with"]
-    
-    for suffix in suffixes:
-        col_name = f"{col_name_base}{suffix}"
-        if col_name not in df.columns:
-            print(f"!! Warning: Column '{col_name}' not found in DataFrame.")
-            return None, None, df
-        for item_list in list(df[col_name].dropna()):
-            for item in item_list.split(';'):
-                unique_categories.add(item.strip())
-    
-    if existing_dim_df is not None:
-        # Use the existing dimension DataFrame if provided
-        dim_df = existing_dim_df
-        existing_categories = set(existing_dim_df[col_name_base])
-        new_categories = unique_categories - existing_categories
-        
-        # Add new categories to dim_df
-        if new_categories:
-            next_id = existing_dim_df[f"{col_name_base}_id"].max() + 1
-            new_dim_df = pd.DataFrame(list(new_categories), columns=[col_name_base])
-            new_dim_df[f"{col_name_base}_id"] = range(next_id, next_id + len(new_dim_df))
-            dim_df = pd.concat([existing_dim_df, new_dim_df]).reset_index(drop=True)
-    else:
-        dim_df = pd.DataFrame(list(unique_categories), columns=[col_name_base])
-        dim_df[f"{col_name_base}_id"] = range(1, len(dim_df) + 1)
-    
-    # Create a mapping from category to ID
-    category_to_id = dim_df.set_index(col_name_base).to_dict()[f"{col_name_base}_id"]
-    link_dfs = {}
-    # Create the link tables for each of the two columns
-    for suffix in suffixes:
-        col_name = f"{col_name_base}{suffix}"
-        link_list = []
-        for idx, row in df.iterrows():
-            if pd.notna(row[col_name]):
-                for item in row[col_name].split(';'):
-                    item_id = category_to_id.get(item.strip())
-                    if item_id is not None:
-                        link_list.append({'fact_id': idx, f"{col_name_base}_id": item_id})
-        link_dfs[suffix] = pd.DataFrame(link_list)
-
-    # Drop the original columns from the main DataFrame
-    for suffix in suffixes:
-        df = df.drop(columns=[f"{col_name_base}{suffix}"])
-
-    return dim_df, link_dfs, df
-
-def process_special_columns_for_olap(df, col_names):
-    unique_categories = set()
-    
-    # Populate unique_categories and create dimension DataFrame (dim_df)
-    for col_name in col_names:
-        for item_list in df[col_name].dropna():
-            for item in item_list.split(';'):
-                unique_categories.add(item.strip())
-    
-    # Unified column name for the dimension table
-    unified_col_name = 'operating_system'
-    dim_df = pd.DataFrame(list(unique_categories), columns=[unified_col_name])
-    dim_df[f"{unified_col_name}_id"] = range(1, len(dim_df) + 1)
-
-    # Create a mapping from category to ID
-    category_to_id = dim_df.set_index(unified_col_name).to_dict()[f"{unified_col_name}_id"]
-
-    link_list = []
-    # Create the link tables
-    for col_name in col_names:
-        for idx, row in df.iterrows():
-            if pd.notna(row[col_name]):
-                for item in row[col_name].split(';'):
-                    item_id = category_to_id[item.strip()]
-                    link_list.append({'fact_id': idx, f"{unified_col_name}_id": item_id})
-
-    link_df = pd.DataFrame(link_list)
-
-    # Drop the original columns from the main DataFrame
-    for col_name in col_names:
-        df = df.drop(columns=[col_name])
-
-    return dim_df, link_df, df
-
-def load(processed, db_host_url):
+def new_load_state(dims_snapshot=None, append=False, upload_workers=upload_scheduler.DEFAULT_WORKERS, checkpoint=None,
+                   facts=None):
+    """
+    State shared between `load` calls of the same run (e.g. the chunks of the streaming mode).
+
+    - engine: The DB engine (or the `parquet_target.ParquetTarget`), created once per run.
+    - registry: The `DimensionRegistry` (read once per run), dimension ids stay stable across chunks.
+    - written: Tables already written in this run, later chunks append to them.
+    - dims_snapshot: Local snapshot of the dimensions to use instead of reading them from the DB.
+    - append: Incremental load, facts and links are appended to the existing tables.
+    - upload_workers: # of tables uploaded concurrently (see `upload_scheduler`).
+    - rollups: The `rollups.Rollups` counted from the frames of every `load` call, see `write_rollups`.
+    - checkpoint: The `checkpoints.Checkpoint` of the run, its committed uploads are skipped (`--resume`).
+    - load_calls: # of `load` calls so far (the chunk an upload belongs to).
+    - facts: The `fact_groups.FactGroups` splitting survey_facts in hot / cold tables, None for a single table.
+    """
+    return {"engine": None, "registry": None, "written": set(), "dims_snapshot": dims_snapshot, "append": append,
+            "upload_workers": upload_workers, "rollups": rollups.Rollups(), "checkpoint": checkpoint, "load_calls": 0,
+            "facts": facts}
+
+def _engine_options(db_host_url, upload_workers):
+    """Connection pool sized for the concurrent uploads"""
+    if make_url(db_host_url).get_backend_name() == "sqlite":
+        # Single writer, the other threads (uploads, main thread DDL) wait for the lock
+        return {"connect_args": {"timeout": _SQLITE_LOCK_TIMEOUT}}
+    if not upload_workers or upload_workers <= 1:
+        return {}
+    # One connection per upload thread + one for the main thread (inspections, DDL)
+    return {"pool_size": upload_workers + 1}
+
+def connect(state, db_host_url):
+    """DB Engine init + all the existing dimensions (once per run)"""
+    if state["engine"] is None and parquet_target.is_parquet_url(db_host_url):
+        # Facts and links are always written from scratch, the dimensions of a previous run keep their ids
+        if state["append"] or state["dims_snapshot"]:
+            raise Exception("'--incremental' and '--dims-snapshot' are not supported with the Parquet output target")
+        state["engine"] = parquet_target.ParquetTarget(db_host_url[len(parquet_target.URL_PREFIX):])
+        state["registry"] = dim_registry.DimensionRegistry(None)
+        state["registry"].seed(state["engine"].read_dims())
+    elif state["engine"] is None:
+        state["engine"] = create_engine(db_host_url, **_engine_options(db_host_url, state["upload_workers"]))
+        state["registry"] = dim_registry.DimensionRegistry(state["engine"], state["dims_snapshot"])
+        if state["append"] and state["facts"] is not None:
+            # Appended columns stay in the facts table they were loaded to
+            state["facts"].seed(state["engine"])
+    return state["engine"]
+
+def is_file_target(state):
+    """The run writes files (`parquet_target`), no DB: no indexes, no SQL"""
+    return isinstance(state["engine"], parquet_target.ParquetTarget)
+
+def _add_missing_columns(engine, table_name, df):
+    """Adds the columns of a new survey year to an existing table before appending to it"""
+    inspector = inspect(engine)
+    if not inspector.has_table(table_name):
+        return
+    existing = {c["name"] for c in inspector.get_columns(table_name)}
+    missing = [col for col in df.columns if col not in existing]
+    if not missing:
+        return
+
+    with engine.begin() as conn:
+        for col in missing:
+            if pd.api.types.is_integer_dtype(df[col]):
+                col_type = BigInteger()
+            elif pd.api.types.is_numeric_dtype(df[col]):
+                col_type = Float()
+            else:
+                col_type = Text()
+            conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN "{col}" {col_type.compile(dialect=engine.dialect)}'))
+    print(f">  added {len(missing)} new columns to {table_name}")
+
+@metrics.instrument("load", rows_out=None)
+def load(processed, db_host_url, batch_size=None, state=None):
     """
     The 'Data Storage' stage
 
+    Parameters:
+    - processed (pd.DataFrame): The preprocessed survey data (all years, or a single chunk).
+    - db_host_url (str): SQLAlchemy URL of the target database.
+    - batch_size (int): Rows per write batch (see `bulk_write.DEFAULT_BATCH_SIZE`).
+    - state (dict): Run state from `new_load_state`, pass the same one to every chunk of a run.
+      Dimension ids then stay stable across chunks and link/fact tables are appended to.
+      The fact ids of the links are the `processed` index.
     """
+    state = state if state is not None else new_load_state()
+    state["load_calls"] += 1
     
     # Refactor column names to snake_case before uploading
     df = refactor_column_names_to_snake_case(processed)
 
-    # DB Engine init
-    engine = create_engine(db_host_url)
-    
-    # ----------------------------------------------------------------------------
-    #                           remote_work
-    # ----------------------------------------------------------------------------
-    work_mode_dim_df, df = process_work_mode(df)
-    upload_to_db(work_mode_dim_df, "remote_work_dim", engine, 'replace')
+    # DB Engine init + all the existing dimensions (once per run)
+    engine = connect(state, db_host_url)
+    registry = state["registry"]
+
+    # Tables are uploaded in the background (own transaction each) while the next ones are built
+    scheduler = _new_scheduler(state, batch_size)
+    try:
+        _build_and_upload(df, engine, registry, state, scheduler)
+        scheduler.join()
+    finally:
+        scheduler.shutdown()
+
+    print("finished loading data :)")
+
+def _new_scheduler(state, batch_size, prepare=None):
+    """Upload scheduler of the tables of a `load` call, `prepare(conn, table_name, if_exists)` runs before a write"""
+    def _upload(rows, table_name, conn, if_exists):
+        if prepare is not None:
+            prepare(conn, table_name, if_exists)
+        return upload_to_db(rows, table_name, conn, if_exists, batch_size=batch_size)
+    return upload_scheduler.UploadScheduler(state["engine"], _upload, workers=state["upload_workers"])
+
+def _submit(state, scheduler, df, table_name, if_exists, depends_on=()):
+    """Schedules an upload, unless a previous attempt of the run (`--resume`) already committed it"""
+    checkpoint = state["checkpoint"]
+    if checkpoint is None:
+        scheduler.submit(df, table_name, if_exists, depends_on=depends_on)
+        return
+    job_key = checkpoint.upload_key(table_name, if_exists, state["load_calls"], df)
+    if checkpoint.is_uploaded(job_key):
+        print(f">  {table_name}: uploaded by the previous attempt, skipping")
+        return
+    scheduler.submit(df, table_name, if_exists, depends_on=depends_on,
+                     on_success=lambda result: checkpoint.mark_uploaded(job_key, result))
+
+def _build_and_upload(df, engine, registry, state, scheduler):
+    """Builds the dim / link tables of `load` and submits their uploads (dims before their links, facts last)"""
+    # Rollups are counted from the link frames before they are uploaded
+    rollup = state["rollups"]
+    fact_years = df["survey_year"].astype("int64")
+
+    def _upload(df, table_name, if_exists='replace', depends_on=()):
+        # Links and facts of later chunks (or of an incremental load) are appended
+        if state["append"] and fact_groups.is_facts_table(table_name) and table_name not in state["written"]:
+            _add_missing_columns(engine, table_name, df)
+        if state["append"] or table_name in state["written"]:
+            if_exists = 'append'
+        state["written"].add(table_name)
+        if table_name.endswith("_link"):
+            rollup.add_link(table_name, depends_on[0], df, fact_years)
+        _submit(state, scheduler, df, table_name, if_exists, depends_on=depends_on)
+
+    def _upload_dim(dim_df, table_name):
+        # Only the rows the registry didn't know are written (the whole table the first time)
+        rows, if_exists = registry.register(table_name, dim_df)
+        if if_exists == 'replace' or len(rows) > 0:
+            _submit(state, scheduler, rows, table_name, if_exists)
 
     # ----------------------------------------------------------------------------
-    #                           professional_tech
+    #                   Dimensions + their link tables (see `dimensions`)
     # ----------------------------------------------------------------------------
-    pro_tech_dim_df, pro_tech_link_df, df = process_professional_tech(df)
-    upload_to_db(pro_tech_dim_df, "professional_tech_dim", engine)
-    upload_to_db(pro_tech_link_df, "professional_tech_link", engine)
-
-    # ----------------------------------------------------------------------------
-    #                               dev_type
-    # ----------------------------------------------------------------------------
-    dev_type_dim_df, dev_type_link_df, df = process_dev_type(df)
-    upload_to_db(dev_type_dim_df, "dev_type_dim", engine)
-    upload_to_db(dev_type_link_df, "dev_type_link", engine)
-
-    # ----------------------------------------------------------------------------
-    #                                op_sys
-    # ----------------------------------------------------------------------------
-    dim_df, link_df, df = process_special_columns_for_olap(df, ['op_sys_personal_use', 'op_sys_professional_use'])
-    upload_to_db(dim_df, "op_sys_dim", engine, 'replace')
-    upload_to_db(link_df, "op_sys_link", engine, 'replace')
-
-    # ----------------------------------------------------------------------------
-    #                       Iterating catagorical columns
-    # ----------------------------------------------------------------------------
-    catagorical_data_cols = [
-        'employment',
-        'coding_activities',
-        'learn_code',
-        'learn_code_online',
-        'buy_new_tool',
-        'newso_sites',
-    ]
-    for col in catagorical_data_cols:
-        # Fetch existing dimension data from the database
-        table_name = f"{col}_dim"
-        try:
-            existing_dim_data = pd.read_sql(f"SELECT * FROM {table_name}", engine)
-        except Exception as e:
-            existing_dim_data = pd.DataFrame()
-        dim_df, link_df, df = process_categorical_for_olap(df, col, None if existing_dim_data.empty else existing_dim_data)
-        link_table_name = f"{col}_link"
-        upload_to_db(dim_df, table_name, engine, 'replace')
-        upload_to_db(link_df, link_table_name, engine)
-
-    # ----------------------------------------------------------------------------
-    #           Iterating catagorical columns with have/want_work_with
-    # ----------------------------------------------------------------------------
-    catagorical_pairs_cols = [
-        'language',
-        'database',
-        'platform',
-        'webframe',
-        'misc_tech',
-        'tools_tech',
-        'new_collab_tools',
-        'office_stack_async',
-        'office_stack_sync',
-        'ai_search',
-        'ai_dev',
-    ]
-    for col in catagorical_pairs_cols:
-        table_name = f"{col}_dim"
-        try:
-            existing_dim_data = pd.read_sql(f"SELECT * FROM {table_name}", engine)
-        except Exception as e:
-            existing_dim_data = pd.DataFrame()
-
-        dim_df, link_dfs, df = process_pair_of_columns_for_olap(df, col, None if existing_dim_data.empty else existing_dim_data)
-        if dim_df is not None:
-            upload_to_db(dim_df, table_name, engine, 'replace')
-        if link_dfs is not None:
-            for d in link_dfs:
-                table_name_link = f"{col}{d}_link"
-                upload_to_db(link_dfs[d], table_name_link, engine, 'replace')
+    for spec in dimensions.SPECS:
+        # Existing dimension data comes from the registry (DB or a previous chunk)
+        dim_df, link_dfs, df = dimensions.build(df, spec, registry.get(spec.table))
+        if dim_df is None:
+            continue
+        _upload_dim(dim_df, spec.table)
+        for link_table, link_df in link_dfs.items():
+            _upload(link_df, link_table, depends_on=[spec.table])
+
+        if spec.links is None:
+            rollup.add_single(fact_groups.HOT_TABLE, spec.table, df[spec.id_col], fact_years)
+        elif spec.name == "employment":
+            rollup.add_remote_employment(link_dfs["employment_link"], df["remote_work_id"], fact_years)
 
     # ----------------------------------------------------------------------------
     #                           Main survey facts table
     # ---------------------------------------------------------------------------- 
-    upload_to_db(df, "survey_facts", engine)
-
-    print("finished loading data :)")
\ No newline at end of file
+    if state["facts"] is None:
+        _upload(df, fact_groups.HOT_TABLE, depends_on=True)
+        return
+    # Hot table + its cold column groups (see `fact_groups`)
+    for table_name, facts_df in state["facts"].split(df).items():
+        _upload(facts_df, table_name, depends_on=True)
+
+def write_rollups(state, batch_size=None):
+    """
+    Writes the rollups of all the `load` calls of the run (see `rollups`), once they are all done.
+    They go through the same uploads as the other tables (bulk writes, upload scheduler, `--resume` journal).
+    """
+    if state["engine"] is None:
+        return
+    rollup = state["rollups"]
+    years = sorted(rollup.years)
+    # An incremental load replaces only the rows of its years in the existing rollup tables
+    existing = set(inspect(state["engine"]).get_table_names()) if state["append"] else set()
+
+    def _delete_years(conn, table_name, if_exists):
+        if if_exists == 'append':
+            rollups.delete_years(conn, table_name, years)
+
+    scheduler = _new_scheduler(state, batch_size, prepare=_delete_years)
+    try:
+        for table_name, frame in rollup.frames(state["registry"]).items():
+            print(f"[rollups] {table_name}: {len(frame)} rows ({', '.join(map(str, years))})")
+            _submit(state, scheduler, frame, table_name, 'append' if table_name in existing else 'replace')
+        scheduler.join()
+    finally:
+        scheduler.shutdown()
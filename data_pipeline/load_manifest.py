@@ -0,0 +1,134 @@
+# Load manifest of the warehouse
+# The `load_manifest` table records every survey year that was loaded:
+#   - survey_year, rows (# of survey_facts rows) and the content hash (sha256 of the source archive)
+#   - the fact_id / ResponseId ranges of the year, so a year can be removed from the link tables
+#     and new years continue the ids instead of reloading everything
+# With `--incremental` only the missing years (or the ones whose source changed) are loaded.
+
+# 3rd parties
+from datetime import datetime, timezone
+import pandas as pd
+from sqlalchemy import inspect, text
+
+# Internals
+import fact_groups
+
+TABLE_NAME = "load_manifest"
+_FACTS_TABLE = "survey_facts"
+
+# Link tables keyed by the fact index + 1 instead of the fact index
+_ONE_BASED_FACT_COLUMNS = {"response_id"}
+_FACT_COLUMNS = ("fact_id", "response_id", "survey_response_id")
+
+def read(engine) -> pd.DataFrame:
+    """The manifest indexed by survey_year (empty when nothing was loaded yet)"""
+    if not inspect(engine).has_table(TABLE_NAME):
+        return pd.DataFrame().rename_axis("survey_year")
+    return pd.read_sql(f"SELECT * FROM {TABLE_NAME}", engine).set_index("survey_year")
+
+def plan(engine, years, hashes):
+    """
+    Splits the requested years by what the manifest already holds.
+
+    Returns (years to load, years whose source changed, years to skip)
+    """
+    manifest = read(engine)
+    if manifest.empty and inspect(engine).has_table(_FACTS_TABLE):
+        raise Exception(
+            f"'{_FACTS_TABLE}' exists but there is no '{TABLE_NAME}', run a full load once before using '--incremental'"
+        )
+
+    to_load, changed, skipped = [], [], []
+    for year in years:
+        if year not in manifest.index:
+            to_load.append(year)
+        elif manifest.loc[year, "content_hash"] != hashes[year]:
+            to_load.append(year)
+            changed.append(year)
+        else:
+            skipped.append(year)
+    return to_load, changed, skipped
+
+def next_offsets(engine):
+    """(max ResponseId, next fact id) to continue from"""
+    manifest = read(engine)
+    if manifest.empty:
+        return 0, 0
+    return int(manifest["response_id_max"].max()), int(manifest["fact_id_max"].max()) + 1
+
+def delete_years(engine, years):
+    """Removes previously loaded years from survey_facts (+ its cold tables), the link tables and the manifest"""
+    if not years:
+        return
+    manifest = read(engine)
+    inspector = inspect(engine)
+    link_tables = {t: [c["name"] for c in inspector.get_columns(t)]
+                   for t in inspector.get_table_names() if t.endswith("_link")}
+    facts_tables = [t for t in inspector.get_table_names() if fact_groups.is_facts_table(t)]
+
+    with engine.begin() as conn:
+        for year in years:
+            fact_min = int(manifest.loc[year, "fact_id_min"])
+            fact_max = int(manifest.loc[year, "fact_id_max"])
+            for table_name, columns in link_tables.items():
+                fact_col = next((c for c in _FACT_COLUMNS if c in columns), None)
+                if fact_col is None:
+                    continue
+                shift = 1 if fact_col in _ONE_BASED_FACT_COLUMNS else 0
+                conn.execute(
+                    text(f'DELETE FROM {table_name} WHERE "{fact_col}" BETWEEN :lo AND :hi'),
+                    {"lo": fact_min + shift, "hi": fact_max + shift},
+                )
+            for table_name in facts_tables:
+                conn.execute(text(f"DELETE FROM {table_name} WHERE survey_year = :year"), {"year": year})
+            conn.execute(text(f"DELETE FROM {TABLE_NAME} WHERE survey_year = :year"), {"year": year})
+            print(f"[manifest] removed the previous load of {year} (fact ids {fact_min}-{fact_max})")
+
+def summarize(df) -> pd.DataFrame:
+    """Per year rows + fact id / ResponseId ranges of a loaded frame (fact ids == the frame index)"""
+    frame = pd.DataFrame({
+        "survey_year": df["survey_year"].to_numpy(),
+        "fact_id": df.index.to_numpy(),
+        "response_id": df["ResponseId"].to_numpy(),
+    })
+    return frame.groupby("survey_year").agg(
+        rows=("fact_id", "size"),
+        fact_id_min=("fact_id", "min"),
+        fact_id_max=("fact_id", "max"),
+        response_id_min=("response_id", "min"),
+        response_id_max=("response_id", "max"),
+    )
+
+def combine(summaries) -> pd.DataFrame:
+    """Merges the summaries of several chunks of the same years"""
+    summary = pd.concat(summaries)
+    return summary.groupby(level=0).agg({
+        "rows": "sum",
+        "fact_id_min": "min",
+        "fact_id_max": "max",
+        "response_id_min": "min",
+        "response_id_max": "max",
+    })
+
+def record(engine, summary, hashes, replace=False):
+    """
+    Writes the manifest rows of the loaded years.
+    A full (non incremental) load replaces the whole manifest, like it replaces the facts.
+    """
+    rows = summary.copy()
+    rows["content_hash"] = [hashes[year] for year in rows.index]
+    rows["loaded_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    rows = rows.reset_index()
+
+    if hasattr(engine, "write_table"):
+        # File target (see `parquet_target`), always a full load
+        engine.write_table(rows, TABLE_NAME)
+    else:
+        if not replace and inspect(engine).has_table(TABLE_NAME):
+            with engine.begin() as conn:
+                for year in rows["survey_year"]:
+                    conn.execute(text(f"DELETE FROM {TABLE_NAME} WHERE survey_year = :year"), {"year": int(year)})
+        rows.to_sql(TABLE_NAME, engine, if_exists='replace' if replace else 'append', index=False)
+
+    for row in rows.itertuples():
+        print(f"[manifest] {row.survey_year}: {row.rows} rows, hash {row.content_hash[:12]}")
@@ -2,21 +2,35 @@
 # This script is used to mini "ETL" process for so-survey data per year
 # Resource: https://insights.stackoverflow.com/survey
 # Steps:
-#   1. fetching the .zip files and preform unpacking
+#   1. fetching the .zip files (the CSV is read straight from the archive, no unpacking)
 #   2. pre-processing the data and validating for any invalids
 #   3. loading the data to out provided PostgreSQL DB instance (See README.md for more setup information)
 
 # 3rd parties
+import copy
 import pandas as pd
 
 # Data pipeline internals
 from sys import argv
+from concurrent.futures import ProcessPoolExecutor
 import fetch_data, \
     preprocess_data, \
     load_data, \
+    load_manifest, \
+    parquet_cache, \
+    metrics, \
+    downloader, \
+    indexes, \
+    partitions, \
+    fingerprints, \
+    parquet_target, \
+    checkpoints, \
+    fact_groups, \
     helpers
 
 _SEP = 40 * "*"
+# Options that change the output of a run, a checkpoint is only resumed with the same ones
+_OUTPUT_OPTIONS = ("chunksize", "dedup_columns", "incremental", "dims_snapshot", "hot_columns", "split_facts")
 _AVAIL_YEARS = [
     2013,
     2014,
@@ -39,48 +53,365 @@ def main(args):
     cfgs = helpers.setup()
 
     # Init years list - which we will iterate for the data fetch
-    years, cache = _parse_args(args)
+    years, cache, opts = _parse_args(args)
+
+    # Per stage metrics (+ the optional `--profile` dump) of this run
+    run_id = metrics.new_run_id()
+    profiler = metrics.Profiler(opts["profile"]) if opts["profile"] else None
+    if profiler:
+        profiler.start()
+    try:
+        _run(years, cache, cfgs, opts)
+    finally:
+        if profiler:
+            profiler.stop(run_id)
+        metrics.write_report(run_id)
+
+def _run(years, cache, cfgs, opts):
+    """The ETL steps of `main`"""
+    if opts["output_dir"]:
+        # Star schema written as Parquet files instead of the DB
+        cfgs = parquet_target.url(opts["output_dir"])
+    # survey_facts split in a hot table + cold column groups with `--split-facts` (a single wide table otherwise)
+    facts = fact_groups.FactGroups(opts["hot_columns"] or fact_groups.HOT_COLUMNS) if opts["split_facts"] else None
+    state = load_data.new_load_state(dims_snapshot=opts["dims_snapshot"], append=opts["incremental"],
+                                     upload_workers=opts["upload_workers"], facts=facts)
+    # Where the ids of this run start: (max ResponseId so far, first fact id)
+    offsets = (0, 0)
+    hashes = None
+    # Fingerprints of the loaded responses (a full load replaces the warehouse, so it starts a new store)
+    fingerprint_store = fingerprints.FingerprintStore(columns=opts["dedup_columns"], reset=not opts["incremental"])
+
+    if not cache:
+        # (1) All the archives are downloaded in parallel upfront, then read locally
+        downloader.download_years(years, workers=opts["download_workers"])
+        cache = True
+
+    if opts["incremental"]:
+        years, offsets, hashes = _plan_incremental(years, cache, cfgs, state)
+        if not years:
+            print("\n* nothing to load, all the requested years are up to date")
+            return
+        # The responses of the reloaded years are compared with the other years only
+        fingerprint_store.drop_years(years)
     
-    # Create an empty DataFrame to hold all years' data
-    all_years_data = pd.DataFrame()
-  
-    # Initialize a variable to hold the maximum responseId so far
-    max_responseId = 0
+    # Bulk inserts don't maintain the indexes, they are rebuilt once the load is done
+    load_data.connect(state, cfgs)
+    if not load_data.is_file_target(state):
+        indexes.drop(state["engine"])
+
+    # The inputs of the run are known by now, `--resume` continues the failed attempt with the same ones
+    if hashes is None:
+        hashes = {year: fetch_data.source_checksum(year, cache) for year in years}
+    checkpoint = checkpoints.Checkpoint(_run_key(years, hashes, offsets, cfgs, opts, fingerprint_store),
+                                        resume=opts["resume"])
+    state["checkpoint"] = checkpoint
+
+    if opts["chunksize"]:
+        summary = _stream_years(years, cache, cfgs, opts, state, offsets, fingerprint_store)
+        _record_manifest(state, summary, hashes, opts)
+        fingerprint_store.save()
+        _build_indexes(state)
+        checkpoint.complete()
+        parquet_cache.report()
+        print(f"\n* finished loading so-survey-analytics data to {cfgs}\nTotal # rows: {summary['rows'].sum()}")
+        return
+
+    if opts["workers"]:
+        all_years_data = _process_years_parallel(years, cache, opts["workers"], offsets[0], fingerprint_store, checkpoint)
+    else:
+        all_years_data = _process_years(years, cache, offsets[0], fingerprint_store, checkpoint)
+    # Fact ids (the frame index) continue the ones already in the warehouse
+    all_years_data.index = pd.RangeIndex(offsets[1], offsets[1] + len(all_years_data))
+
+    # (3) Load the processed data (summarized first, `load` renames the columns in place)
+    summary = load_manifest.summarize(all_years_data)
+    load_data.load(all_years_data, cfgs, batch_size=opts["batch_size"], state=state)
+    load_data.write_rollups(state, batch_size=opts["batch_size"])
+    _record_manifest(state, summary, hashes, opts)
+    fingerprint_store.save()
+    _build_indexes(state)
+    _save_dims_snapshot(state, opts)
+    checkpoint.complete()
+    parquet_cache.report()
+
+    print(f"\n* finished loading so-survey-analytics data to {cfgs}\nTotal # rows: {len(all_years_data)}")
+
+def _plan_incremental(years, cache, cfgs, state):
+    """
+    Incremental mode (`--incremental`): keeps only the years missing from the load manifest
+    (or whose source changed since), removes the previous load of the changed ones
+    and returns (years to load, id offsets, source hashes).
+    """
+    engine = load_data.connect(state, cfgs)
+    hashes = {year: fetch_data.source_checksum(year, cache) for year in years}
+
+    to_load, changed, skipped = load_manifest.plan(engine, years, hashes)
+    for year in skipped:
+        print(f"[manifest] {year} is up to date, skipping")
+    load_manifest.delete_years(engine, changed)
+
+    return to_load, load_manifest.next_offsets(engine), hashes
+
+def _run_key(years, hashes, offsets, cfgs, opts, fingerprint_store):
+    """Checkpoint key of everything the output of the run depends on"""
+    return checkpoints.run_key(
+        years=years,
+        hashes=hashes,
+        offsets=offsets,
+        target=cfgs,
+        options={name: opts[name] for name in _OUTPUT_OPTIONS},
+        schema_version=parquet_cache.SCHEMA_VERSION,
+        known_responses=len(fingerprint_store),
+    )
+
+def _record_manifest(state, summary, hashes, opts):
+    if hashes is None:
+        hashes = {year: fetch_data.source_checksum(year, True) for year in summary.index}
+    load_manifest.record(state["engine"], summary, hashes, replace=not opts["incremental"])
+
+def _build_indexes(state):
+    if load_data.is_file_target(state):
+        print(f"\n* files listed in {state['engine'].root}/{parquet_target.MANIFEST_NAME}")
+        return
+    indexes.build(state["engine"])
+
+def _process_years(years, cache, max_responseId=0, fingerprint_store=None, checkpoint=None):
+    """Fetch + preprocess the years one after another"""
+    # The processed years are concatenated once at the end
+    all_years_data = partitions.YearPartitions()
 
     # (1) Fetching data + Unpacking .zip files per year
     for year in years:
         print(f"{_SEP}\nProcessing so-survey data for {year}\n{_SEP}")
-        
-        data = fetch_data.fetch(year, cache)
-        data['survey_year'] = year
 
-        response_pk_colname = 'ResponseId' if year >= 2021 else 'Respondent'
+        processed = _checkpointed_year(checkpoint, year, fingerprint_store)
+        if processed is None:
+            data = fetch_data.fetch(year, cache)
+            data = _prepare_year(data, year, max_responseId)
+
+            # (2) Preprocessing the raw data
+            processed = preprocess_data.process(data, year, fingerprint_store)
+            # The raw frame is not needed anymore
+            del data
+            _checkpoint_year(checkpoint, year, processed, fingerprint_store)
 
-        # Update the responseId to make it globally unique
-        data['ResponseId'] = data[response_pk_colname] + max_responseId
-        if "Respondent" in data.columns:
-            data = data.drop(columns=["Respondent"])
-        
         # Update max_responseId for the next iteration
-        max_responseId = data['ResponseId'].max()
-    
-        # (2) Preprocessing the raw data
-        processed = preprocess_data.process(data, year)
+        max_responseId = _max_response_id(processed, max_responseId)
         
-        # Concatenate the processed data for the year to the all_years_data DataFrame
-        all_years_data = pd.concat([all_years_data, processed], ignore_index=True)
+        all_years_data.add(year, processed)
+        del processed
 
-    # (3) Load the processed data
-    load_data.load(all_years_data, cfgs)
+    return all_years_data.concat()
 
-    print(f"\n* finished loading so-survey-analytics data to {cfgs}\nTotal # rows: {len(all_years_data)}")
+def _fetch_and_process_year(year, cache, fingerprint_store=None):
+    """
+    Process pool worker: fetch + preprocess a single year with a 0 ResponseId offset.
+    Returns the processed year, the fingerprints of its rows, the Parquet cache stats
+    and the stage metrics of this year.
+    """
+    print(f"{_SEP}\nProcessing so-survey data for {year}\n{_SEP}")
+    # Pool workers are reused, count only this year
+    parquet_cache.reset_stats()
+    metrics.reset()
+    data = fetch_data.fetch(year, cache)
+    data = _prepare_year(data, year, 0)
+    # The worker's copy of the store only rejects the responses of the previous runs,
+    # the duplicates across years are removed once all the years are back
+    processed = preprocess_data.process(data, year, fingerprint_store)
+    row_fingerprints = fingerprint_store.added(year) if fingerprint_store is not None else None
+    return processed, row_fingerprints, parquet_cache.stats(), metrics.records()
+
+def _process_years_parallel(years, cache, workers, max_responseId=0, fingerprint_store=None, checkpoint=None):
+    """
+    Fetch + preprocess the years in a process pool (`--workers N`).
+    ResponseIds are offset once all workers are done, in the years order,
+    so the result is identical to `_process_years`.
+    """
+    # Years checkpointed by a previous attempt (`--resume`) are read back instead
+    missing = [year for year in years if checkpoint is None or not checkpoint.has_year(year)]
+    results = {}
+    if missing:
+        with ProcessPoolExecutor(max_workers=min(workers, len(missing))) as executor:
+            results = dict(zip(missing, executor.map(_fetch_and_process_year, missing, [cache] * len(missing),
+                                                     [fingerprint_store] * len(missing))))
+
+    all_years_data = partitions.YearPartitions()
+    for year in years:
+        if year not in results:
+            processed = _checkpointed_year(checkpoint, year, fingerprint_store)
+            max_responseId = _max_response_id(processed, max_responseId)
+            all_years_data.add(year, processed)
+            del processed
+            continue
+
+        processed, row_fingerprints, cache_stats, stage_metrics = results.pop(year)
+        parquet_cache.merge_stats(cache_stats)
+        metrics.merge(stage_metrics)
+
+        if fingerprint_store is not None:
+            keep = fingerprint_store.filter(year, row_fingerprints)
+            if not keep.all():
+                print(f"# duplicates of earlier years ({year}): {(~keep).sum()}")
+                processed = processed[keep]
+
+        # Same offset the serial run would have added before preprocessing
+        processed['ResponseId'] = processed['ResponseId'] + max_responseId
+        max_responseId = _max_response_id(processed, max_responseId)
+        _checkpoint_year(checkpoint, year, processed, fingerprint_store)
+
+        all_years_data.add(year, processed)
+        del processed
+
+    return all_years_data.concat()
+
+def _checkpointed_year(checkpoint, year, fingerprint_store):
+    """The preprocessed year of a previous attempt (`--resume`), None when it has to be processed"""
+    if checkpoint is None:
+        return None
+    processed, row_fingerprints = checkpoint.load_year(year)
+    if processed is not None and fingerprint_store is not None and row_fingerprints is not None:
+        fingerprint_store.restore(year, row_fingerprints)
+    return processed
+
+def _checkpoint_year(checkpoint, year, processed, fingerprint_store):
+    if checkpoint is not None:
+        checkpoint.save_year(year, processed, fingerprint_store.added(year) if fingerprint_store is not None else None)
+
+def _max_response_id(processed, default):
+    """Max ResponseId of the kept rows, the next year continues from it (like `load_manifest.next_offsets`)"""
+    return processed['ResponseId'].max() if len(processed) > 0 else default
+
+def _prepare_year(data, year, max_responseId):
+    """Tags the raw data with its survey year and a globally unique ResponseId"""
+    data['survey_year'] = year
+
+    response_pk_colname = 'ResponseId' if year >= 2021 else 'Respondent'
+
+    # Update the responseId to make it globally unique
+    data['ResponseId'] = data[response_pk_colname] + max_responseId
+    if "Respondent" in data.columns:
+        del data["Respondent"]
+    return data
+
+def _stream_years(years, cache, cfgs, opts, state, offsets=(0, 0), fingerprint_store=None):
+    """
+    Streaming mode (`--chunksize N`): every year is read, preprocessed and loaded
+    chunk by chunk, so peak memory is bounded by the chunk size.
+    Returns the per year summary of the loaded rows (see `load_manifest.summarize`).
+    """
+    chunksize = opts["chunksize"]
+
+    # The survey_facts table is created by the first chunk, so we need the final columns (and their dtypes)
+    # of all years upfront: every chunk of a year is parsed with the dtypes of the whole year (see `fetch_data`),
+    # so the concat of a processed row of every year has the columns and dtypes of the non streaming concat
+    samples = partitions.YearPartitions()
+    for year in years:
+        sample = fetch_data.fetch(year, cache, nrows=1)
+        samples.add(year, preprocess_data.process(_prepare_year(sample, year, 0), year))
+    sample = samples.concat()
+    columns = list(sample.columns)
+    dtypes = sample.dtypes.to_dict()
+    if state["facts"] is not None:
+        _observe_facts(years, chunksize, columns, dtypes, state, fingerprint_store)
+
+    max_responseId, first_fact_id = offsets
+    total_rows = 0
+    summaries = []
+
+    for year in years:
+        print(f"{_SEP}\nStreaming so-survey data for {year} (chunksize={chunksize})\n{_SEP}")
+        year_offset = max_responseId
+
+        # Files are already local after the columns probe above
+        for chunk in fetch_data.fetch(year, True, chunksize=chunksize):
+            chunk = _prepare_year(chunk, year, year_offset)
+
+            processed = preprocess_data.process(chunk, year, fingerprint_store)
+            max_responseId = max(max_responseId, _max_response_id(processed, max_responseId))
+            processed = _align_chunk(processed, columns, dtypes)
+
+            # Keep the fact ids globally unique like the concat of the non streaming mode
+            start = first_fact_id + total_rows
+            processed.index = pd.RangeIndex(start, start + len(processed))
+            total_rows += len(processed)
+
+            summaries.append(load_manifest.summarize(processed))
+            load_data.load(processed, cfgs, batch_size=opts["batch_size"], state=state)
+
+    load_data.write_rollups(state, batch_size=opts["batch_size"])
+    _save_dims_snapshot(state, opts)
+    return load_manifest.combine(summaries)
+
+def _observe_facts(years, chunksize, columns, dtypes, state, fingerprint_store):
+    """
+    `--split-facts` in streaming mode: the first chunk creates the facts tables, so the cold group of every
+    column is counted upfront on all the rows the load keeps (a first pass over the chunks, deduplicated
+    against a copy of the fingerprints), the same rows the non streaming mode counts.
+    """
+    print(f"{_SEP}\nCounting the survey_facts column stats (chunksize={chunksize})\n{_SEP}")
+    store = copy.deepcopy(fingerprint_store)
+    for year in years:
+        for chunk in fetch_data.fetch(year, True, chunksize=chunksize):
+            processed = preprocess_data.process(_prepare_year(chunk, year, 0), year, store)
+            load_data.observe_facts(_align_chunk(processed, columns, dtypes), state)
+
+def _align_chunk(processed, columns, dtypes):
+    """
+    Reindexes a chunk to the columns of all the years, and casts the columns whose dtype differs from the one
+    of all the years when either is numeric (e.g. an int year of a float column, a column missing from the year):
+    the table created by the first chunk gets the types of the non streaming mode and accepts the later chunks.
+    """
+    processed = processed.reindex(columns=columns)
+    for col in processed.columns:
+        dtype, chunk_dtype = dtypes[col], processed[col].dtype
+        if chunk_dtype == dtype:
+            continue
+        if pd.api.types.is_numeric_dtype(dtype):
+            processed[col] = processed[col].astype(dtype)
+        elif pd.api.types.is_numeric_dtype(chunk_dtype):
+            processed[col] = processed[col].astype(object)
+    return processed
+
+def _save_dims_snapshot(state, opts):
+    if opts["dims_snapshot"] and state["registry"] is not None:
+        state["registry"].save_snapshot()
+
+def _pop_profile(args):
+    """Pops `--profile [cprofile|pyinstrument]` out of the args list (the profiler, None when not passed)"""
+    if "--profile" not in args:
+        return None
+    idx = args.index("--profile")
+    kind = "cprofile"
+    if idx + 1 < len(args) and args[idx + 1] in ("cprofile", "pyinstrument"):
+        kind = args.pop(idx + 1)
+    del args[idx]
+    return kind
 
 def _parse_args(args):
     """Just parsing args passed from shell"""
+    args = list(args)
+    opts = {
+        "batch_size": helpers.pop_option(args, "--batch-size"),
+        "chunksize": helpers.pop_option(args, "--chunksize"),
+        "workers": helpers.pop_option(args, "--workers"),
+        "upload_workers": helpers.pop_option(args, "--upload-workers", default=1),
+        "download_workers": helpers.pop_option(args, "--download-workers", default=downloader.DEFAULT_WORKERS),
+        "dims_snapshot": helpers.pop_option(args, "--dims-snapshot", cast=str),
+        "output_dir": helpers.pop_option(args, "--output-dir", cast=str),
+        "dedup_columns": helpers.pop_option(args, "--dedup-columns", cast=lambda value: value.split(",")),
+        "hot_columns": helpers.pop_option(args, "--hot-columns", cast=lambda value: value.split(",")),
+        "split_facts": "--split-facts" in args,
+        "incremental": "--incremental" in args,
+        "resume": "--resume" in args,
+        "profile": _pop_profile(args),
+    }
+    if opts["chunksize"] and opts["workers"]:
+        raise Exception("'--workers' is not supported together with the '--chunksize' streaming mode")
     use_cache = "--cache" in args
-    args = [arg for arg in args if arg != '--cache']
+    args = [arg for arg in args if arg not in ('--cache', '--incremental', '--resume', '--split-facts')]
     if len(args) == 0:
-        return (_AVAIL_YEARS, use_cache)
+        return (_AVAIL_YEARS, use_cache, opts)
     else:
         for arg in args:
             if int(arg) not in _AVAIL_YEARS:
@@ -88,7 +419,7 @@ def _parse_args(args):
                     "survey year '{0}' is not available to data pipeline.\nif you think the year '{0}' should exists please open a new issue: https://github.com/MadBull1995/so-survey-analytics/issues/new"
                     .format(arg)
                 )
-        return ([int(y) for y in args], use_cache)
+        return ([int(y) for y in args], use_cache, opts)
 
 if __name__ == '__main__':
     args = argv[1:]
@@ -0,0 +1,191 @@
+# Per stage metrics of the ETL run
+# Every instrumented call (fetch, preprocess, each `process_*` of load_data, every table upload)
+# records: wall time, CPU time, peak RSS delta, rows in/out and bytes written.
+# At the end of the run the records are written as JSON + CSV under `data/metrics/`
+# so the nightly runs can be compared, and `--profile` adds a cProfile/pyinstrument dump.
+
+# 3rd parties
+import cProfile
+import csv
+import functools
+import inspect
+import io
+import json
+import os
+import pstats
+import sys
+import time
+from datetime import datetime
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_DIR = "data/metrics"
+
+_FIELDS = ["stage", "key", "wall_s", "cpu_s", "peak_rss_delta_mb", "rows_in", "rows_out", "bytes_written"]
+_records = []
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+def frame_rows(value):
+    """# rows of a DataFrame, or of all the DataFrames inside a tuple/list/dict (None for anything else)"""
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (tuple, list)):
+        rows = [frame_rows(v) for v in value]
+        rows = [r for r in rows if r is not None]
+        return sum(rows) if rows else None
+    return None
+
+def link_rows(result):
+    """# rows of the link table(s) of a `dimensions.build` result: (dim, links, df)"""
+    return frame_rows(result[1])
+
+def written_bytes(arguments, result):
+    """
+    Bytes of the written files when the writer reports them (Parquet target),
+    else the in memory size of the uploaded frame (`df` argument), a proxy of the bytes sent to the DB
+    """
+    if isinstance(result, dict) and result.get("bytes") is not None:
+        return int(result["bytes"])
+    df = arguments.get("df")
+    return int(df.memory_usage(deep=True).sum()) if isinstance(df, pd.DataFrame) else None
+
+def instrument(stage, key=None, rows_out=frame_rows, bytes_written=None):
+    """
+    Records the metrics of every call of the decorated function.
+
+    Parameters:
+    - stage (str): Stage name in the report (e.g. "load.upload").
+    - key (str): Name of the argument labeling the call (e.g. "table_name", "year").
+    - rows_out: result -> # rows out (the rows in are the first DataFrame argument).
+    - bytes_written: (bound arguments, result) -> # bytes written by the call.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind_partial(*args, **kwargs)
+            frames = [v for v in bound.arguments.values() if isinstance(v, pd.DataFrame)]
+
+            rss_before = _peak_rss_mb()
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            result = func(*args, **kwargs)
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            rss_after = _peak_rss_mb()
+
+            _records.append({
+                "stage": stage,
+                "key": None if key is None else str(bound.arguments.get(key)),
+                "wall_s": round(wall, 6),
+                "cpu_s": round(cpu, 6),
+                "peak_rss_delta_mb": None if rss_before is None else round(rss_after - rss_before, 3),
+                "rows_in": len(frames[0]) if frames else None,
+                "rows_out": rows_out(result) if rows_out is not None else None,
+                "bytes_written": bytes_written(bound.arguments, result) if bytes_written is not None else None,
+            })
+            return result
+
+        return wrapper
+    return decorator
+
+def records():
+    return list(_records)
+
+def reset():
+    _records.clear()
+
+def merge(other_records):
+    """Adds the records of another process (e.g. a `--workers` pool worker)"""
+    _records.extend(other_records)
+
+def summary() -> pd.DataFrame:
+    """Totals per stage"""
+    if not _records:
+        return pd.DataFrame(columns=_FIELDS)
+    df = pd.DataFrame(_records, columns=_FIELDS)
+    # Metrics a stage doesn't measure stay empty instead of 0
+    total = lambda values: values.sum(min_count=1)
+    return df.groupby("stage", sort=False).agg(
+        calls=("wall_s", "size"),
+        wall_s=("wall_s", "sum"),
+        cpu_s=("cpu_s", "sum"),
+        peak_rss_delta_mb=("peak_rss_delta_mb", total),
+        rows_in=("rows_in", total),
+        rows_out=("rows_out", total),
+        bytes_written=("bytes_written", total),
+    ).sort_values("wall_s", ascending=False)
+
+def write_report(run_id, output_dir=METRICS_DIR):
+    """Writes `<run_id>.json` (records + per stage totals) and `<run_id>.csv` (records), returns the JSON path"""
+    os.makedirs(output_dir, exist_ok=True)
+    json_path = os.path.join(output_dir, f"{run_id}.json")
+    csv_path = os.path.join(output_dir, f"{run_id}.csv")
+
+    totals = summary()
+    with open(json_path, "w") as f:
+        json.dump({
+            "run_id": run_id,
+            "records": _records,
+            "stages": json.loads(totals.reset_index().to_json(orient="records")),
+        }, f, indent=2)
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=_FIELDS)
+        writer.writeheader()
+        writer.writerows(_records)
+
+    print(f"\n[metrics] per stage totals:\n{totals.to_string()}")
+    print(f"[metrics] report written to {json_path} / {csv_path}")
+    return json_path
+
+def new_run_id():
+    return datetime.now().strftime("run-%Y%m%dT%H%M%S")
+
+class Profiler:
+    """`--profile` dump of the whole run: cProfile (`.prof`, pstats format) or pyinstrument (`.html`)"""
+
+    def __init__(self, kind="cprofile"):
+        if kind == "pyinstrument":
+            try:
+                from pyinstrument import Profiler as _Pyinstrument
+            except ImportError:
+                print("[metrics] pyinstrument is not installed, profiling with cProfile")
+                kind = "cprofile"
+        self.kind = kind
+        self._profiler = _Pyinstrument() if kind == "pyinstrument" else cProfile.Profile()
+
+    def start(self):
+        if self.kind == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self, run_id, output_dir=METRICS_DIR):
+        os.makedirs(output_dir, exist_ok=True)
+        if self.kind == "pyinstrument":
+            self._profiler.stop()
+            path = os.path.join(output_dir, f"{run_id}.html")
+            with open(path, "w") as f:
+                f.write(self._profiler.output_html())
+        else:
+            self._profiler.disable()
+            path = os.path.join(output_dir, f"{run_id}.prof")
+            self._profiler.dump_stats(path)
+            top = io.StringIO()
+            pstats.Stats(self._profiler, stream=top).sort_stats("cumulative").print_stats(20)
+            print(top.getvalue())
+        print(f"[metrics] profile written to {path}")
+        return path
@@ -0,0 +1,134 @@
+# Vectorized engine for the multi-select (";"-separated) survey answers
+# Every multi-select cell such as "Python;SQL;Rust" ends up as one link row per item.
+# Instead of walking each respondent with iterrows, we:
+#   1. factorize the raw cells (answers repeat a lot, so there are few distinct cells)
+#   2. split + strip only those distinct cells
+#   3. dictionary-encode the items and expand back to rows with NumPy offsets
+
+# 3rd parties
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+
+class Exploded(NamedTuple):
+    """
+    The exploded form of a multi-select column.
+
+    - index (np.ndarray): The fact index (row label) of every item.
+    - codes (np.ndarray): Position of every item inside `categories`.
+    - categories (pd.Index): Distinct items, in order of first appearance.
+    """
+    index: np.ndarray
+    codes: np.ndarray
+    categories: pd.Index
+
+def explode(series: pd.Series, sep=';', strip=True) -> Exploded:
+    """
+    Split a multi-select column into (row, item) pairs.
+
+    Parameters:
+    - series (pd.Series): The raw column, NaN cells are skipped.
+    - sep (str): Separator between the items of a cell.
+    - strip (bool): Strip whitespace around every item.
+    """
+    cells = series.dropna()
+    cell_codes, distinct_cells = pd.factorize(cells)
+
+    # Split only the distinct cells
+    parts = [str(cell).split(sep) for cell in distinct_cells]
+    if strip:
+        parts = [[item.strip() for item in items] for items in parts]
+
+    lengths = np.fromiter((len(items) for items in parts), dtype=np.int64, count=len(parts))
+    flat_items = np.array([item for items in parts for item in items], dtype=object)
+    item_codes, categories = pd.factorize(flat_items)
+
+    # Offsets of every distinct cell inside `flat_items`
+    starts = np.zeros(len(parts), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+
+    # Expand back to one entry per (row, item)
+    row_lengths = lengths[cell_codes]
+    total = int(row_lengths.sum())
+    rows = np.repeat(np.arange(len(cells)), row_lengths)
+    row_starts = np.cumsum(row_lengths) - row_lengths
+    within = np.arange(total) - np.repeat(row_starts, row_lengths)
+    codes = item_codes[np.repeat(starts[cell_codes], row_lengths) + within]
+
+    return Exploded(np.asarray(cells.index)[rows], codes, pd.Index(categories, dtype=object))
+
+def encode(series: pd.Series) -> Exploded:
+    """A single answer column in the `explode` form (one item per non missing cell)"""
+    codes, categories = pd.factorize(series)
+    valid = codes >= 0
+    return Exploded(np.asarray(series.index)[valid], codes[valid], pd.Index(np.asarray(categories, dtype=object), dtype=object))
+
+def normalize(exploded: Exploded, func) -> Exploded:
+    """Applies `func` once per distinct item, the items normalized to the same value are merged"""
+    normalized = np.array([func(item) for item in exploded.categories], dtype=object)
+    item_codes, categories = pd.factorize(normalized)
+    return Exploded(exploded.index, item_codes[exploded.codes], pd.Index(categories, dtype=object))
+
+def union_categories(*exploded) -> pd.Index:
+    """Distinct items over several exploded columns, in order of first appearance"""
+    if len(exploded) == 0:
+        return pd.Index([], dtype=object)
+    return pd.Index(pd.unique(np.concatenate([e.categories.to_numpy(dtype=object) for e in exploded])), dtype=object)
+
+def build_dim(categories, col_name, id_col=None, existing_dim_df=None, start=1):
+    """
+    Create or extend a dimension table with the given categories.
+
+    Returns the full dimension table (existing rows first) and the new rows only.
+    New ids continue from the existing max id, otherwise from `start`.
+    """
+    id_col = id_col or f"{col_name}_id"
+    categories = pd.Index(categories, dtype=object)
+
+    if existing_dim_df is not None and not existing_dim_df.empty:
+        new_categories = categories[~categories.isin(existing_dim_df[col_name])]
+        next_id = int(existing_dim_df[id_col].max()) + 1
+    else:
+        existing_dim_df = None
+        new_categories = categories
+        next_id = start
+
+    new_dim_df = pd.DataFrame({col_name: new_categories.to_numpy(dtype=object)})
+    new_dim_df[id_col] = np.arange(next_id, next_id + len(new_dim_df), dtype=np.int64)
+
+    if existing_dim_df is None:
+        return new_dim_df, new_dim_df
+    if len(new_dim_df) == 0:
+        return existing_dim_df, new_dim_df
+    dim_df = pd.concat([existing_dim_df, new_dim_df]).reset_index(drop=True)
+    return dim_df, new_dim_df
+
+def build_link(exploded: Exploded, dim_df, col_name, id_col=None, fact_col='fact_id', link_id_col=None, drop_unknown=False):
+    """
+    Create a link table (fact_col, id) out of an exploded column.
+
+    Parameters:
+    - exploded (Exploded): Output of `explode`.
+    - dim_df (pd.DataFrame): Dimension table holding `col_name` and `id_col`.
+    - fact_col (str): Name of the fact key column in the link table.
+    - link_id_col (str): Name of the id column in the link table (defaults to `id_col`).
+    - drop_unknown (bool): Skip items missing from the dimension table instead of raising.
+    """
+    id_col = id_col or f"{col_name}_id"
+    link_id_col = link_id_col or id_col
+
+    # Lookup is done once per distinct item, then broadcast with the codes
+    positions = pd.Index(dim_df[col_name]).get_indexer(exploded.categories)
+    ids_per_category = dim_df[id_col].to_numpy()[positions]
+    missing = positions == -1
+
+    codes = exploded.codes
+    index = exploded.index
+    if missing.any():
+        if not drop_unknown:
+            raise KeyError(f"Items missing from '{col_name}' dimension: {list(exploded.categories[missing][:5])}")
+        keep = ~missing[codes]
+        codes = codes[keep]
+        index = index[keep]
+
+    return pd.DataFrame({fact_col: index, link_id_col: ids_per_category[codes]})
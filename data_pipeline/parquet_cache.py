@@ -0,0 +1,137 @@
+# Columnar (Parquet) cache of the parsed survey years
+# Parsing the wide raw CSVs takes many seconds per year, so after the first parse
+# every year is stored as Parquet (keeping the inferred dtypes) under `data/parquet/`.
+# A cached year is valid as long as:
+#   - the source CSV did not change (size + mtime, or the same sha256 if those were touched)
+#   - the pipeline SCHEMA_VERSION did not change (bump it whenever the parsing changes)
+
+# 3rd parties
+import hashlib
+import json
+import os
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401 (pandas parquet engine)
+    _HAS_ARROW = True
+except ImportError:
+    _HAS_ARROW = False
+
+SCHEMA_VERSION = 5
+
+_CACHE_DIR = "data/parquet"
+_HASH_BLOCK_SIZE = 1 << 20
+
+_stats = {"hits": 0, "misses": 0}
+
+def _paths(year):
+    base = os.path.join(_CACHE_DIR, f"survey-{year}")
+    return f"{base}.parquet", f"{base}.json"
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _source_stat(source_path):
+    stat = os.stat(source_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def _is_valid(meta, source_path, meta_path):
+    if meta.get("schema_version") != SCHEMA_VERSION:
+        return False
+
+    stat = _source_stat(source_path)
+    if stat["size"] == meta["size"] and stat["mtime_ns"] == meta["mtime_ns"]:
+        return True
+
+    # Size/mtime changed (e.g. re-downloaded), fall back to the content hash
+    if stat["size"] == meta["size"] and _sha256(source_path) == meta["sha256"]:
+        meta.update(stat)
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        return True
+    return False
+
+def _miss(year, reason):
+    _stats["misses"] += 1
+    print(f"[parquet cache] miss: {year} ({reason})")
+    return None
+
+def load(year, source_path, columns=None):
+    """
+    Load the cached year, None if not cached (or the cache is invalid).
+
+    Parameters:
+    - year (int): The survey year.
+    - source_path (str): The raw CSV the cache was built from.
+    - columns (list): Read only these columns (all when None).
+    """
+    if not _HAS_ARROW:
+        return None
+    if not os.path.exists(source_path):
+        return None
+
+    parquet_path, meta_path = _paths(year)
+    if not (os.path.exists(parquet_path) and os.path.exists(meta_path)):
+        return _miss(year, "not cached")
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if not _is_valid(meta, source_path, meta_path):
+        return _miss(year, "stale")
+
+    df = pd.read_parquet(parquet_path, columns=columns)
+    _stats["hits"] += 1
+    print(f"[parquet cache] hit: {year} ({parquet_path})")
+    return df
+
+def _arrow_safe(df):
+    """Mixed type text columns (e.g. '5' and 5 in the same column) can't be stored by Arrow, store them as str"""
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def store(year, source_path, df):
+    """Cache the parsed year (skipped when pyarrow is not installed)"""
+    if not _HAS_ARROW:
+        return
+
+    os.makedirs(_CACHE_DIR, exist_ok=True)
+    parquet_path, meta_path = _paths(year)
+
+    df = _arrow_safe(df)
+    df.to_parquet(parquet_path, index=False)
+
+    meta = {
+        "year": year,
+        "source": source_path,
+        "sha256": _sha256(source_path),
+        "schema_version": SCHEMA_VERSION,
+        **_source_stat(source_path),
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    print(f"[parquet cache] stored: {year} ({parquet_path})")
+
+def reset_stats():
+    _stats.update(hits=0, misses=0)
+
+def merge_stats(stats):
+    """Adds the hits/misses counted in another process (e.g. a `--workers` pool worker)"""
+    _stats["hits"] += stats["hits"]
+    _stats["misses"] += stats["misses"]
+
+def stats():
+    return dict(_stats)
+
+def report():
+    """Prints (and returns) the cache hits/misses of this run"""
+    if not _HAS_ARROW:
+        print("[parquet cache] disabled (pyarrow is not installed)")
+    else:
+        print(f"[parquet cache] hits: {_stats['hits']}, misses: {_stats['misses']}")
+    return stats()
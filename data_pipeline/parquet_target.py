@@ -0,0 +1,223 @@
+# Parquet output target of `load_data.load` (the star schema as files instead of a DB)
+# `main.py --output-dir PATH` (or `DATABASE_URL=parquet:///abs/path`) writes every table under PATH:
+#   - one directory per table, same names as in the DB (`language_dim/`, `language_have_worked_with_link/`, ...)
+#     holding zstd compressed Parquet files (`part-00000.parquet`, every appended chunk adds a part)
+#   - survey_facts (and its cold tables) is partitioned by year, hive style: `survey_facts/survey_year=2023/part-00000.parquet`
+#   - frames are written `batch_size` rows at a time (one row group each), never converted in one piece
+#   - every table write is staged and moved in place once complete (a failed table leaves the previous files)
+#   - `_manifest.json` lists the files of every table (rows, bytes, partition)
+# The directory is read as is, e.g. `pd.read_parquet("PATH/survey_facts")` or in DuckDB:
+#   SELECT * FROM read_parquet('PATH/survey_facts/*/*.parquet', hive_partitioning = true)
+
+# 3rd parties
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    _HAS_ARROW = True
+except ImportError:
+    _HAS_ARROW = False
+
+# Internals
+import bulk_write
+import fact_groups
+
+URL_PREFIX = "parquet://"
+MANIFEST_NAME = "_manifest.json"
+COMPRESSION = "zstd"
+# Tables written as one directory per value of the column (the column itself is in the directory name)
+PARTITION_COLUMNS = {fact_groups.table_name(group): "survey_year" for group in (None, *fact_groups.COLD_GROUPS)}
+
+_PART_PATTERN = "part-*.parquet"
+_STAGED_SUFFIX = ".staged"
+
+def url(path):
+    """The `load_data.load` target url of an output directory"""
+    return f"{URL_PREFIX}{os.path.abspath(path)}"
+
+def is_parquet_url(target_url):
+    return isinstance(target_url, str) and target_url.startswith(URL_PREFIX)
+
+def _arrow_table(df, schema=None):
+    """Arrow table of a batch, cast to the `schema` of the table when it already has one"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if schema is not None:
+        if table.schema.names != schema.names:
+            raise Exception(f"columns {table.schema.names} don't match the written ones {schema.names}")
+        return table.cast(schema)
+    # Columns without any value yet are typed as text (like the DB target does for empty columns)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_null(field.type):
+            table = table.set_column(i, field.with_type(pa.string()), table.column(i).cast(pa.string()))
+    return table
+
+class ParquetTarget:
+    """Output directory of the star schema (stands for the engine in `load_data.load`)"""
+
+    def __init__(self, root, compression=COMPRESSION):
+        if not _HAS_ARROW:
+            raise Exception("the Parquet output target requires pyarrow")
+        self.root = root
+        self.compression = compression
+        self._lock = threading.Lock()
+        # Arrow schema of every table written in this run, the later appends (chunks) are cast to it
+        self._schemas = {}
+        os.makedirs(root, exist_ok=True)
+        self._manifest = self._read_manifest()
+
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def _read_manifest(self):
+        if not os.path.exists(self._manifest_path()):
+            return {"format": "parquet", "compression": self.compression, "tables": {}}
+        with open(self._manifest_path()) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        self._manifest["updated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        tmp_path = f"{self._manifest_path()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._manifest_path())
+
+    def manifest(self) -> dict:
+        return self._manifest
+
+    def read_dims(self) -> dict:
+        """The `*_dim` tables of the previous runs (table name -> frame), their ids are continued"""
+        dims = {}
+        for table_name, entry in sorted(self._manifest["tables"].items()):
+            if table_name.endswith("_dim") and entry["files"]:
+                # Only the committed files (not the staged ones of a failed run)
+                dims[table_name] = pd.concat(
+                    [pd.read_parquet(os.path.join(self.root, f["path"])) for f in entry["files"]], ignore_index=True)
+        return dims
+
+    def begin(self):
+        """A table write (the transaction of the upload jobs, see `upload_scheduler`)"""
+        return Transaction(self)
+
+    def write_table(self, df, table_name, if_exists='replace', batch_size=None):
+        """Writes a table in its own transaction"""
+        with self.begin() as transaction:
+            return transaction.write(df, table_name, if_exists=if_exists, batch_size=batch_size)
+
+    def _commit(self, table_name, staged, replace):
+        """Moves the staged files of a table in place and lists them in the manifest"""
+        with self._lock:
+            table_dir = os.path.join(self.root, table_name)
+            entry = self._manifest["tables"].get(table_name)
+            if replace or entry is None:
+                for path in glob.glob(os.path.join(table_dir, "**", _PART_PATTERN), recursive=True):
+                    os.remove(path)
+                entry = {"partitioned_by": PARTITION_COLUMNS.get(table_name), "rows": 0, "files": []}
+
+            for staged_path, partition, rows in staged:
+                directory = os.path.dirname(staged_path)
+                part = len(glob.glob(os.path.join(directory, _PART_PATTERN)))
+                final_path = os.path.join(directory, f"part-{part:05d}.parquet")
+                os.replace(staged_path, final_path)
+                entry["files"].append({
+                    "path": os.path.relpath(final_path, self.root),
+                    "partition": partition,
+                    "rows": rows,
+                    "bytes": os.path.getsize(final_path),
+                })
+            entry["rows"] = sum(f["rows"] for f in entry["files"])
+            self._manifest["tables"][table_name] = entry
+            self._write_manifest()
+
+class Transaction:
+    """The files written for the tables of a `ParquetTarget.begin()` block, moved in place on success"""
+
+    def __init__(self, target):
+        self.target = target
+        self._staged = {}
+        self._replace = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            for staged in self._staged.values():
+                for staged_path, _, _ in staged:
+                    if os.path.exists(staged_path):
+                        os.remove(staged_path)
+            return False
+        for table_name, staged in self._staged.items():
+            self.target._commit(table_name, staged, table_name in self._replace)
+        return False
+
+    def write(self, df, table_name, if_exists='replace', batch_size=None):
+        """
+        Stages a table (or the rows appended to it), `batch_size` rows per row group.
+
+        Returns a dict with the write stats of the table (rows, seconds, rows_per_sec, bytes).
+        """
+        batch_size = batch_size or bulk_write.DEFAULT_BATCH_SIZE
+        start = time.perf_counter()
+        if if_exists == 'replace':
+            self._replace.add(table_name)
+        staged = self._staged.setdefault(table_name, [])
+        first_file = len(staged)
+        table_dir = os.path.join(self.target.root, table_name)
+
+        partition_col = PARTITION_COLUMNS.get(table_name)
+        if partition_col in df.columns:
+            # One file per partition value, the value is only kept in the directory name
+            values = df[partition_col].to_numpy()
+            for value in pd.unique(values[pd.notna(values)]):
+                positions = (values == value).nonzero()[0]
+                directory = os.path.join(table_dir, f"{partition_col}={int(value)}")
+                staged.append(self._write_file(df, positions, table_name, directory, batch_size,
+                                               {partition_col: int(value)}))
+        else:
+            staged.append(self._write_file(df, None, table_name, table_dir, batch_size, {}))
+
+        elapsed = time.perf_counter() - start
+        rows = len(df)
+        written = sum(os.path.getsize(path) for path, _, _ in staged[first_file:])
+        rows_per_sec = rows / elapsed if elapsed > 0 else float("inf")
+        print(f">  wrote {rows} rows to {table_name} in {elapsed:.2f}s ({rows_per_sec:,.0f} rows/s, "
+              f"parquet {self.target.compression}, {written / 2**20:.1f} MB, batch={batch_size})")
+        return {"table": table_name, "rows": rows, "seconds": elapsed, "rows_per_sec": rows_per_sec, "bytes": written}
+
+    def _write_file(self, df, positions, table_name, directory, batch_size, partition):
+        """Streams the rows (all of them, or the `positions`) to a staged file, returns (path, partition, rows)"""
+        os.makedirs(directory, exist_ok=True)
+        staged_path = os.path.join(directory, f"{uuid.uuid4().hex}{_STAGED_SUFFIX}")
+        rows = len(df) if positions is None else len(positions)
+
+        writer = None
+        try:
+            for batch_start in range(0, max(rows, 1), batch_size):
+                if positions is None:
+                    batch = df.iloc[batch_start:batch_start + batch_size]
+                else:
+                    batch = df.take(positions[batch_start:batch_start + batch_size])
+                    # The partition value is only kept in the directory name
+                    batch = batch.drop(columns=list(partition))
+                with self.target._lock:
+                    schema = self.target._schemas.get(table_name)
+                table = _arrow_table(batch, schema)
+                if schema is None:
+                    with self.target._lock:
+                        schema = self.target._schemas.setdefault(table_name, table.schema)
+                    table = table.cast(schema)
+                if writer is None:
+                    writer = pq.ParquetWriter(staged_path, schema, compression=self.target.compression)
+                writer.write_table(table, row_group_size=batch_size)
+        finally:
+            if writer is not None:
+                writer.close()
+        return staged_path, partition, rows
@@ -0,0 +1,63 @@
+# Year partitioned dataset
+# The processed years are collected as they come (no concat per year, which recopies all the previous
+# years every time) and either concatenated once, with their schemas aligned in the same pass,
+# or handed over one partition at a time.
+
+# 3rd parties
+import numpy as np
+import pandas as pd
+
+# Data pipeline internals
+import preprocess_data
+
+class YearPartitions:
+    """Processed survey frames by year (in the order they were added)"""
+
+    def __init__(self):
+        self._frames = {}
+
+    def add(self, year, frame):
+        if year in self._frames:
+            raise Exception(f"survey year {year} was already added")
+        self._frames[year] = frame
+
+    @property
+    def years(self):
+        return list(self._frames)
+
+    def __len__(self):
+        return sum(len(frame) for frame in self._frames.values())
+
+    def drain(self):
+        """Yields (year, frame) and releases every partition as soon as it's handed over"""
+        while self._frames:
+            year = next(iter(self._frames))
+            yield year, self._frames.pop(year)
+
+    def concat(self) -> pd.DataFrame:
+        """
+        All the years in one frame (categories unioned, columns aligned) with a single concat per column.
+        Every column is released from the partitions once it's concatenated, so the peak stays around the data
+        size + the numeric columns (instead of twice the data). The frame is built once out of the columns
+        (no insertion per column, which fragments the frame).
+        """
+        frames = [frame for _, frame in self.drain() if len(frame.columns) > 0]
+        if not frames:
+            return pd.DataFrame()
+        preprocess_data.align_categories(frames)
+
+        # Same column order as pd.concat: the first year's columns, then the new ones of the next years
+        columns = list(dict.fromkeys(col for frame in frames for col in frame.columns))
+        data = {}
+        for col in columns:
+            # Years without the column are concatenated as empty frames (all missing, like in a full concat)
+            pieces = [frame.pop(col).to_frame() if col in frame.columns else frame.iloc[:, :0] for frame in frames]
+            data[col] = pd.concat(pieces, ignore_index=True)[col]
+            del pieces
+
+        # numpy columns are consolidated in one block per dtype (a copy of those only), the extension
+        # columns (category, str) are a block each anyway and are used as they are
+        numpy_columns = [col for col in columns if isinstance(data[col].dtype, np.dtype)]
+        numeric = pd.DataFrame({col: data.pop(col) for col in numpy_columns})
+        extension = pd.DataFrame(data, copy=False)
+        return pd.concat([numeric, extension], axis=1)[columns]
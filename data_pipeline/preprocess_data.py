@@ -1,25 +1,30 @@
+import numpy as np
 import pandas as pd
 
-def normalize_age(age):
-    try:
-        age = float(age)
-    except ValueError:
-        return age
-    
-    if age < 18:
-        return 'Under 18 years old'
-    elif 18 <= age <= 24:
-        return '18-24 years old'
-    elif 25 <= age <= 34:
-        return '25-34 years old'
-    elif 35 <= age <= 44:
-        return '35-44 years old'
-    elif 45 <= age <= 54:
-        return '45-54 years old'
-    elif 55 <= age <= 64:
-        return '55-64 years old'
-    else:
-        return '65 years or older'
+# Data pipeline internals
+import transforms
+import metrics
+import fingerprints
+
+_AGE_BINS = [-np.inf, 18, 25, 35, 45, 55, 65, np.inf]
+_AGE_LABELS = [
+    'Under 18 years old',
+    '18-24 years old',
+    '25-34 years old',
+    '35-44 years old',
+    '45-54 years old',
+    '55-64 years old',
+    '65 years or older',
+]
+
+def normalize_age(ages: pd.Series) -> pd.Series:
+    """
+    Bin numeric ages into the survey age groups, text answers (e.g. '25-34 years old') are kept as is.
+    Vectorized, meant to run on the distinct answers through `transforms.map_unique`.
+    """
+    numeric = pd.to_numeric(ages, errors='coerce')
+    binned = pd.cut(numeric, bins=_AGE_BINS, labels=_AGE_LABELS, right=False).astype(object)
+    return binned.where(numeric.notna(), ages)
 
 def handle_missing_values(df, year) -> pd.DataFrame:
     """
@@ -28,33 +33,144 @@ def handle_missing_values(df, year) -> pd.DataFrame:
     """
 
     if year <= 2017:
-        df['EmploymentStatus'].fillna('Unknown', inplace=True)
-        df['Employment'] = df['EmploymentStatus']
-        df = df.drop(columns=['EmploymentStatus'])
+        # Renamed in place (no copy of the whole frame)
+        df['Employment'] = df.pop('EmploymentStatus').fillna('Unknown')
     else:
-        df['Employment'].fillna('Unknown', inplace=True)
-        df['Age'].fillna('Prefer not to say', inplace=True)
+        # Assigned back (not inplace) so it also works on chunks where the column is all empty (float)
+        df['Employment'] = df['Employment'].fillna('Unknown')
+        df['Age'] = df['Age'].fillna('Prefer not to say')
 
     # df.fillna(df.median(), inplace=True)
     return df
 
-def remove_duplicates(df: pd.DataFrame) -> pd.DataFrame:
+@metrics.instrument("preprocess.dedup", key="year")
+def remove_duplicates(df: pd.DataFrame, year=None, fingerprint_store=None) -> pd.DataFrame:
     """
-    Remove duplicate rows from the DataFrame.
+    Remove duplicate rows from the DataFrame, compared by their fingerprint (see `fingerprints.compute`):
+    a duplicate has the same answers as an earlier row in the `--dedup-columns` of the store when they're passed,
+    in every column read from the CSV otherwise (see `fingerprints.answer_columns`).
+    With a `fingerprint_store` the responses it already holds (earlier years, chunks or runs) are removed too.
     """
-    df.drop_duplicates(inplace=True)
+    if fingerprint_store is None or fingerprint_store.columns is None:
+        columns = fingerprints.answer_columns(df)
+    else:
+        columns = fingerprint_store.columns
+    if fingerprint_store is None:
+        keep = fingerprints.first_occurrences(fingerprints.compute(df, columns))
+    else:
+        keep = fingerprint_store.filter(year, fingerprints.compute(df, columns))
+    if not keep.all():
+        print(f"# duplicates: {(~keep).sum()}")
+        df = df[keep]
     if "Q120" in df.columns:
         df.drop(columns=["Q120"],inplace=True)
     return df
 
-def convert_data_types(df) -> pd.DataFrame:
+# Compact dtypes per survey era (columns missing from a year are skipped)
+#   - "category": low-cardinality single answers (and the very repetitive Employment answers)
+#   - "years": years answers like "Less than 1 year" / "More than 50 years", downcast to float32
+#   - numeric dtypes are converted with `pd.to_numeric` (non numeric answers become NaN)
+#   - compensation / experience amounts stay float64: float32 would round the values written to the warehouse
+#     (e.g. 214169.71 -> 214169.703125), only the small scores are downcast
+_COMMON_SCHEMA = {
+    "ResponseId": "Int64",
+    "survey_year": "Int16",
+    "Country": "category",
+    "Employment": "category",
+}
+_LEGACY_SCHEMA = {
+    # 2013 - 2017
+    "Professional": "category",
+    "ProgramHobby": "category",
+    "University": "category",
+    "FormalEducation": "category",
+    "CompanySize": "category",
+    "HomeRemote": "category",
+    "Salary": "float64",
+    "ExpectedSalary": "float64",
+    "CareerSatisfaction": "float32",
+    "JobSatisfaction": "float32",
+}
+_MODERN_SCHEMA = {
+    # 2018 and on
+    "MainBranch": "category",
+    "Age": "category",
+    "RemoteWork": "category",
+    "EdLevel": "category",
+    "OrgSize": "category",
+    "Currency": "category",
+    "Hobbyist": "category",
+    "Student": "category",
+    "YearsCode": "years",
+    "YearsCodePro": "years",
+    "WorkExp": "float64",
+    "ConvertedSalary": "float64",
+    "ConvertedComp": "float64",
+    "ConvertedCompYearly": "float64",
+}
+_YEARS_ANSWERS = {
+    "Less than 1 year": 0,
+    "More than 50 years": 51,
+}
+
+def get_schema(year) -> dict:
+    """The column -> compact dtype map of the given survey year"""
+    return {**_COMMON_SCHEMA, **(_LEGACY_SCHEMA if year <= 2017 else _MODERN_SCHEMA)}
+
+def _memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+def _to_numeric(values, col, year):
+    """`pd.to_numeric` with the non numeric answers set to missing, and reported per column"""
+    numeric = pd.to_numeric(values, errors="coerce")
+    coerced = numeric.isna() & values.notna()
+    if coerced.any():
+        examples = list(pd.unique(values[coerced].astype(str))[:3])
+        print(f"!! Warning ({year}): {int(coerced.sum())} non numeric answers of '{col}' set to missing, e.g. {examples}")
+    return numeric
+
+def convert_data_types(df, year) -> pd.DataFrame:
     """
     Convert data types for specific columns if necessary.
     """
-    # Converting column to category data type
-    # df['column_name'] = df['column_name'].astype('category')
+    before = _memory_mb(df)
+
+    for col, dtype in get_schema(year).items():
+        if col not in df.columns:
+            continue
+        if dtype == "category":
+            df[col] = df[col].astype("category")
+        elif dtype == "years":
+            values = df[col].astype(object).replace(_YEARS_ANSWERS)
+            df[col] = _to_numeric(values, col, year).astype("float32")
+        else:
+            df[col] = _to_numeric(df[col], col, year).astype(dtype)
+
+    print(f"# memory ({year}): {before:.1f} MB -> {_memory_mb(df):.1f} MB")
     return df
 
+def concat_years(frames) -> pd.DataFrame:
+    """
+    pd.concat of the processed years, keeping the `category` columns as categories
+    (a plain concat turns them to `object` when the years have different categories).
+    """
+    frames = [f for f in frames if len(f.columns) > 0]
+    align_categories(frames)
+    return pd.concat(frames, ignore_index=True)
+
+def align_categories(frames):
+    """Sets the union of the categories of every `category` column on all the frames (in place)"""
+    categories = {}
+    for f in frames:
+        for col in f.columns[f.dtypes == "category"]:
+            categories.setdefault(col, []).append(f[col].cat.categories)
+
+    for col, cats in categories.items():
+        union = cats[0].append(cats[1:]).unique() if len(cats) > 1 else cats[0]
+        for f in frames:
+            if col in f.columns and isinstance(f[col].dtype, pd.CategoricalDtype):
+                f[col] = f[col].cat.set_categories(union)
+
 def normalize_text(df, text_columns) -> pd.DataFrame:
     """
     Normalize text data in given columns.
@@ -78,7 +194,8 @@ def feature_engineering(df) -> pd.DataFrame:
 #     df[numeric_columns] = scaler.fit_transform(df[numeric_columns])
 #     return df
 
-def process(data: pd.DataFrame, year):
+@metrics.instrument("preprocess", key="year")
+def process(data: pd.DataFrame, year, fingerprint_store=None):
     """
     The 'Data Transformation' stage
     """
@@ -86,14 +203,14 @@ def process(data: pd.DataFrame, year):
     data = handle_missing_values(data, year)
 
     # Remove Duplicates
-    data = remove_duplicates(data)
-
-    # Convert Data Types
-    data = convert_data_types(data)
+    data = remove_duplicates(data, year, fingerprint_store)
 
     # Normalize Text Columns
     if year > 2017:
-        data['Age'] = data['Age'].apply(normalize_age)
+        data['Age'] = transforms.map_unique(data['Age'], normalize_age, vectorized=True)
+
+    # Convert Data Types (after the normalization, so the categories are the final answers)
+    data = convert_data_types(data, year)
         
     # Feature Engineering
     data = feature_engineering(data)
@@ -0,0 +1,330 @@
+# Read-only query service over the loaded warehouse (local HTTP API + Python client)
+# The common dashboard queries are answered from the rollup tables (see `rollups`) through a connection pool:
+#   GET /years                                        loaded years (rows, loaded_at)
+#   GET /top?dim=language&year=2023&n=10[&source=..]  top N members of a dimension
+#   GET /have_want?dim=language&year=2023             have / want / both counts and shares per member
+#   GET /breakdown?by=remote_work|age|employment|remote_work_employment&year=2023
+#   GET /stats                                        cache stats
+# Results (the /years list included) are kept in an LRU cache with a TTL. An entry is dropped as soon as
+# its year is reloaded (its `load_manifest.loaded_at` changed, checked at most every `manifest_poll` seconds),
+# the /years list with any loaded, reloaded or removed year, and the latest year is warmed up at startup,
+# so dashboard hits don't reach the DB on every request.
+# Usage:
+#   python query_service.py [--host 127.0.0.1] [--port 8000] [--ttl 300]   # serves the DB of DATABASE_URL
+
+# 3rd parties
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+import requests
+from sqlalchemy import create_engine, inspect, text, make_url
+
+# Data pipeline internals
+from sys import argv
+import helpers
+import load_manifest
+import rollups
+import transforms
+
+DEFAULT_PORT = 8000
+DEFAULT_TTL = 300
+DEFAULT_POOL_SIZE = 4
+_MANIFEST_POLL = 5
+_BREAKDOWNS = ("remote_work", "age", "employment", "remote_work_employment")
+
+class _TTLCache(transforms.LRUCache):
+    """LRU cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = super().get(key)
+            if entry is None:
+                return default
+            if entry[0] < time.monotonic():
+                # Expired, counted as a miss
+                del self._data[key]
+                self.hits -= 1
+                self.misses += 1
+                return default
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            super().put(key, (time.monotonic() + self.ttl, value))
+
+    def drop_year(self, year):
+        with self._lock:
+            for key in [k for k in self._data if k[1] == year]:
+                del self._data[key]
+
+class QueryError(Exception):
+    """Invalid query parameters (HTTP 400)"""
+
+class QueryService:
+    """The queries + their cache, shared by the request handler threads"""
+
+    def __init__(self, db_host_url, ttl=DEFAULT_TTL, pool_size=DEFAULT_POOL_SIZE, maxsize=1024):
+        options = {} if make_url(db_host_url).get_backend_name() == "sqlite" else {"pool_size": pool_size}
+        self.engine = create_engine(db_host_url, **options)
+        self.cache = _TTLCache(maxsize, ttl)
+        self._loaded_at = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    #                           Cache invalidation
+    # ----------------------------------------------------------------------------
+    def _refresh_manifest(self, force=False):
+        """Drops the cached results of the reloaded (or removed) years, and the cached years list when any changed"""
+        with self._lock:
+            if not force and time.monotonic() - self._checked_at < _MANIFEST_POLL:
+                return
+            self._checked_at = time.monotonic()
+            manifest = load_manifest.read(self.engine)
+            loaded_at = manifest["loaded_at"].to_dict() if not manifest.empty else {}
+            loaded_at = {int(year): value for year, value in loaded_at.items()}
+            changed = [year for year in set(self._loaded_at) | set(loaded_at)
+                       if self._loaded_at.get(year) != loaded_at.get(year)]
+            for year in changed:
+                if self._loaded_at:
+                    print(f"[query service] {year} was reloaded, dropping its cached results")
+                self.cache.drop_year(year)
+            if changed:
+                # The years list isn't cached per year
+                self.cache.drop_year(None)
+            self._loaded_at = loaded_at
+
+    def _cached(self, endpoint, year, params, query):
+        self._refresh_manifest()
+        key = (endpoint, year, tuple(sorted(params.items())))
+        result = self.cache.get(key)
+        if result is not None:
+            return result, True
+        result = query()
+        self.cache.put(key, result)
+        return result, False
+
+    def _read(self, sql, **params):
+        with self.engine.connect() as conn:
+            return pd.read_sql(text(sql), conn, params=params)
+
+    def _respondents(self, year):
+        if year not in self._loaded_at:
+            raise QueryError(f"survey year {year} is not loaded")
+        return int(load_manifest.read(self.engine).loc[year, "rows"])
+
+    # ----------------------------------------------------------------------------
+    #                               Queries
+    # ----------------------------------------------------------------------------
+    def years(self):
+        def query():
+            manifest = load_manifest.read(self.engine)
+            if manifest.empty:
+                return []
+            return json.loads(manifest.reset_index()[["survey_year", "rows", "loaded_at"]].to_json(orient="records"))
+        return self._cached("years", None, {}, query)
+
+    def top(self, dim, year, n=10, source=None):
+        def query():
+            sources = self._read(
+                f"SELECT DISTINCT source FROM {rollups.DIM_COUNTS_TABLE} WHERE dim_table = :dim_table",
+                dim_table=f"{dim}_dim")["source"].tolist()
+            if not sources:
+                raise QueryError(f"unknown dimension '{dim}'")
+            chosen = source or next((s for s in sources if s.endswith("_have_worked_with_link")), sources[0])
+            if chosen not in sources:
+                raise QueryError(f"'{chosen}' is not a source of '{dim}', one of: {', '.join(sources)}")
+            rows = self._read(
+                f"SELECT member, respondents FROM {rollups.DIM_COUNTS_TABLE} "
+                "WHERE dim_table = :dim_table AND source = :source AND survey_year = :year "
+                "ORDER BY respondents DESC, member LIMIT :n",
+                dim_table=f"{dim}_dim", source=chosen, year=year, n=n)
+            rows["share"] = rows["respondents"] / self._respondents(year)
+            return {"dim": dim, "year": year, "source": chosen, "members": json.loads(rows.to_json(orient="records"))}
+        return self._cached("top", year, {"dim": dim, "n": n, "source": source}, query)
+
+    def have_want(self, dim, year):
+        def query():
+            rows = self._read(
+                f'SELECT member, have, want, "both" FROM {rollups.HAVE_WANT_TABLE} '
+                "WHERE dim_table = :dim_table AND survey_year = :year ORDER BY have DESC, member",
+                dim_table=f"{dim}_dim", year=year)
+            if rows.empty:
+                raise QueryError(f"no have/want counts of '{dim}' in {year}")
+            respondents = self._respondents(year)
+            for col in ("have", "want", "both"):
+                rows[f"{col}_share"] = rows[col] / respondents
+            return {"dim": dim, "year": year, "members": json.loads(rows.to_json(orient="records"))}
+        return self._cached("have_want", year, {"dim": dim}, query)
+
+    def breakdown(self, by, year):
+        if by not in _BREAKDOWNS:
+            raise QueryError(f"unknown breakdown '{by}', one of: {', '.join(_BREAKDOWNS)}")
+
+        def query():
+            if by == "remote_work":
+                rows = self._read(
+                    f"SELECT member AS remote_work, respondents FROM {rollups.DIM_COUNTS_TABLE} "
+                    "WHERE source = 'survey_facts' AND dim_table = 'remote_work_dim' AND survey_year = :year "
+                    "ORDER BY respondents DESC", year=year)
+            elif by == "employment":
+                rows = self._read(
+                    f"SELECT member AS employment, respondents FROM {rollups.DIM_COUNTS_TABLE} "
+                    "WHERE source = 'employment_link' AND survey_year = :year ORDER BY respondents DESC", year=year)
+            elif by == "remote_work_employment":
+                rows = self._read(
+                    f"SELECT remote_work, employment, respondents FROM {rollups.REMOTE_EMPLOYMENT_TABLE} "
+                    "WHERE survey_year = :year ORDER BY respondents DESC", year=year)
+            else:
+                # Not rolled up (single answer column of the facts)
+                rows = self._read(
+                    "SELECT age, COUNT(*) AS respondents FROM survey_facts WHERE survey_year = :year "
+                    "GROUP BY age ORDER BY respondents DESC", year=year)
+            rows["share"] = rows["respondents"] / self._respondents(year)
+            return {"by": by, "year": year, "rows": json.loads(rows.to_json(orient="records"))}
+        return self._cached("breakdown", year, {"by": by}, query)
+
+    def warm(self):
+        """Runs every query of the latest loaded year, so the first dashboard hits are served from the cache"""
+        self._refresh_manifest(force=True)
+        self.years()
+        if not self._loaded_at:
+            print("[query service] nothing loaded yet, skipping the cache warm up")
+            return
+        year = max(self._loaded_at)
+        start = time.perf_counter()
+        dims = self._read(f"SELECT DISTINCT dim_table FROM {rollups.DIM_COUNTS_TABLE}")["dim_table"]
+        pairs = set()
+        if inspect(self.engine).has_table(rollups.HAVE_WANT_TABLE):
+            pairs = set(self._read(f"SELECT DISTINCT dim_table FROM {rollups.HAVE_WANT_TABLE}")["dim_table"])
+        for dim_table in dims:
+            dim = dim_table[:-len("_dim")]
+            self.top(dim, year)
+            if dim_table in pairs:
+                self.have_want(dim, year)
+        for by in _BREAKDOWNS:
+            self.breakdown(by, year)
+        print(f"[query service] warmed {len(self.cache._data)} results of {year} in {time.perf_counter() - start:.2f}s")
+
+    def stats(self):
+        return {"entries": len(self.cache._data), "hits": self.cache.hits, "misses": self.cache.misses,
+                "ttl": self.cache.ttl, "years": sorted(self._loaded_at)}
+
+# ----------------------------------------------------------------------------
+#                               HTTP API
+# ----------------------------------------------------------------------------
+def _int_param(params, name, default=None):
+    values = params.get(name)
+    if not values:
+        if default is None:
+            raise QueryError(f"missing '{name}'")
+        return default
+    try:
+        return int(values[0])
+    except ValueError:
+        raise QueryError(f"'{name}' must be an integer")
+
+def _str_param(params, name, required=True):
+    values = params.get(name)
+    if not values:
+        if required:
+            raise QueryError(f"missing '{name}'")
+        return None
+    return values[0]
+
+def _make_handler(service):
+    routes = {
+        "/years": lambda p: service.years(),
+        "/top": lambda p: service.top(_str_param(p, "dim"), _int_param(p, "year"), _int_param(p, "n", 10),
+                                      _str_param(p, "source", required=False)),
+        "/have_want": lambda p: service.have_want(_str_param(p, "dim"), _int_param(p, "year")),
+        "/breakdown": lambda p: service.breakdown(_str_param(p, "by"), _int_param(p, "year")),
+        "/stats": lambda p: (service.stats(), False),
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            route = routes.get(url.path)
+            if route is None:
+                return self._send(404, {"error": f"unknown endpoint '{url.path}'"})
+            try:
+                result, hit = route(parse_qs(url.query))
+                self._send(200, result, cache="hit" if hit else "miss")
+            except QueryError as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def _send(self, status, body, cache=None):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            if cache:
+                self.send_header("X-Cache", cache)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve(db_host_url, host="127.0.0.1", port=DEFAULT_PORT, ttl=DEFAULT_TTL):
+    """Starts the service (blocking), after warming the cache of the latest year"""
+    service = QueryService(db_host_url, ttl=ttl)
+    service.warm()
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    print(f"[query service] listening on http://{host}:{server.server_port}")
+    server.serve_forever()
+
+# ----------------------------------------------------------------------------
+#                               Python client
+# ----------------------------------------------------------------------------
+class QueryClient:
+    """Client of the query service, e.g. `QueryClient().top("language", 2023, n=5)`"""
+
+    def __init__(self, base_url=f"http://127.0.0.1:{DEFAULT_PORT}", timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def _get(self, endpoint, **params):
+        response = self._session.get(f"{self.base_url}/{endpoint}", timeout=self.timeout,
+                                     params={k: v for k, v in params.items() if v is not None})
+        if response.status_code != 200:
+            raise Exception(f"query service error ({response.status_code}): {response.json().get('error')}")
+        return response.json()
+
+    def years(self):
+        return self._get("years")
+
+    def top(self, dim, year, n=10, source=None):
+        return self._get("top", dim=dim, year=year, n=n, source=source)
+
+    def have_want(self, dim, year):
+        return self._get("have_want", dim=dim, year=year)
+
+    def breakdown(self, by, year):
+        return self._get("breakdown", by=by, year=year)
+
+    def stats(self):
+        return self._get("stats")
+
+if __name__ == '__main__':
+    args = list(argv[1:])
+    serve(
+        helpers.setup(),
+        host=helpers.pop_option(args, "--host", cast=str, default="127.0.0.1"),
+        port=helpers.pop_option(args, "--port", default=DEFAULT_PORT),
+        ttl=helpers.pop_option(args, "--ttl", default=DEFAULT_TTL),
+    )
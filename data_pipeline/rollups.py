@@ -0,0 +1,160 @@
+# Precomputed OLAP rollups of the star schema
+# The aggregates the dashboards ask for are computed while the link frames of `load_data.load` are
+# still in memory (no join of survey_facts with the big link tables afterwards):
+#   - rollup_dim_counts: respondents per survey_year x dimension member, for every link (and remote_work)
+#   - rollup_have_want: respondents who have worked with / want to work with / both, per pair column member
+#   - rollup_remote_work_employment: respondents per survey_year x remote_work x employment status
+# Counts are accumulated over the chunks of the run and written once at the end (`load_data.write_rollups`),
+# only the loaded years are replaced (the other years of an incremental load are kept).
+
+# 3rd parties
+import pandas as pd
+from sqlalchemy import text
+
+DIM_COUNTS_TABLE = "rollup_dim_counts"
+HAVE_WANT_TABLE = "rollup_have_want"
+REMOTE_EMPLOYMENT_TABLE = "rollup_remote_work_employment"
+
+_HAVE_SUFFIX = "_have_worked_with_link"
+_WANT_SUFFIX = "_want_to_work_with_link"
+# Link tables keyed by the fact index + 1 instead of the fact index
+_ONE_BASED_FACT_COLUMNS = {"response_id"}
+_FACT_COLUMNS = ("fact_id", "response_id", "survey_response_id")
+
+def _split_link(link_df):
+    """(fact ids, member ids) of a link frame"""
+    fact_col = next(c for c in _FACT_COLUMNS if c in link_df.columns)
+    id_col = next(c for c in link_df.columns if c != fact_col)
+    shift = 1 if fact_col in _ONE_BASED_FACT_COLUMNS else 0
+    return link_df[fact_col].to_numpy() - shift, link_df[id_col].to_numpy()
+
+class Rollups:
+    """Rollup counts accumulated over the `load` calls (chunks) of a run"""
+
+    def __init__(self):
+        self._dim_counts = []
+        self._have_want = []
+        self._remote_employment = []
+        self._pending_have = {}
+        self.years = set()
+
+    def _respondents(self, fact_years, link_df):
+        """Distinct (fact id, survey_year, member id) of a link"""
+        facts, members = _split_link(link_df)
+        frame = pd.DataFrame({
+            "fact": facts,
+            "survey_year": fact_years.reindex(facts).to_numpy(),
+            "member_id": members,
+        })
+        return frame.dropna(subset=["member_id"]).drop_duplicates(["fact", "member_id"])
+
+    def add_link(self, link_table, dim_table, link_df, fact_years):
+        """
+        Counts a link frame (before it's uploaded).
+
+        Parameters:
+        - link_table (str): The link table name (e.g. "language_have_worked_with_link").
+        - dim_table (str): Its dimension table (e.g. "language_dim").
+        - link_df (pd.DataFrame): The link rows (fact column + member id column).
+        - fact_years (pd.Series): survey_year of the loaded facts, indexed by fact id.
+        """
+        self.years.update(int(y) for y in fact_years.dropna().unique())
+        respondents = self._respondents(fact_years, link_df)
+        counts = respondents.groupby(["survey_year", "member_id"]).size().rename("respondents").reset_index()
+        counts.insert(0, "dim_table", dim_table)
+        counts.insert(0, "source", link_table)
+        self._dim_counts.append(counts)
+
+        # have/want: counted once both links of the pair are known
+        if link_table.endswith(_HAVE_SUFFIX):
+            self._pending_have[dim_table] = respondents
+        elif link_table.endswith(_WANT_SUFFIX) and dim_table in self._pending_have:
+            self._add_have_want(dim_table, self._pending_have.pop(dim_table), respondents)
+
+    def _add_have_want(self, dim_table, have, want):
+        keys = ["fact", "survey_year", "member_id"]
+        both = have[keys].merge(want[keys], on=keys)
+        counts = pd.concat({
+            "have": have.groupby(["survey_year", "member_id"]).size(),
+            "want": want.groupby(["survey_year", "member_id"]).size(),
+            "both": both.groupby(["survey_year", "member_id"]).size(),
+        }, axis=1).fillna(0).astype("int64").reset_index()
+        counts.insert(0, "dim_table", dim_table)
+        self._have_want.append(counts)
+
+    def add_single(self, source, dim_table, member_ids, fact_years):
+        """Counts a single answer dimension column of the facts (e.g. remote_work_id)"""
+        self.years.update(int(y) for y in fact_years.dropna().unique())
+        frame = pd.DataFrame({"survey_year": fact_years.to_numpy(), "member_id": member_ids.to_numpy()})
+        counts = frame.dropna().groupby(["survey_year", "member_id"]).size().rename("respondents").reset_index()
+        counts.insert(0, "dim_table", dim_table)
+        counts.insert(0, "source", source)
+        self._dim_counts.append(counts)
+
+    def add_remote_employment(self, employment_link_df, remote_work_ids, fact_years):
+        """Respondents per remote_work x employment status (a respondent counts once per status)"""
+        respondents = self._respondents(fact_years, employment_link_df)
+        respondents["remote_work_id"] = remote_work_ids.reindex(respondents["fact"]).to_numpy()
+        counts = (respondents
+            .groupby(["survey_year", "remote_work_id", "member_id"], dropna=False)
+            .size()
+            .rename("respondents")
+            .reset_index()
+            .rename(columns={"member_id": "employment_id"}))
+        self._remote_employment.append(counts)
+
+    # ----------------------------------------------------------------------------
+    #                               Writing
+    # ----------------------------------------------------------------------------
+    def frames(self, registry=None):
+        """The rollup tables (chunks combined), with the member names when the dims `registry` is passed"""
+        tables = {}
+        if self._dim_counts:
+            counts = pd.concat(self._dim_counts, ignore_index=True)
+            tables[DIM_COUNTS_TABLE] = _with_members(
+                counts.groupby(["source", "dim_table", "survey_year", "member_id"], as_index=False)["respondents"].sum(),
+                registry)
+        if self._have_want:
+            counts = pd.concat(self._have_want, ignore_index=True)
+            tables[HAVE_WANT_TABLE] = _with_members(
+                counts.groupby(["dim_table", "survey_year", "member_id"], as_index=False)[["have", "want", "both"]].sum(),
+                registry)
+        if self._remote_employment:
+            counts = pd.concat(self._remote_employment, ignore_index=True)
+            counts = counts.groupby(["survey_year", "remote_work_id", "employment_id"], as_index=False, dropna=False)["respondents"].sum()
+            tables[REMOTE_EMPLOYMENT_TABLE] = _with_names(counts, registry)
+        for frame in tables.values():
+            frame["survey_year"] = frame["survey_year"].astype("int64")
+        return tables
+
+def delete_years(conn, table_name, years):
+    """
+    Removes the rows of the reloaded years from a rollup table, before the new counts are appended
+    (an incremental load keeps the rows of the other years). Runs in the transaction of the append.
+    """
+    for year in years:
+        conn.execute(text(f"DELETE FROM {table_name} WHERE survey_year = :year"), {"year": year})
+
+def _members(registry, dim_table):
+    """member id -> name of a dimension (empty without a registry)"""
+    frame = registry.get(dim_table) if registry is not None else None
+    if frame is None:
+        return pd.Series(dtype=object)
+    id_col = next(c for c in frame.columns if c.endswith("_id"))
+    name_col = next(c for c in frame.columns if c != id_col)
+    return pd.Series(frame[name_col].to_numpy(dtype=object), index=frame[id_col].to_numpy())
+
+def _with_members(counts, registry):
+    counts["member_id"] = counts["member_id"].astype("int64")
+    names = pd.Series(index=counts.index, dtype=object)
+    for dim_table, rows in counts.groupby("dim_table").groups.items():
+        names[rows] = _members(registry, dim_table).reindex(counts.loc[rows, "member_id"]).to_numpy()
+    counts.insert(counts.columns.get_loc("member_id") + 1, "member", names)
+    return counts
+
+def _with_names(counts, registry):
+    counts["remote_work"] = _members(registry, "remote_work_dim").reindex(counts["remote_work_id"]).to_numpy()
+    counts["employment"] = _members(registry, "employment_dim").reindex(counts["employment_id"]).to_numpy()
+    counts["remote_work_id"] = counts["remote_work_id"].astype("Int64")
+    counts["employment_id"] = counts["employment_id"].astype("int64")
+    return counts[["survey_year", "remote_work_id", "remote_work", "employment_id", "employment", "respondents"]]
@@ -0,0 +1,183 @@
+# Synthetic survey generator
+# Survey shaped DataFrames (same raw columns as the real CSVs of the 2013-2017 and 2018+ layouts)
+# at any scale, so the pipeline can be benchmarked and run without downloading the real surveys.
+# Usage:
+#   python synthetic_data.py ROWS [YEARS]   # writes data/stack-overflow-developer-survey-{year}.zip
+#                                           # then: python main.py [YEARS] --cache
+
+# 3rd parties
+import io
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+
+# Data pipeline internals
+from sys import argv
+import fetch_data
+
+# have/want pairs processed by `load_data.load`, extra pairs are named Extra{i}
+PAIR_BASES = [
+    "Language",
+    "Database",
+    "Platform",
+    "Webframe",
+    "MiscTech",
+    "ToolsTech",
+    "NEWCollabTools",
+    "OfficeStackAsync",
+    "OfficeStackSync",
+    "AISearch",
+    "AIDev",
+]
+_PAIR_SUFFIXES = ("HaveWorkedWith", "WantToWorkWith")
+
+_COUNTRIES = ["United States of America", "India", "Germany", "United Kingdom", "Israel", "Brazil", "Kenya"]
+_EMPLOYMENT = ["Employed, full-time", "Employed, part-time", "Independent contractor, freelancer, or self-employed",
+               "Student, full-time", "Not employed, but looking for work", "Retired"]
+_LEGACY_EMPLOYMENT = ["Employed full-time", "Employed part-time", "Independent contractor, freelancer, or self-employed",
+                      "Not employed, and not looking for work", "Retired"]
+_DEV_TYPES = ["Developer, full-stack", "Developer, back-end", "Developer, front-end", "Data scientist or machine learning specialist",
+              "Engineering manager", "DevOps specialist", "Student", "Academic researcher"]
+_AGES = ["Under 18 years old", "18-24 years old", "25-34 years old", "35-44 years old", "45-54 years old",
+         "55-64 years old", "65 years or older", "Prefer not to say"]
+_YEARS_CODE = ["Less than 1 year", "More than 50 years"] + [str(y) for y in range(1, 50)]
+
+class _Generator:
+    """Column generators sharing the random state and the scale parameters"""
+
+    def __init__(self, rows, items_per_cell, cardinality, distinct_cells, null_ratio, seed):
+        self.rows = rows
+        self.items_per_cell = items_per_cell
+        self.cardinality = cardinality
+        self.distinct_cells = distinct_cells
+        self.null_ratio = null_ratio
+        self.rng = np.random.default_rng(seed)
+
+    def _with_nulls(self, values, null_ratio=None):
+        null_ratio = self.null_ratio if null_ratio is None else null_ratio
+        values = values.astype(object)
+        values[self.rng.random(self.rows) < null_ratio] = np.nan
+        return values
+
+    def single(self, choices, null_ratio=None):
+        """Single answer column"""
+        return self._with_nulls(self.rng.choice(np.asarray(choices, dtype=object), self.rows), null_ratio)
+
+    def multi(self, items, sep=";", null_ratio=None):
+        """
+        Multi-select column: `sep` joined answers of 1..items_per_cell items.
+        Cells are sampled from a pool of `distinct_cells` combinations (the real answers repeat a lot),
+        so generating millions of rows stays cheap.
+        """
+        items = np.asarray(items, dtype=object)
+        max_items = min(self.items_per_cell, len(items))
+        pool = np.empty(self.distinct_cells, dtype=object)
+        for i in range(self.distinct_cells):
+            k = self.rng.integers(1, max_items + 1)
+            pool[i] = sep.join(self.rng.choice(items, k, replace=False))
+        return self._with_nulls(pool[self.rng.integers(0, self.distinct_cells, self.rows)], null_ratio)
+
+    def items(self, prefix, cardinality=None):
+        return [f"{prefix} {i}" for i in range(cardinality or self.cardinality)]
+
+    def numbers(self, scale, null_ratio=None):
+        return self._with_nulls(np.round(self.rng.random(self.rows) * scale, 2), null_ratio).astype("float64")
+
+def _legacy_columns(gen):
+    """2013 - 2017 layout"""
+    return {
+        "Respondent": np.arange(1, gen.rows + 1),
+        "Professional": gen.single(["Professional developer", "Student", "None of these"]),
+        "ProgramHobby": gen.single(["Yes, I program as a hobby", "No", "Yes, both"]),
+        "Country": gen.single(_COUNTRIES),
+        "University": gen.single(["No", "Yes, full-time", "Yes, part-time"]),
+        "EmploymentStatus": gen.single(_LEGACY_EMPLOYMENT),
+        "FormalEducation": gen.single(["Bachelor's degree", "Master's degree", "Doctoral degree"]),
+        "CompanySize": gen.single(["Fewer than 10 employees", "10 to 19 employees", "10,000 or more employees"]),
+        "HomeRemote": gen.single(["Never", "All or almost all the time", "A few days each month"]),
+        "DeveloperType": gen.multi(_DEV_TYPES, sep="; "),
+        "HaveWorkedLanguage": gen.multi(gen.items("Language"), sep="; "),
+        "WantWorkLanguage": gen.multi(gen.items("Language"), sep="; "),
+        "CareerSatisfaction": gen.numbers(10),
+        "JobSatisfaction": gen.numbers(10),
+        "Salary": gen.numbers(200_000, null_ratio=0.5),
+        "ExpectedSalary": gen.numbers(200_000, null_ratio=0.9),
+    }
+
+def _modern_columns(gen, year, pairs):
+    """2018+ layout (the columns `load_data.load` expects)"""
+    id_col = "ResponseId" if year >= 2021 else "Respondent"
+    columns = {
+        id_col: np.arange(1, gen.rows + 1),
+        "MainBranch": gen.single(["I am a developer by profession", "I am learning to code", "I code primarily as a hobby"]),
+        "Employment": gen.multi(_EMPLOYMENT, null_ratio=gen.null_ratio / 2),
+        "RemoteWork": gen.single(["Remote", "Hybrid (some remote, some in-person)", "In-person"]),
+        "CodingActivities": gen.multi(["Hobby", "Contribute to open-source projects", "Freelance/contract work", "Bootstrapping a business"]),
+        "EdLevel": gen.single(["Bachelor's degree", "Master's degree", "Secondary school", "Something else"]),
+        "LearnCode": gen.multi(["Books / Physical media", "Online Courses or Certification", "School", "On the job training"]),
+        "LearnCodeOnline": gen.multi(gen.items("Online resource")),
+        "YearsCode": gen.single(_YEARS_CODE),
+        "YearsCodePro": gen.single(_YEARS_CODE, null_ratio=0.3),
+        "DevType": gen.single(_DEV_TYPES),
+        "OrgSize": gen.single(["2 to 9 employees", "20 to 99 employees", "10,000 or more employees"]),
+        "Country": gen.single(_COUNTRIES),
+        "Currency": gen.single(["USD\tUnited States dollar", "EUR European Euro", "INR\tIndian rupee"]),
+        "ConvertedCompYearly": gen.numbers(300_000, null_ratio=0.45),
+        "WorkExp": gen.numbers(40, null_ratio=0.5),
+    }
+    # Numeric ages before 2020, the age groups since
+    columns["Age"] = gen.single([str(a) for a in range(14, 80)] if year < 2020 else _AGES)
+
+    bases = PAIR_BASES[:pairs] + [f"Extra{i}" for i in range(pairs - len(PAIR_BASES))]
+    for base in bases:
+        for suffix in _PAIR_SUFFIXES:
+            columns[f"{base}{suffix}"] = gen.multi(gen.items(base))
+
+    columns["OpSysPersonal use"] = gen.multi(gen.items("OS", 8))
+    columns["OpSysProfessional use"] = gen.multi(gen.items("OS", 8))
+    columns["BuyNewTool"] = gen.multi(["Ask developers I know/work with", "Visit developer communities", "Read ratings or reviews"])
+    columns["NEWSOSites"] = gen.multi(["Stack Overflow", "Stack Exchange", "Stack Overflow for Teams"])
+    columns["ProfessionalTech"] = gen.multi(["DevOps function", "Microservices", "Automated testing", "Continuous integration"],
+                                            null_ratio=0.4)
+    # Free text question dropped by `remove_duplicates`
+    columns["Q120"] = np.full(gen.rows, "Apples", dtype=object)
+    return columns
+
+def generate(rows, year=2023, pairs=len(PAIR_BASES), items_per_cell=5, cardinality=30,
+             distinct_cells=1024, null_ratio=0.1, seed=0) -> pd.DataFrame:
+    """
+    A raw survey year (the columns of `fetch_data.fetch`) with random answers.
+
+    Parameters:
+    - rows (int): # of responses.
+    - year (int): The survey year, picks the 2013-2017 or the 2018+ column layout.
+    - pairs (int): # of have/want multi-select column pairs (2018+), the real ones first.
+    - items_per_cell (int): Max # of answers in a multi-select cell.
+    - cardinality (int): # of distinct answers of the technology multi-select columns.
+    - distinct_cells (int): # of distinct multi-select cells (combinations of answers) per column.
+    - null_ratio (float): Ratio of unanswered cells.
+    - seed (int): Random seed, the same arguments generate the same frame.
+    """
+    gen = _Generator(rows, items_per_cell, cardinality, distinct_cells, null_ratio, seed)
+    columns = _legacy_columns(gen) if year <= 2017 else _modern_columns(gen, year, pairs)
+    return pd.DataFrame(columns)
+
+def write_archive(df, year, path=None):
+    """Writes the frame as the survey archive of the year (where `fetch_data` reads it from), returns the path"""
+    path = path or fetch_data._get_archive_path(year)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.writestr(fetch_data._CSV_NAME, buffer.getvalue())
+    print(f"wrote {len(df)} synthetic responses of {year} to {path}")
+    return path
+
+if __name__ == '__main__':
+    if len(argv) < 2:
+        raise Exception("usage: python synthetic_data.py ROWS [YEARS]")
+    rows = int(argv[1])
+    for year in [int(y) for y in argv[2:]] or [2023]:
+        write_archive(generate(rows, year, seed=year), year)
@@ -0,0 +1,99 @@
+# Memoized transforms over the distinct values of a column
+# Most of the survey answers repeat a lot (few distinct values for many rows), so instead of
+# running a transform once per row we:
+#   1. factorize the column (or take the categories of a `category` column)
+#   2. run the transform once per distinct value, skipping values already in the LRU cache
+#      (the cache is kept across years and chunks of the same run)
+#   3. broadcast the results back to the rows with the codes (a vectorized lookup)
+
+# 3rd parties
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAXSIZE = 1 << 16
+
+class LRUCache:
+    """A small value -> result LRU cache"""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = self.misses = 0
+
+# Transform -> its cache (shared by every call of the run)
+_caches = {}
+
+def get_cache(func, maxsize=DEFAULT_MAXSIZE) -> LRUCache:
+    if func not in _caches:
+        _caches[func] = LRUCache(maxsize)
+    return _caches[func]
+
+def memoize(func, maxsize=DEFAULT_MAXSIZE):
+    """Scalar version of the layer: `func` wrapped with its (shared) LRU cache"""
+    cache = get_cache(func, maxsize)
+    _missing = object()
+
+    def memoized(value):
+        result = cache.get(value, _missing)
+        if result is _missing:
+            result = func(value)
+            cache.put(value, result)
+        return result
+
+    memoized.__wrapped__ = func
+    memoized.cache = cache
+    return memoized
+
+def map_unique(series: pd.Series, func, vectorized=False) -> pd.Series:
+    """
+    `series.map(func)` computed once per distinct value (NaN stays NaN).
+
+    Parameters:
+    - series (pd.Series): The column to transform (any dtype, `category` columns reuse their categories).
+    - func: The transform of a single value, or of a Series of distinct values when `vectorized`.
+    - vectorized (bool): `func` takes all the (not yet cached) distinct values at once.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        uniques = series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series)
+
+    cache = get_cache(func)
+    _missing = object()
+    resolved = [cache.get(value, _missing) for value in uniques]
+
+    todo = [i for i, result in enumerate(resolved) if result is _missing]
+    if todo:
+        values = [uniques[i] for i in todo]
+        results = func(pd.Series(values, dtype=object)) if vectorized else [func(value) for value in values]
+        for i, value, result in zip(todo, values, results):
+            resolved[i] = result
+            cache.put(value, result)
+
+    # Last slot is the NaN result of the -1 codes
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    mapped[:-1] = resolved
+    mapped[-1] = np.nan
+
+    return pd.Series(mapped[codes], index=series.index, name=series.name).infer_objects()
@@ -0,0 +1,90 @@
+# Concurrent upload scheduler of the warehouse tables
+# `load_data.load` submits every dim / link / fact table as a job, jobs run in a bounded thread pool
+# (next to a connection pool of the same size) while the next tables are still being built:
+#   - every table is written in its own transaction
+#   - a job waits for the tables it depends on (links wait for their dim, survey_facts for everything)
+#   - failures are collected per table, the dependent tables are skipped and `join` raises at the end
+
+# 3rd parties
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+DEFAULT_WORKERS = 1
+
+class UploadScheduler:
+    """
+    Runs `upload(df, table_name, conn, if_exists)` jobs in `workers` threads.
+
+    Jobs are started in submission order, a job only depends on jobs submitted before it,
+    so a worker waiting for its dependencies never blocks the jobs it waits for.
+    """
+
+    def __init__(self, engine, upload, workers=DEFAULT_WORKERS):
+        self.engine = engine
+        self.upload = upload
+        self.workers = max(1, workers or DEFAULT_WORKERS)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="upload")
+        self._futures = {}
+        self._results = []
+        self._lock = threading.Lock()
+
+    def submit(self, df, table_name, if_exists='replace', depends_on=(), on_success=None):
+        """
+        Schedules the upload of a table.
+
+        Parameters:
+        - df (pd.DataFrame): The rows to write (not modified by the caller afterwards).
+        - table_name (str): The target table.
+        - if_exists (str): 'replace' or 'append'.
+        - depends_on: Tables (submitted earlier) that must be written first, `True` for all of them.
+        - on_success: Called with the job result once the table is committed (in the upload thread).
+        """
+        if depends_on is True:
+            depends_on = list(self._futures)
+        dependencies = [self._futures[t] for t in depends_on if t in self._futures]
+        self._futures[table_name] = self._executor.submit(
+            self._run, df, table_name, if_exists, dependencies, list(depends_on), on_success)
+
+    def _run(self, df, table_name, if_exists, dependencies, depends_on, on_success=None):
+        start = time.perf_counter()
+        result = {"table": table_name, "rows": len(df), "status": "ok", "seconds": 0.0, "error": None}
+
+        # Dependencies return their result, a failed (or skipped) one skips this table
+        failed = [f.result()["table"] for f in dependencies if f.result()["status"] != "ok"]
+        if failed:
+            result.update(status="skipped", error=f"depends on failed table(s): {', '.join(failed)}")
+        else:
+            try:
+                # One transaction per table
+                with self.engine.begin() as conn:
+                    self.upload(df, table_name, conn, if_exists)
+                if on_success is not None:
+                    on_success(result)
+            except Exception as e:
+                result.update(status="failed", error=f"{type(e).__name__}: {e}")
+                print(f"!! upload of {table_name} failed: {result['error']}")
+
+        result["seconds"] = time.perf_counter() - start
+        with self._lock:
+            self._results.append(result)
+        return result
+
+    def join(self):
+        """
+        Waits for all the submitted jobs and returns their results (table, rows, status, seconds, error).
+        Raises when a table failed, after all the independent tables were written.
+        """
+        wait(list(self._futures.values()))
+        results = list(self._results)
+        self._futures.clear()
+        self._results.clear()
+
+        failed = [r for r in results if r["status"] != "ok"]
+        if failed:
+            details = "\n".join(f"  - {r['table']} ({r['status']}): {r['error']}" for r in failed)
+            raise Exception(f"{len(failed)} of {len(results)} table uploads did not complete:\n{details}")
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,16 @@
+# Shared fixtures of the data pipeline tests
+# The pipeline modules import each other by name (`python main.py` from `data_pipeline/`),
+# so the tests put that directory on the import path the same way.
+
+# 3rd parties
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "data_pipeline"))
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs the test from an empty directory (the pipeline reads and writes under the relative `data/`)"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,82 @@
+# 3rd parties
+import contextlib
+import re
+from types import SimpleNamespace
+import pytest
+
+# Data pipeline internals
+import bulk_write
+
+# A CSV field, quoted (with "" escapes) or not
+_FIELD = re.compile(r'"((?:[^"]|"")*)"|([^,"]*)')
+
+def _copy_read(sql, data):
+    """The rows of `data` as `COPY ... WITH (FORMAT CSV)` reads them: an unquoted field equal to the NULL marker is NULL"""
+    marker = re.search(r"NULL '([^']*)'", sql)
+    null = marker.group(1) if marker else ""
+    rows = []
+    for line in data.splitlines():
+        row, pos = [], 0
+        while True:
+            match = _FIELD.match(line, pos)
+            quoted, unquoted = match.groups()
+            row.append(quoted.replace('""', '"') if quoted is not None else None if unquoted == null else unquoted)
+            pos = match.end() + 1
+            if pos > len(line):
+                break
+        rows.append(row)
+    return rows
+
+class _Cursor:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class _Psycopg2Cursor(_Cursor):
+    def copy_expert(self, sql, buf):
+        self.calls.append((sql, buf.read()))
+
+class _Psycopg3Cursor(_Cursor):
+    @contextlib.contextmanager
+    def copy(self, sql):
+        data = []
+        yield SimpleNamespace(write=data.append)
+        self.calls.append((sql, "".join(data)))
+
+def _connection(cursor_class, calls):
+    """SQLAlchemy connection stand-in, `connection` is the DBAPI connection"""
+    return SimpleNamespace(connection=SimpleNamespace(cursor=lambda: cursor_class(calls)))
+
+def _copy(rows, keys=("year", "country", "comp"), schema=None, cursor_class=_Psycopg2Cursor):
+    calls = []
+    table = SimpleNamespace(schema=schema, name="survey_facts")
+    bulk_write.copy_writer(table, _connection(cursor_class, calls), list(keys), iter(rows))
+    assert len(calls) == 1
+    return calls[0]
+
+@pytest.mark.parametrize("cursor_class", [_Psycopg2Cursor, _Psycopg3Cursor], ids=["psycopg2", "psycopg3"])
+def test_copy_rows_read_back_as_written(cursor_class):
+    sql, data = _copy([(2023, "Bosnia, Herzegovina", 2.5), (2023, 'say "hi"', None)], cursor_class=cursor_class)
+
+    assert sql.startswith('COPY "survey_facts" ("year", "country", "comp") FROM STDIN WITH (FORMAT CSV')
+    assert _copy_read(sql, data) == [["2023", "Bosnia, Herzegovina", "2.5"], ["2023", 'say "hi"', None]]
+
+def test_empty_strings_are_not_null():
+    sql, data = _copy([("", "nan", None), (None, "", "")])
+
+    # Like the executemany path: '' and the text "nan" stay strings, only None is NULL
+    assert _copy_read(sql, data) == [["", "nan", None], [None, "", ""]]
+
+def test_copy_into_a_schema():
+    sql, _ = _copy([(2023, "Chile", 1.0)], schema="warehouse")
+    assert sql.startswith('COPY "warehouse"."survey_facts" (')
+
+def test_sqlite_falls_back_to_executemany():
+    engine = SimpleNamespace(dialect=SimpleNamespace(name="sqlite"))
+    assert bulk_write.get_writer(engine) is None
+    assert bulk_write.get_writer(SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))) is bulk_write.copy_writer
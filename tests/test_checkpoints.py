@@ -0,0 +1,66 @@
+# 3rd parties
+import os
+import numpy as np
+import pandas as pd
+
+# Data pipeline internals
+import checkpoints
+
+KEY = checkpoints.run_key(years=[2019, 2020], options={"chunksize": None})
+
+def _processed():
+    return pd.DataFrame({"ResponseId": [1, 2, 3], "Country": ["Chile", "Peru", None], "survey_year": 2019})
+
+def test_run_key_depends_on_every_input():
+    assert KEY == checkpoints.run_key(options={"chunksize": None}, years=[2019, 2020])
+    assert KEY != checkpoints.run_key(years=[2019, 2020], options={"chunksize": 100})
+
+def test_resume_reads_back_the_years_and_the_uploads(tmp_path):
+    fingerprints = np.array([11, 22, 33], dtype=np.uint64)
+    checkpoint = checkpoints.Checkpoint(KEY, root=tmp_path)
+    checkpoint.save_year(2019, _processed(), fingerprints)
+    job_key = checkpoint.upload_key("survey_facts", "replace", 1, _processed())
+    checkpoint.mark_uploaded(job_key, {"table": "survey_facts", "rows": 3})
+
+    resumed = checkpoints.Checkpoint(KEY, resume=True, root=tmp_path)
+
+    assert resumed.has_year(2019) and not resumed.has_year(2020)
+    processed, row_fingerprints = resumed.load_year(2019)
+    pd.testing.assert_frame_equal(processed, _processed())
+    np.testing.assert_array_equal(row_fingerprints, fingerprints)
+    assert resumed.is_uploaded(job_key)
+    assert resumed.load_year(2020) == (None, None)
+
+def test_upload_key_follows_the_rows(tmp_path):
+    checkpoint = checkpoints.Checkpoint(KEY, root=tmp_path)
+    same = checkpoint.upload_key("survey_facts", "append", 2, _processed())
+    assert same == checkpoint.upload_key("survey_facts", "append", 2, _processed())
+    changed = _processed().assign(Country=["Chile", "Peru", "Cuba"])
+    assert same != checkpoint.upload_key("survey_facts", "append", 2, changed)
+    # Same rows in another `load` call (chunk)
+    assert same != checkpoint.upload_key("survey_facts", "append", 3, _processed())
+
+def test_without_resume_a_run_starts_over(tmp_path):
+    checkpoint = checkpoints.Checkpoint(KEY, root=tmp_path)
+    checkpoint.save_year(2019, _processed())
+
+    restarted = checkpoints.Checkpoint(KEY, root=tmp_path)
+
+    assert not restarted.has_year(2019)
+    assert restarted.load_year(2019) == (None, None)
+
+def test_other_inputs_do_not_resume(tmp_path):
+    checkpoints.Checkpoint(KEY, root=tmp_path).save_year(2019, _processed())
+
+    other = checkpoints.Checkpoint(checkpoints.run_key(years=[2019]), resume=True, root=tmp_path)
+
+    assert not other.has_year(2019)
+
+def test_complete_removes_the_checkpoint(tmp_path):
+    checkpoint = checkpoints.Checkpoint(KEY, root=tmp_path)
+    checkpoint.save_year(2019, _processed())
+
+    checkpoint.complete()
+
+    assert not os.path.exists(checkpoint.path)
+    assert not checkpoints.Checkpoint(KEY, resume=True, root=tmp_path).has_year(2019)
@@ -0,0 +1,78 @@
+# 3rd parties
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect
+
+# Data pipeline internals
+import dimensions
+import main
+import synthetic_data
+
+LANGUAGE = next(spec for spec in dimensions.SPECS if spec.name == "language")
+
+def _answers():
+    return pd.DataFrame({
+        "language_have_worked_with": ["SQL;Python", None, "Rust"],
+        "language_want_to_work_with": ["Go", "SQL; Rust", None],
+    }, index=[10, 11, 12])
+
+def test_new_members_are_numbered_in_sorted_order():
+    dim_df, link_dfs, df = dimensions.build(_answers(), LANGUAGE)
+
+    assert dim_df.values.tolist() == [["Go", 1], ["Python", 2], ["Rust", 3], ["SQL", 4]]
+    assert link_dfs["language_have_worked_with_link"].values.tolist() == [[10, 4], [10, 2], [12, 3]]
+    assert link_dfs["language_want_to_work_with_link"].values.tolist() == [[10, 1], [11, 4], [11, 3]]
+    assert df.columns.tolist() == []
+
+def test_ids_do_not_depend_on_the_row_order():
+    dim_df, _, _ = dimensions.build(_answers(), LANGUAGE)
+    reversed_dim_df, _, _ = dimensions.build(_answers().iloc[::-1], LANGUAGE)
+    pd.testing.assert_frame_equal(reversed_dim_df, dim_df)
+
+def test_existing_members_keep_their_id():
+    existing = pd.DataFrame({"language": ["SQL", "Ada"], "language_id": [1, 2]})
+
+    dim_df, link_dfs, _ = dimensions.build(_answers(), LANGUAGE, existing_dim_df=existing)
+
+    assert dim_df.values.tolist() == [["SQL", 1], ["Ada", 2], ["Go", 3], ["Python", 4], ["Rust", 5]]
+    assert link_dfs["language_have_worked_with_link"].values.tolist() == [[10, 1], [10, 4], [12, 5]]
+
+@pytest.fixture
+def warehouse(workdir, monkeypatch):
+    for year in (2021, 2022, 2023):
+        df = synthetic_data.generate(150, year, seed=year)
+        if year == 2021:
+            # A language first answered in the year added by the incremental run
+            df.loc[:4, "LanguageHaveWorkedWith"] += ";Zig"
+        synthetic_data.write_archive(df, year)
+    url = f"sqlite:///{workdir / 'warehouse.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    return create_engine(url)
+
+def _dims(engine):
+    """dim table -> {member: id}"""
+    dims = {}
+    for table_name in inspect(engine).get_table_names():
+        if table_name.endswith("_dim"):
+            frame = pd.read_sql(f"SELECT * FROM {table_name}", engine)
+            id_col = next(c for c in frame.columns if c.endswith("_id"))
+            member_col = next(c for c in frame.columns if c != id_col)
+            dims[table_name] = dict(zip(frame[member_col], frame[id_col]))
+    return dims
+
+def test_ids_are_stable_across_a_reload_and_an_incremental_run(warehouse):
+    main.main(["2022", "2023", "--cache"])
+    loaded = _dims(warehouse)
+
+    # Full reload, the years in the other order
+    main.main(["2023", "2022", "--cache"])
+    assert _dims(warehouse) == loaded
+
+    # Incremental run: the known members keep their id, the new one comes after the max id
+    main.main(["2021", "2022", "2023", "--cache", "--incremental"])
+    extended = _dims(warehouse)
+    assert extended.keys() == loaded.keys()
+    for table_name, members in loaded.items():
+        assert {member: extended[table_name][member] for member in members} == members, table_name
+    assert extended["language_dim"]["Zig"] == max(loaded["language_dim"].values()) + 1
+    assert len(extended["language_dim"]) == len(loaded["language_dim"]) + 1
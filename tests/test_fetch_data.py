@@ -0,0 +1,156 @@
+# 3rd parties
+import hashlib
+import os
+import zipfile
+import pytest
+
+# Data pipeline internals
+import fetch_data
+
+ARCHIVE = bytes(range(256)) * 64
+YEAR = 2023
+
+class _Response:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self._body), chunk_size):
+            yield self._body[start:start + chunk_size]
+
+class _Server:
+    """`requests` stand-in serving the archive, `status` forces the answer to a Range request"""
+
+    def __init__(self, status=206, body=ARCHIVE):
+        self.status = status
+        self.body = body
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        headers = headers or {}
+        self.requests.append(headers)
+        if "Range" not in headers or self.status == 200:
+            return _Response(200, self.body, {"Content-Length": str(len(self.body))})
+        offset = int(headers["Range"].split("=")[1].rstrip("-"))
+        if self.status == 416:
+            return _Response(416, headers={"Content-Range": f"bytes */{len(self.body)}"})
+        rest = self.body[offset:]
+        return _Response(206, rest, {
+            "Content-Length": str(len(rest)),
+            "Content-Range": f"bytes {offset}-{len(self.body) - 1}/{len(self.body)}",
+        })
+
+@pytest.fixture
+def archive_paths(workdir, monkeypatch):
+    monkeypatch.setenv("SURVEY_MIRROR_URL", "http://mirror.local/survey")
+    zip_path = fetch_data._get_archive_path(YEAR)
+    os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+    return zip_path, f"{zip_path}.part"
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+def test_fresh_download(archive_paths):
+    zip_path, part_path = archive_paths
+    server = _Server()
+
+    meta = fetch_data._download_file(YEAR, session=server)
+
+    assert server.requests == [{}]
+    assert _read(zip_path) == ARCHIVE
+    assert not os.path.exists(part_path)
+    assert meta["size"] == len(ARCHIVE)
+    assert meta["sha256"] == hashlib.sha256(ARCHIVE).hexdigest()
+
+def test_partial_content_resumes_the_part_file(archive_paths):
+    zip_path, part_path = archive_paths
+    _write(part_path, ARCHIVE[:1000])
+    server = _Server(status=206)
+
+    fetch_data._download_file(YEAR, session=server)
+
+    assert server.requests == [{"Range": "bytes=1000-"}]
+    assert _read(zip_path) == ARCHIVE
+
+def test_server_ignoring_the_range_restarts_the_download(archive_paths):
+    zip_path, part_path = archive_paths
+    _write(part_path, ARCHIVE[:1000])
+    server = _Server(status=200)
+
+    fetch_data._download_file(YEAR, session=server)
+
+    assert server.requests == [{"Range": "bytes=1000-"}]
+    # Written over, not appended to the partial file
+    assert _read(zip_path) == ARCHIVE
+
+def test_range_not_satisfiable_keeps_the_complete_part_file(archive_paths):
+    zip_path, part_path = archive_paths
+    _write(part_path, ARCHIVE)
+    server = _Server(status=416)
+
+    meta = fetch_data._download_file(YEAR, session=server)
+
+    assert _read(zip_path) == ARCHIVE
+    assert meta["sha256"] == hashlib.sha256(ARCHIVE).hexdigest()
+
+def test_truncated_transfer_is_kept_for_the_next_attempt(archive_paths):
+    zip_path, part_path = archive_paths
+    truncated = _Server()
+    truncated.get = lambda url, headers=None, **kwargs: _Response(
+        200, ARCHIVE[:3000], {"Content-Length": str(len(ARCHIVE))})
+
+    with pytest.raises(fetch_data.RetryableDownloadError):
+        fetch_data._download_file(YEAR, session=truncated)
+    assert not os.path.exists(zip_path)
+    assert _read(part_path) == ARCHIVE[:3000]
+
+    server = _Server(status=206)
+    fetch_data._download_file(YEAR, session=server)
+    assert server.requests == [{"Range": "bytes=3000-"}]
+    assert _read(zip_path) == ARCHIVE
+
+def test_server_errors_are_retryable(archive_paths):
+    server = _Server()
+    server.get = lambda url, headers=None, **kwargs: _Response(503)
+
+    with pytest.raises(fetch_data.RetryableDownloadError):
+        fetch_data._download_file(YEAR, session=server)
+
+def test_csv_is_read_from_the_archive(workdir):
+    zip_path = fetch_data._get_archive_path(YEAR)
+    os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+    with zipfile.ZipFile(zip_path, "w") as zip_ref:
+        zip_ref.writestr("so_survey/survey_results_public.csv", "ResponseId,Country\n1,Chile\n2,Peru\n3,Cuba\n")
+
+    df = fetch_data.fetch(YEAR, True, nrows=2)
+    chunks = list(fetch_data.fetch(YEAR, True, chunksize=2))
+
+    assert df["Country"].tolist() == ["Chile", "Peru"]
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert not os.path.exists(fetch_data._get_csv_path(YEAR))
+
+def test_only_the_dropped_columns_are_left_out(workdir):
+    zip_path = fetch_data._get_archive_path(YEAR)
+    os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+    with zipfile.ZipFile(zip_path, "w") as zip_ref:
+        zip_ref.writestr("so_survey/survey_results_public.csv",
+                         "ResponseId,Q120,Industry,CompTotal\n1,Yes,Retail,5000\n2,Yes,,\n")
+
+    df = fetch_data.fetch(YEAR, True)
+
+    # Q120 is registered as dropped, Industry and CompTotal aren't registered (read with inference)
+    assert df.columns.tolist() == ["ResponseId", "Industry", "CompTotal"]
+    assert df["CompTotal"].tolist()[0] == 5000
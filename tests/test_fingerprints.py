@@ -0,0 +1,106 @@
+# 3rd parties
+import numpy as np
+import pandas as pd
+
+# Data pipeline internals
+import fingerprints
+import preprocess_data
+
+def _fps(*values):
+    return np.array(values, dtype=np.uint64)
+
+def test_filter_rejects_duplicates_within_and_across_chunks(tmp_path):
+    store = fingerprints.FingerprintStore(path=str(tmp_path / "fingerprints.parquet"))
+
+    assert store.filter(2019, _fps(1, 2, 2, 3)).tolist() == [True, True, False, True]
+    assert store.filter(2019, _fps(3, 4)).tolist() == [False, True]
+    assert store.filter(2020, _fps(4, 5, 1)).tolist() == [False, True, False]
+    assert len(store) == 5
+    assert store.added(2019).tolist() == [1, 2, 3, 4]
+    assert store.added(2020).tolist() == [5]
+
+def test_many_chunks_match_a_set(tmp_path):
+    rng = np.random.default_rng(0)
+    store = fingerprints.FingerprintStore(path=str(tmp_path / "fingerprints.parquet"))
+    seen = set()
+    for _ in range(50):
+        chunk = rng.integers(0, 5_000, size=200).astype(np.uint64)
+        expected = []
+        for value in chunk.tolist():
+            expected.append(value not in seen)
+            seen.add(value)
+        assert store.filter(2023, chunk).tolist() == expected
+    assert len(store) == len(seen)
+
+def test_store_is_kept_across_runs(tmp_path):
+    path = str(tmp_path / "fingerprints.parquet")
+    first_run = fingerprints.FingerprintStore(path=path)
+    first_run.filter(2019, _fps(1, 2))
+    first_run.filter(2020, _fps(3))
+    first_run.save()
+
+    second_run = fingerprints.FingerprintStore(path=path)
+
+    assert len(second_run) == 3
+    assert second_run.filter(2021, _fps(2, 3, 4)).tolist() == [False, False, True]
+    second_run.save()
+    stored = pd.read_parquet(path)
+    assert sorted(zip(stored["survey_year"], stored["fingerprint"])) == [(2019, 1), (2019, 2), (2020, 3), (2021, 4)]
+
+def test_reloaded_years_are_forgotten(tmp_path):
+    path = str(tmp_path / "fingerprints.parquet")
+    first_run = fingerprints.FingerprintStore(path=path)
+    first_run.filter(2019, _fps(1, 2))
+    first_run.filter(2020, _fps(3))
+    first_run.save()
+
+    second_run = fingerprints.FingerprintStore(path=path)
+    second_run.drop_years([2019])
+
+    assert second_run.filter(2019, _fps(1, 2, 3)).tolist() == [True, True, False]
+
+def test_full_load_and_other_columns_start_a_new_store(tmp_path):
+    path = str(tmp_path / "fingerprints.parquet")
+    first_run = fingerprints.FingerprintStore(path=path)
+    first_run.filter(2019, _fps(1, 2))
+    first_run.save()
+
+    assert len(fingerprints.FingerprintStore(path=path, reset=True)) == 0
+    assert len(fingerprints.FingerprintStore(path=path, columns=["Country"])) == 0
+
+def test_store_of_another_parsing_is_started_over(tmp_path, monkeypatch):
+    path = str(tmp_path / "fingerprints.parquet")
+    first_run = fingerprints.FingerprintStore(path=path)
+    first_run.filter(2019, _fps(1, 2))
+    first_run.save()
+
+    monkeypatch.setattr(fingerprints.parquet_cache, "SCHEMA_VERSION", fingerprints.parquet_cache.SCHEMA_VERSION + 1)
+    assert len(fingerprints.FingerprintStore(path=path)) == 0
+
+def test_restore_adds_the_checkpointed_rows_without_filtering(tmp_path):
+    store = fingerprints.FingerprintStore(path=str(tmp_path / "fingerprints.parquet"))
+    store.filter(2019, _fps(1, 2))
+
+    store.restore(2020, _fps(2, 3, 3))
+
+    assert store.added(2020).tolist() == [2, 3, 3]
+    assert len(store) == 3
+    assert store.filter(2021, _fps(3, 4)).tolist() == [False, True]
+
+def test_compute_leaves_out_the_ids():
+    df = pd.DataFrame({"ResponseId": [1, 2], "survey_year": [2019, 2020], "Country": ["Chile", "Chile"]})
+    row_fingerprints = fingerprints.compute(df, fingerprints.answer_columns(df))
+    assert row_fingerprints[0] == row_fingerprints[1]
+    assert fingerprints.first_occurrences(row_fingerprints).tolist() == [True, False]
+
+def test_responses_differing_in_an_unregistered_column_are_kept(tmp_path):
+    # CompTotal isn't in the column registry
+    df = pd.DataFrame({
+        "ResponseId": [1, 2, 3],
+        "Country": ["Chile", "Chile", "Chile"],
+        "CompTotal": [5000, 7000, 5000],
+    })
+    store = fingerprints.FingerprintStore(path=str(tmp_path / "fingerprints.parquet"))
+
+    assert preprocess_data.remove_duplicates(df.copy())["ResponseId"].tolist() == [1, 2]
+    assert preprocess_data.remove_duplicates(df.copy(), 2023, store)["ResponseId"].tolist() == [1, 2]
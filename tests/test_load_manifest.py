@@ -0,0 +1,65 @@
+# 3rd parties
+import pandas as pd
+from sqlalchemy import create_engine
+
+# Data pipeline internals
+import load_manifest
+
+def _engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'warehouse.db'}")
+
+def _load(engine):
+    """Two loaded years: 2019 (fact ids 0-2, ResponseIds 1-3) and 2020 (fact ids 3-4, ResponseIds 4-5)"""
+    facts = pd.DataFrame({"survey_year": [2019, 2019, 2019, 2020, 2020], "ResponseId": [1, 2, 3, 4, 5]})
+    facts.to_sql("survey_facts", engine, index=False)
+    facts.iloc[[0, 3]].to_sql("survey_facts_text", engine, index=False)
+    pd.DataFrame({"fact_id": [0, 1, 2, 3, 4], "language_id": 1}).to_sql("language_link", engine, index=False)
+    # Keyed by the fact index + 1
+    pd.DataFrame({"response_id": [1, 3, 4, 5], "dev_type_id": 0}).to_sql("dev_type_link", engine, index=False)
+    pd.DataFrame({"language_id": [1], "language": ["Python"]}).to_sql("language_dim", engine, index=False)
+    load_manifest.record(engine, load_manifest.summarize(facts), {2019: "a" * 64, 2020: "b" * 64}, replace=True)
+
+def _read(engine, table_name):
+    return pd.read_sql(f"SELECT * FROM {table_name}", engine)
+
+def test_next_offsets_of_an_empty_warehouse(tmp_path):
+    assert load_manifest.next_offsets(_engine(tmp_path)) == (0, 0)
+
+def test_next_offsets_continue_the_loaded_years(tmp_path):
+    engine = _engine(tmp_path)
+    _load(engine)
+    assert load_manifest.next_offsets(engine) == (5, 5)
+
+def test_delete_years_removes_the_year_everywhere(tmp_path):
+    engine = _engine(tmp_path)
+    _load(engine)
+
+    load_manifest.delete_years(engine, [2019])
+
+    assert _read(engine, "survey_facts")["survey_year"].tolist() == [2020, 2020]
+    assert _read(engine, "survey_facts_text")["survey_year"].tolist() == [2020]
+    assert _read(engine, "language_link")["fact_id"].tolist() == [3, 4]
+    assert _read(engine, "dev_type_link")["response_id"].tolist() == [4, 5]
+    # Dimensions are kept, the manifest only lists the remaining year
+    assert len(_read(engine, "language_dim")) == 1
+    assert load_manifest.read(engine).index.tolist() == [2020]
+    assert load_manifest.next_offsets(engine) == (5, 5)
+
+def test_delete_years_of_the_last_year_rewinds_the_offsets(tmp_path):
+    engine = _engine(tmp_path)
+    _load(engine)
+
+    load_manifest.delete_years(engine, [2020])
+
+    assert load_manifest.next_offsets(engine) == (3, 3)
+    assert _read(engine, "language_link")["fact_id"].tolist() == [0, 1, 2]
+    assert _read(engine, "dev_type_link")["response_id"].tolist() == [1, 3]
+
+def test_delete_no_years_is_a_no_op(tmp_path):
+    engine = _engine(tmp_path)
+    _load(engine)
+
+    load_manifest.delete_years(engine, [])
+
+    assert len(_read(engine, "survey_facts")) == 5
+    assert load_manifest.read(engine).index.tolist() == [2019, 2020]
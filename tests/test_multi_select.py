@@ -0,0 +1,64 @@
+# 3rd parties
+import numpy as np
+import pandas as pd
+import pytest
+
+# Data pipeline internals
+import multi_select
+
+def _answers():
+    # Fact ids don't start at 0 (e.g. an incremental load), repeated cells, spaces around the items
+    return pd.Series(["Python;SQL", None, "SQL; Rust", "Python;SQL", np.nan, " Go ", "Rust;Python;SQL"],
+                     index=range(100, 107))
+
+def _iterrows_links(series, strip=True):
+    """(fact, item) pairs of the former `iterrows` loop of load_data"""
+    links = []
+    for idx, cell in series.items():
+        if pd.notna(cell):
+            for item in cell.split(';'):
+                links.append((idx, item.strip() if strip else item))
+    return links
+
+def _links(exploded):
+    return list(zip(exploded.index.tolist(), exploded.categories[exploded.codes].tolist()))
+
+@pytest.mark.parametrize("strip", [True, False])
+def test_explode_matches_the_iterrows_links(strip):
+    exploded = multi_select.explode(_answers(), strip=strip)
+    assert _links(exploded) == _iterrows_links(_answers(), strip=strip)
+
+def test_categories_in_order_of_first_appearance():
+    assert multi_select.explode(_answers()).categories.tolist() == ["Python", "SQL", "Rust", "Go"]
+
+def test_explode_of_an_empty_column():
+    exploded = multi_select.explode(pd.Series([None, np.nan], dtype=object))
+    assert len(exploded.index) == 0 and len(exploded.codes) == 0
+
+def test_link_table_matches_the_iterrows_links():
+    exploded = multi_select.explode(_answers())
+    dim_df, _ = multi_select.build_dim(exploded.categories, "language")
+
+    link_df = multi_select.build_link(exploded, dim_df, "language")
+
+    item_to_id = dict(zip(dim_df["language"], dim_df["language_id"]))
+    expected = [(idx, item_to_id[item]) for idx, item in _iterrows_links(_answers())]
+    assert list(zip(link_df["fact_id"], link_df["language_id"])) == expected
+
+def test_existing_dimension_keeps_its_ids():
+    existing = pd.DataFrame({"language": ["SQL", "COBOL"], "language_id": [7, 3]})
+
+    dim_df, new_dim_df = multi_select.build_dim(pd.Index(["Python", "SQL", "Rust"]), "language",
+                                                existing_dim_df=existing)
+
+    assert dim_df.values.tolist() == [["SQL", 7], ["COBOL", 3], ["Python", 8], ["Rust", 9]]
+    assert new_dim_df["language"].tolist() == ["Python", "Rust"]
+
+def test_unknown_items_raise_unless_dropped():
+    exploded = multi_select.explode(_answers())
+    dim_df = pd.DataFrame({"language": ["Python", "SQL"], "language_id": [1, 2]})
+
+    with pytest.raises(KeyError):
+        multi_select.build_link(exploded, dim_df, "language")
+    link_df = multi_select.build_link(exploded, dim_df, "language", drop_unknown=True)
+    assert link_df["fact_id"].tolist() == [100, 100, 102, 103, 103, 106, 106]
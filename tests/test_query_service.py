@@ -0,0 +1,41 @@
+# 3rd parties
+import pandas as pd
+import pytest
+
+# Data pipeline internals
+import load_manifest
+import query_service
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    # The manifest is checked on every query
+    monkeypatch.setattr(query_service, "_MANIFEST_POLL", 0)
+    return query_service.QueryService(f"sqlite+pysqlite:///{tmp_path / 'warehouse.db'}")
+
+def _record(service, year, replace=False):
+    facts = pd.DataFrame({"survey_year": [year, year], "ResponseId": [1, 2]}, index=[0, 1])
+    load_manifest.record(service.engine, load_manifest.summarize(facts), {year: "a" * 64}, replace=replace)
+
+def _years(result):
+    years, hit = result
+    return [row["survey_year"] for row in years], hit
+
+def test_years_are_served_from_the_cache(service):
+    assert _years(service.years()) == ([], False)
+    assert _years(service.years()) == ([], True)
+
+    _record(service, 2019, replace=True)
+    assert _years(service.years()) == ([2019], False)
+    assert _years(service.years()) == ([2019], True)
+
+def test_a_loaded_year_drops_the_years_list_and_its_results(service):
+    _record(service, 2019, replace=True)
+    service.years()
+    service.cache.put(("top", 2019, ()), {"members": []})
+    service.cache.put(("top", 2020, ()), {"members": []})
+
+    _record(service, 2020)
+
+    assert _years(service.years()) == ([2019, 2020], False)
+    assert service.cache.get(("top", 2019, ())) is not None
+    assert service.cache.get(("top", 2020, ())) is None
@@ -0,0 +1,67 @@
+# 3rd parties
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect
+
+# Data pipeline internals
+import main
+import rollups
+import synthetic_data
+
+@pytest.fixture
+def warehouse(workdir, monkeypatch):
+    for year in (2021, 2022, 2023):
+        synthetic_data.write_archive(synthetic_data.generate(150, year, seed=year), year)
+    url = f"sqlite:///{workdir / 'warehouse.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    return create_engine(url)
+
+def _respondents(engine, link_table):
+    """SELECT of the distinct (fact, survey_year, member_id) of a link table, the year comes from the load manifest"""
+    fact_col, id_col = [c["name"] for c in inspect(engine).get_columns(link_table)]
+    shift = 1 if fact_col == "response_id" else 0
+    return (f"SELECT DISTINCT l.{fact_col} AS fact, m.survey_year, l.{id_col} AS member_id FROM {link_table} l "
+            f"JOIN load_manifest m ON l.{fact_col} - {shift} BETWEEN m.fact_id_min AND m.fact_id_max")
+
+def _read(engine, query, **params):
+    frame = pd.read_sql(query, engine, params=params)
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True).astype("int64")
+
+def _assert_rollups_match(engine):
+    sources = pd.read_sql(f"SELECT DISTINCT source, dim_table FROM {rollups.DIM_COUNTS_TABLE}", engine)
+    assert len(sources) > 10
+    for source, dim_table in sources.itertuples(index=False):
+        if source == "survey_facts":
+            expected = ("SELECT survey_year, remote_work_id AS member_id, COUNT(*) AS respondents FROM survey_facts "
+                        "WHERE remote_work_id IS NOT NULL GROUP BY survey_year, remote_work_id")
+        else:
+            expected = (f"SELECT survey_year, member_id, COUNT(*) AS respondents FROM ({_respondents(engine, source)}) "
+                        "GROUP BY survey_year, member_id")
+        rollup = f"SELECT survey_year, member_id, respondents FROM {rollups.DIM_COUNTS_TABLE} WHERE source = :source"
+        pd.testing.assert_frame_equal(_read(engine, rollup, source=source), _read(engine, expected), obj=source)
+
+        if not source.endswith("_have_worked_with_link"):
+            continue
+        have = _respondents(engine, source)
+        want = _respondents(engine, source.replace("_have_worked_with_link", "_want_to_work_with_link"))
+        expected = (
+            'SELECT survey_year, member_id, SUM(has) AS have, SUM(wants) AS want, SUM(has * wants) AS "both" FROM ('
+            "  SELECT fact, survey_year, member_id, MAX(has) AS has, MAX(wants) AS wants FROM ("
+            f"    SELECT *, 1 AS has, 0 AS wants FROM ({have}) UNION ALL SELECT *, 0, 1 FROM ({want})"
+            "  ) GROUP BY fact, survey_year, member_id"
+            ") GROUP BY survey_year, member_id")
+        rollup = (f'SELECT survey_year, member_id, have, want, "both" FROM {rollups.HAVE_WANT_TABLE} '
+                  "WHERE dim_table = :dim_table")
+        pd.testing.assert_frame_equal(_read(engine, rollup, dim_table=dim_table), _read(engine, expected), obj=dim_table)
+
+def test_rollups_match_a_group_by_of_the_links(warehouse):
+    main.main(["2021", "2022", "2023", "--cache"])
+    _assert_rollups_match(warehouse)
+
+def test_incremental_rollups_match_a_group_by_of_the_links(warehouse):
+    main.main(["2021", "2022", "--cache"])
+    # Only 2023 is loaded, the rollup rows of the other years are kept
+    main.main(["2021", "2022", "2023", "--cache", "--incremental"])
+    _assert_rollups_match(warehouse)
+    years = pd.read_sql(f"SELECT DISTINCT survey_year FROM {rollups.HAVE_WANT_TABLE} ORDER BY survey_year", warehouse)
+    assert years["survey_year"].tolist() == [2021, 2022, 2023]
@@ -0,0 +1,85 @@
+# 3rd parties
+import os
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect
+
+# Data pipeline internals
+import fetch_data
+import main
+import synthetic_data
+import fact_groups
+
+YEARS = [2017, 2023]
+FACTS_TABLES = [fact_groups.table_name(group) for group in (None, *fact_groups.COLD_GROUPS)]
+
+@pytest.fixture
+def archives(workdir):
+    for year in YEARS:
+        df = synthetic_data.generate(300, year, seed=year)
+        # Duplicate answers (new ids) within the year, in later chunks than the original rows
+        duplicates = df.iloc[:20].copy()
+        id_col = "ResponseId" if "ResponseId" in df.columns else "Respondent"
+        duplicates[id_col] += len(df)
+        df = pd.concat([df, duplicates], ignore_index=True)
+        if year == 2023:
+            _add_late_answers(df)
+        synthetic_data.write_archive(df, year)
+    return workdir
+
+def _add_late_answers(df):
+    """Columns whose first chunks don't tell their dtype (the duplicates keep the answers of their original row)"""
+    # Unregistered text column, empty in the first chunks
+    df["Industry"] = None
+    df.loc[250:299, "Industry"] = "Retail"
+    # Unregistered numeric column
+    df["CompTotal"] = df.index % 300
+    # Registered float column with a text answer in the last chunk
+    df["WorkExp"] = df["WorkExp"].astype(object)
+    df.loc[299, "WorkExp"] = "Ten"
+
+def _run(workdir, monkeypatch, name, *options):
+    url = f"sqlite:///{workdir / name}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    main.main([*map(str, YEARS), "--cache", *options])
+    return create_engine(url)
+
+def _facts(engine):
+    tables = [t for t in FACTS_TABLES if inspect(engine).has_table(t)]
+    return {t: pd.read_sql(f"SELECT * FROM {t} ORDER BY survey_year, response_id", engine) for t in tables}
+
+@pytest.mark.parametrize("options", [(), ("--split-facts",)], ids=["wide", "split"])
+def test_streaming_loads_the_same_facts(archives, monkeypatch, options):
+    in_memory = _facts(_run(archives, monkeypatch, "in_memory.db", *options))
+    streaming = _facts(_run(archives, monkeypatch, "streaming.db", "--chunksize", "120", *options))
+
+    # The split is opt-in, and gives the same tables in both modes
+    assert list(in_memory)[0] == fact_groups.HOT_TABLE
+    assert (len(in_memory) > 1) == bool(options)
+    assert list(streaming) == list(in_memory)
+    assert len(in_memory[fact_groups.HOT_TABLE]) == 2 * 300
+    for table_name, frame in in_memory.items():
+        pd.testing.assert_frame_equal(streaming[table_name], frame, obj=table_name)
+
+def test_chunks_are_parsed_with_the_dtypes_of_the_whole_year(archives):
+    for year in YEARS:
+        full = fetch_data.fetch(year, True)
+        # Scanned again by the chunked read
+        os.remove(fetch_data._dtypes_path(fetch_data._get_source_path(year)))
+        chunks = list(fetch_data.fetch(year, True, chunksize=120))
+
+        assert len(chunks) == 3
+        for chunk in chunks:
+            pd.testing.assert_series_equal(chunk.dtypes, full.dtypes, obj=str(year))
+    assert full["Industry"].dtype == "str"
+    assert full["CompTotal"].dtype == "int64"
+    assert full["WorkExp"].dtype == "str"
+
+def test_streaming_creates_the_same_column_types(archives, monkeypatch):
+    in_memory = _run(archives, monkeypatch, "in_memory.db")
+    streaming = _run(archives, monkeypatch, "streaming.db", "--chunksize", "120")
+
+    def column_types(engine):
+        return {c["name"]: str(c["type"]) for c in inspect(engine).get_columns(fact_groups.HOT_TABLE)}
+    assert column_types(streaming) == column_types(in_memory)
+    assert column_types(in_memory)["industry"] == "TEXT"
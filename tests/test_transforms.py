@@ -0,0 +1,63 @@
+# 3rd parties
+import numpy as np
+import pandas as pd
+
+# Data pipeline internals
+import preprocess_data
+import transforms
+
+def _row_normalize_age(age):
+    """The former per-row `normalize_age`"""
+    try:
+        age = float(age)
+    except ValueError:
+        return age
+
+    if age < 18:
+        return 'Under 18 years old'
+    elif 18 <= age <= 24:
+        return '18-24 years old'
+    elif 25 <= age <= 34:
+        return '25-34 years old'
+    elif 35 <= age <= 44:
+        return '35-44 years old'
+    elif 45 <= age <= 54:
+        return '45-54 years old'
+    elif 55 <= age <= 64:
+        return '55-64 years old'
+    else:
+        return '65 years or older'
+
+def test_whole_ages_keep_their_group():
+    ages = pd.Series([*range(10, 80), "30", "17", "25-34 years old", "Prefer not to say"], dtype=object)
+    assert preprocess_data.normalize_age(ages).tolist() == [_row_normalize_age(age) for age in ages]
+
+def test_fractional_ages_get_their_group():
+    ages = pd.Series([17.5, 24.5, 34.9, 64.5, 65.0])
+    assert preprocess_data.normalize_age(ages).tolist() == [
+        'Under 18 years old', '18-24 years old', '25-34 years old', '55-64 years old', '65 years or older']
+
+def test_ages_through_the_distinct_values():
+    ages = pd.Series(["30", "Prefer not to say", "30", np.nan, "70", "Under 18 years old"])
+
+    mapped = transforms.map_unique(ages, preprocess_data.normalize_age, vectorized=True)
+
+    assert mapped.tolist()[:3] == ['25-34 years old', 'Prefer not to say', '25-34 years old']
+    assert pd.isna(mapped[3])
+    assert mapped.tolist()[4:] == ['65 years or older', 'Under 18 years old']
+
+def test_map_unique_runs_once_per_distinct_value():
+    calls = []
+
+    def double(value):
+        calls.append(value)
+        return value * 2
+
+    mapped = transforms.map_unique(pd.Series([1, 2, 1, None, 2, 3]), double)
+    assert mapped.tolist()[:3] == [2, 4, 2] and pd.isna(mapped[3]) and mapped.tolist()[4:] == [4, 6]
+    assert calls == [1, 2, 3]
+
+    # The cache is kept for the next chunks (and years) of the run
+    transforms.map_unique(pd.Series([3, 4], dtype="category"), double)
+    assert calls == [1, 2, 3, 4]
+    assert transforms.get_cache(double).hits == 1
@@ -0,0 +1,87 @@
+# 3rd parties
+import contextlib
+import threading
+import pandas as pd
+import pytest
+
+# Data pipeline internals
+import upload_scheduler
+
+class _Engine:
+    """Engine stand-in: every `begin` block is a transaction, the committed tables are recorded"""
+
+    def __init__(self):
+        self.committed = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def begin(self):
+        conn = []
+        yield conn
+        with self._lock:
+            self.committed.extend(conn)
+
+def _upload(failing=()):
+    def upload(df, table_name, conn, if_exists):
+        if table_name in failing:
+            raise RuntimeError(f"cannot write {table_name}")
+        conn.append(table_name)
+    return upload
+
+def _frame():
+    return pd.DataFrame({"id": [1, 2]})
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_failure_skips_the_dependent_tables_only(workers):
+    engine = _Engine()
+    scheduler = upload_scheduler.UploadScheduler(engine, _upload(failing={"language_dim"}), workers=workers)
+    committed = []
+    try:
+        scheduler.submit(_frame(), "language_dim")
+        scheduler.submit(_frame(), "database_dim")
+        scheduler.submit(_frame(), "language_link", 'append', depends_on=["language_dim"])
+        scheduler.submit(_frame(), "database_link", 'append', depends_on=["database_dim"],
+                         on_success=lambda result: committed.append(result["table"]))
+        scheduler.submit(_frame(), "survey_facts", depends_on=True)
+        with pytest.raises(Exception) as error:
+            scheduler.join()
+    finally:
+        scheduler.shutdown()
+
+    message = str(error.value)
+    assert "3 of 5 table uploads did not complete" in message
+    assert "language_dim (failed): RuntimeError: cannot write language_dim" in message
+    assert "language_link (skipped)" in message
+    assert "survey_facts (skipped)" in message
+    # The independent tables are still written
+    assert sorted(engine.committed) == ["database_dim", "database_link"]
+    assert committed == ["database_link"]
+
+def test_join_returns_the_results_and_resets():
+    engine = _Engine()
+    scheduler = upload_scheduler.UploadScheduler(engine, _upload(), workers=2)
+    try:
+        scheduler.submit(_frame(), "language_dim")
+        scheduler.submit(_frame(), "language_link", depends_on=["language_dim"])
+        results = scheduler.join()
+        assert sorted((r["table"], r["rows"], r["status"]) for r in results) == [
+            ("language_dim", 2, "ok"), ("language_link", 2, "ok")]
+
+        # A failed job of a previous join doesn't leak into the next one
+        scheduler.submit(_frame(), "survey_facts", depends_on=True)
+        assert [r["table"] for r in scheduler.join()] == ["survey_facts"]
+    finally:
+        scheduler.shutdown()
+
+def test_on_success_is_not_called_for_a_failed_table():
+    engine = _Engine()
+    scheduler = upload_scheduler.UploadScheduler(engine, _upload(failing={"survey_facts"}))
+    committed = []
+    try:
+        scheduler.submit(_frame(), "survey_facts", on_success=lambda result: committed.append(result["table"]))
+        with pytest.raises(Exception):
+            scheduler.join()
+    finally:
+        scheduler.shutdown()
+    assert committed == []
+    assert engine.committed == []